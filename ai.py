@@ -1,35 +1,61 @@
-import pickle
+import csv
+from collections import OrderedDict
 import numpy as np
 import warnings
+from model_registry import get_registry
+from versioned_cache import VersionedLRUCache
 warnings.filterwarnings('ignore')
 
+
 class DiseasePredictionSystem:
     """
     Disease Prediction System using trained Random Forest model
     """
     
-    def __init__(self):
-        """Load the trained model and data"""
+    def __init__(self, registry=None, cache_size=4096):
+        """Load the trained model and data through the shared model registry"""
         print("Loading model and data...")
         
-        # Load the trained model
-        with open('random_forest_model.pkl', 'rb') as f:
-            self.model = pickle.load(f)
-        
-        # Load the model data
-        with open('model_data.pkl', 'rb') as f:
-            model_data = pickle.load(f)
-        
-        self.all_symptoms = model_data['all_symptoms']
-        self.symptom_severity_dict = model_data['symptom_severity_dict']
-        self.description_dict = model_data['description_dict']
-        self.precaution_dict = model_data['precaution_dict']
-        self.disease_severity_dict = model_data['disease_severity_dict']
-        self.feature_importance = model_data['feature_importance']
+        self.registry = registry or get_registry()
+        # Finished predictions keyed on (symptom bitmask, top_n), dropped when the model version changes
+        self.prediction_cache = VersionedLRUCache(cache_size, version_label='model_version')
+        # A retrained model empties the cache; refill it so the first requests stay fast
+        self.registry.add_reload_listener(self._rewarm_after_reload)
+        bundle = self.registry.get()
         
         print("Model loaded successfully!")
-        print(f"Total symptoms in database: {len(self.all_symptoms)}")
-        print(f"Total diseases: {len(self.description_dict)}")
+        print(f"Total symptoms in database: {len(bundle.all_symptoms)}")
+        print(f"Total diseases: {len(bundle.description_dict)}")
+    
+    # The model and its data are read from the registry on every access so a
+    # hot-reloaded model is picked up without rebuilding the predictor.
+    @property
+    def model(self):
+        return self.registry.get().model
+    
+    @property
+    def all_symptoms(self):
+        return self.registry.get().all_symptoms
+    
+    @property
+    def symptom_severity_dict(self):
+        return self.registry.get().symptom_severity_dict
+    
+    @property
+    def description_dict(self):
+        return self.registry.get().description_dict
+    
+    @property
+    def precaution_dict(self):
+        return self.registry.get().precaution_dict
+    
+    @property
+    def disease_severity_dict(self):
+        return self.registry.get().disease_severity_dict
+    
+    @property
+    def feature_importance(self):
+        return self.registry.get().feature_importance
     
     def get_all_symptoms(self):
         """Return list of all available symptoms"""
@@ -60,40 +86,135 @@ class DiseasePredictionSystem:
         Returns:
         List of dictionaries with disease predictions and information
         """
-        # Create feature vector
-        feature_vector = [0] * len(self.all_symptoms)
-        matched_symptoms = []
-        unmatched_symptoms = []
+        return self.predict_batch([symptoms_list], top_n=top_n)[0]
+    
+    def predict_batch(self, symptoms_lists, top_n=3):
+        """
+        Predict diseases for many symptom sets with a single model call
+        
+        Parameters:
+        symptoms_lists: List of symptom lists (one per patient/intake form)
+        top_n: Number of top predictions to return per item
+        
+        Returns:
+        List of result dictionaries, in input order, each shaped like the
+        return value of predict_disease()
+        """
+        # Take one snapshot so the model and symptom list come from the same version
+        bundle = self.registry.get()
         
-        for symptom in symptoms_list:
-            symptom = symptom.strip().lower().replace(' ', '_')
-            matched = False
+        # Resolve symptoms (correcting typos) and serve repeated symptom sets from the cache
+        matches = []
+        predictions = [None] * len(symptoms_lists)
+        pending = OrderedDict()
+        for row, symptoms_list in enumerate(symptoms_lists):
+            indices, *match = bundle.symptom_index.match_fuzzy(symptoms_list, bundle.fuzzy_index)
+            matches.append(match)
+            if not indices:
+                continue
             
-            # Find matching symptom
-            for idx, existing_symptom in enumerate(self.all_symptoms):
-                if existing_symptom.lower() == symptom:
-                    feature_vector[idx] = 1
-                    matched_symptoms.append(existing_symptom)
-                    matched = True
-                    break
+            key = (self._symptom_key(indices), top_n)
+            cached = self.prediction_cache.get(bundle.version, key)
+            if cached is not None:
+                predictions[row] = cached
+            else:
+                pending.setdefault(key, (indices, []))[1].append(row)
+        
+        # Build one feature matrix for the distinct uncached symptom sets;
+        # rows with no recognised symptoms never reach the model
+        if pending:
+            features = np.zeros((len(pending), len(bundle.all_symptoms)), dtype=np.float32)
+            for i, (indices, _) in enumerate(pending.values()):
+                features[i, indices] = 1
             
-            if not matched:
-                unmatched_symptoms.append(symptom)
+            probabilities = bundle.engine.predict_proba(features)
+            top_indices = self._top_n_indices(probabilities, top_n)
+            for i, (key, (_, rows)) in enumerate(pending.items()):
+                result = self._build_predictions(bundle, probabilities[i], top_indices[i])
+                self.prediction_cache.put(bundle.version, key, result)
+                for row in rows:
+                    predictions[row] = result
         
-        # Check if any symptoms were matched
-        if sum(feature_vector) == 0:
-            return {
-                'error': 'No matching symptoms found',
+        results = []
+        for row, symptoms_list in enumerate(symptoms_lists):
+            matched_symptoms, unmatched_symptoms, corrected_symptoms, suggestions = matches[row]
+            if predictions[row] is None:
+                results.append({
+                    'error': 'No matching symptoms found',
+                    'matched_symptoms': matched_symptoms,
+                    'unmatched_symptoms': unmatched_symptoms,
+                    'corrected_symptoms': corrected_symptoms,
+                    'suggestions': suggestions
+                })
+                continue
+            
+            results.append({
+                # Copy so callers can't mutate the cached entries
+                'predictions': [dict(pred) for pred in predictions[row]],
                 'matched_symptoms': matched_symptoms,
-                'unmatched_symptoms': unmatched_symptoms
-            }
+                'unmatched_symptoms': unmatched_symptoms,
+                'corrected_symptoms': corrected_symptoms,
+                'suggestions': suggestions,
+                'total_symptoms_provided': len(symptoms_list)
+            })
+        
+        return results
+    
+    def warm_up_cache(self, dataset_path='dataset/dataset.csv', top_n=3):
+        """
+        Pre-compute predictions for every symptom combination in the training data
         
-        # Predict probabilities
-        prediction_proba = self.model.predict_proba([feature_vector])[0]
+        Parameters:
+        dataset_path: CSV with a Disease column followed by symptom columns
+        top_n: Number of top predictions to cache per combination
+        
+        Returns:
+        Number of distinct symptom sets that were cached
+        """
+        symptom_sets = set()
+        with open(dataset_path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                symptom_sets.add(frozenset(s.strip() for s in row[1:] if s.strip()))
         
-        # Get top N predictions
-        top_indices = np.argsort(prediction_proba)[::-1][:top_n]
-        classes = self.model.classes_
+        symptom_sets.discard(frozenset())
+        self.predict_batch([sorted(symptoms) for symptoms in symptom_sets], top_n=top_n)
+        self.prediction_cache.reset_stats()
+        return len(symptom_sets)
+    
+    def _rewarm_after_reload(self, bundle):
+        """Re-run warm_up_cache for a hot-reloaded model (registry reload listener)"""
+        try:
+            warmed = self.warm_up_cache()
+            print(f"Prediction cache re-warmed for model version {bundle.version} ({warmed} symptom sets cached)")
+        except Exception as e:
+            print(f"Could not re-warm prediction cache for model version {bundle.version}: {e}")
+    
+    @staticmethod
+    def _symptom_key(indices):
+        """Bitmask of the matched feature columns (order and duplicates ignored)"""
+        key = 0
+        for idx in indices:
+            key |= 1 << idx
+        return key
+    
+    @staticmethod
+    def _top_n_indices(probabilities, top_n):
+        """Column indices of the top_n probabilities per row, highest first"""
+        top_n = max(0, min(top_n, probabilities.shape[1]))
+        if top_n == 0:
+            return np.empty((probabilities.shape[0], 0), dtype=np.intp)
+        if top_n < probabilities.shape[1]:
+            candidates = np.argpartition(-probabilities, top_n - 1, axis=1)[:, :top_n]
+        else:
+            candidates = np.tile(np.arange(probabilities.shape[1]), (probabilities.shape[0], 1))
+        order = np.argsort(-np.take_along_axis(probabilities, candidates, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(candidates, order, axis=1)
+    
+    def _build_predictions(self, bundle, prediction_proba, top_indices):
+        """Turn one row of class probabilities into the prediction dictionaries"""
+        classes = bundle.engine.classes_
         
         results = []
         for idx in top_indices:
@@ -103,20 +224,15 @@ class DiseasePredictionSystem:
             # Get disease information
             disease_info = {
                 'disease': disease,
-                'confidence': round(confidence, 2),
-                'description': self.description_dict.get(disease, 'No description available'),
-                'precautions': self.precaution_dict.get(disease, []),
-                'severity_score': self.disease_severity_dict.get(disease, 0),
-                'severity_level': self._get_severity_level(self.disease_severity_dict.get(disease, 0))
+                'confidence': round(float(confidence), 2),
+                'description': bundle.description_dict.get(disease, 'No description available'),
+                'precautions': bundle.precaution_dict.get(disease, []),
+                'severity_score': bundle.disease_severity_dict.get(disease, 0),
+                'severity_level': self._get_severity_level(bundle.disease_severity_dict.get(disease, 0))
             }
             results.append(disease_info)
         
-        return {
-            'predictions': results,
-            'matched_symptoms': matched_symptoms,
-            'unmatched_symptoms': unmatched_symptoms,
-            'total_symptoms_provided': len(symptoms_list)
-        }
+        return results
     
     def _get_severity_level(self, severity_score):
         """Convert severity score to severity level"""
@@ -131,11 +247,11 @@ class DiseasePredictionSystem:
     
     def get_symptom_severity(self, symptom):
         """Get severity weight of a symptom"""
-        symptom = symptom.strip().lower().replace(' ', '_')
-        for s in self.all_symptoms:
-            if s.lower() == symptom:
-                return self.symptom_severity_dict.get(s, 0)
-        return None
+        bundle = self.registry.get()
+        idx = bundle.symptom_index.lookup(symptom)
+        if idx is None:
+            return None
+        return bundle.symptom_severity_dict.get(bundle.all_symptoms[idx], 0)
     
     def get_disease_info(self, disease_name):
         """Get complete information about a disease"""
@@ -160,20 +276,26 @@ class DiseasePredictionSystem:
         
         Returns:
         List of extracted symptoms
+        
+        Symptom names and common synonyms ("skin rash", "throwing up") are
+        found with the bundle's precompiled SymptomMatcher; negated mentions
+        ("no fever") are left out. In a comma-separated list, parts that
+        name no known symptom are returned as typed so predict_disease
+        reports them as unmatched.
         """
-        # First, try comma-separated parsing
+        matcher = self.registry.get().symptom_matcher
         parts = [s.strip() for s in message.split(',') if s.strip()]
-        if len(parts) > 1:
-            return parts
+        if len(parts) <= 1:
+            return matcher.extract(message)
         
-        # Otherwise, find words that match known symptoms
-        words = message.lower().split()
-        matched = []
-        symptom_names = [s.lower().replace('_', ' ') for s in self.all_symptoms]
-        for word in words:
-            if word in symptom_names:
-                matched.append(word.replace(' ', '_'))
-        return matched
+        extracted = []
+        for part in parts:
+            symptoms = matcher.extract(part)
+            if not symptoms and matcher.mentions(part):
+                # Every symptom in this part is negated
+                continue
+            extracted.extend(symptoms or [part])
+        return list(dict.fromkeys(extracted))
 
 
 def main():
@@ -0,0 +1,170 @@
+"""
+FAISS index factory for the RAG knowledge base
+
+Supported index types (all use inner product on L2-normalized vectors,
+i.e. cosine similarity, and store documents under their content-hash ids):
+
+    flat     exact brute-force search (IndexFlatIP)
+    ivf      inverted lists over k-means cells (IndexIVFFlat)
+    hnsw     navigable small-world graph (IndexHNSWFlat)
+    ivfpq    inverted lists with product-quantized codes (IndexIVFPQ)
+
+Flat and HNSW are wrapped in IndexIDMap2 for ids. IVF indexes keep ids in
+their inverted lists, with a hash-table direct map for reconstruct and
+remove_ids (wrapping them in an IDMap breaks after the first removal).
+IVF types need training; train_index fits them on a random sample of the
+embeddings so large memory-mapped corpora are never read in full.
+"""
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ('flat', 'ivf', 'hnsw', 'ivfpq')
+
+# faiss warns below this many training points per k-means centroid
+_POINTS_PER_CENTROID = 39
+
+
+def default_params(index_type, n_vectors, dimension):
+    """
+    Reasonable build and search parameters for n_vectors of dimension
+
+    nlist follows the usual ~4*sqrt(n) rule (capped so every cell gets
+    enough training points); PQ uses 8-bit codes of 4-dimensional
+    sub-vectors (a 4x..16x size reduction) when the corpus can train them.
+    """
+    if index_type in ('ivf', 'ivfpq'):
+        nlist = int(4 * math.sqrt(max(n_vectors, 1)))
+        nlist = max(1, min(nlist, n_vectors // _POINTS_PER_CENTROID))
+        params = {'nlist': nlist, 'nprobe': max(1, min(64, nlist // 8)),
+                  'train_size': min(n_vectors, max(nlist * 256, 10000))}
+        if index_type == 'ivfpq':
+            m = next(m for m in (dimension // 4, dimension // 2, dimension) if m and dimension % m == 0)
+            nbits = 8
+            while nbits > 4 and n_vectors < _POINTS_PER_CENTROID * (1 << nbits):
+                nbits -= 1
+            params.update({'m': m, 'nbits': nbits})
+        return params
+    if index_type == 'hnsw':
+        return {'M': 32, 'efConstruction': 80, 'efSearch': 64}
+    return {}
+
+
+def create_index(index_type, dimension, n_vectors, **params):
+    """
+    Build an empty (possibly untrained) id-addressable index of the given type
+
+    Parameters:
+    index_type: One of INDEX_TYPES
+    dimension: Embedding dimension
+    n_vectors: Expected number of vectors, used for default parameters
+    params: Overrides for default_params (nlist, nprobe, m, nbits, M, ...)
+
+    Returns:
+    Tuple of (index, settings actually used)
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+    settings = default_params(index_type, n_vectors, dimension)
+    settings.update(params)
+
+    metric = faiss.METRIC_INNER_PRODUCT
+    if index_type == 'flat':
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, settings['M'], metric)
+        index.hnsw.efConstruction = settings['efConstruction']
+        index.hnsw.efSearch = settings['efSearch']
+    else:
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == 'ivf':
+            index = faiss.IndexIVFFlat(quantizer, dimension, settings['nlist'], metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, settings['nlist'], settings['m'], settings['nbits'], metric)
+        index.nprobe = settings['nprobe']
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index, settings
+
+    return faiss.IndexIDMap2(index), settings
+
+
+def train_index(index, embeddings, train_size=None, seed=0):
+    """
+    Train index on a random sample of embeddings (no-op if already trained)
+
+    embeddings may be a memory-mapped array; only the sampled rows are read.
+    """
+    if index.is_trained:
+        return 0
+    n = len(embeddings)
+    train_size = min(n, train_size or n)
+    if train_size < n:
+        rows = np.sort(np.random.default_rng(seed).choice(n, size=train_size, replace=False))
+        sample = np.ascontiguousarray(embeddings[rows], dtype=np.float32)
+    else:
+        sample = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index.train(sample)
+    return len(sample)
+
+
+def _inner(index):
+    """The index wrapped by an IndexIDMap/IndexIDMap2 (or index itself)"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def describe_index(index):
+    """Index type, size and search parameters, for status reporting"""
+    inner = _inner(index)
+    info = {'class': type(inner).__name__, 'ntotal': int(index.ntotal), 'dimension': int(index.d)}
+    if hasattr(inner, 'nprobe'):
+        info['nlist'] = int(inner.nlist)
+        info['nprobe'] = int(inner.nprobe)
+    if hasattr(inner, 'hnsw'):
+        info['efSearch'] = int(inner.hnsw.efSearch)
+    return info
+
+
+def index_settings(index):
+    """
+    Index type and create_index parameters that rebuild an index like this one
+
+    Returns:
+    Tuple of (index type, params dictionary)
+    """
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSWFlat):
+        return 'hnsw', {'M': int(inner.hnsw.nb_neighbors(1)), 'efConstruction': int(inner.hnsw.efConstruction),
+                        'efSearch': int(inner.hnsw.efSearch)}
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return 'ivfpq', {'nlist': int(inner.nlist), 'nprobe': int(inner.nprobe),
+                         'm': int(inner.pq.M), 'nbits': int(inner.pq.nbits)}
+    if isinstance(inner, faiss.IndexIVFFlat):
+        return 'ivf', {'nlist': int(inner.nlist), 'nprobe': int(inner.nprobe)}
+    return 'flat', {}
+
+
+def supports_remove(index):
+    """HNSW graphs cannot delete vectors; every other supported type can"""
+    return not hasattr(_inner(index), 'hnsw')
+
+
+def without_ids(index, ids):
+    """
+    Copy of an index that cannot remove vectors (HNSW), minus the given ids
+
+    The graph is rebuilt from the vectors the index already stores, with the
+    same type and parameters, so nothing has to be encoded again.
+    """
+    stored_ids = faiss.vector_to_array(faiss.downcast_index(index).id_map)
+    inner = _inner(index)
+    keep = ~np.isin(stored_ids, ids)
+    vectors = inner.reconstruct_n(0, inner.ntotal)[keep]
+    index_type, params = index_settings(index)
+    rebuilt, _ = create_index(index_type, index.d, len(vectors), **params)
+    if len(vectors):
+        rebuilt.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), stored_ids[keep])
+    return rebuilt
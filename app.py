@@ -1,10 +1,21 @@
-from flask import Flask, render_template, request, jsonify, session
-import requests
+from flask import Flask, Response, render_template, request, jsonify, session
+import hashlib
 import json
 import os
+import re
 from datetime import datetime
 import secrets
+import threading
+import time
 from ai import DiseasePredictionSystem
+from model_registry import get_registry
+from conversation_store import ConversationStore, migrate_json_history
+from context_builder import ContextBuilder
+from llm_client import LLMClient, LLMError, StubLLMClient
+from pipeline import ChatPipeline
+from response_cache import SemanticResponseCache, response_scope
+from single_flight import SingleFlight
+from embedding_cache import normalize_query
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
@@ -12,35 +23,141 @@ app.secret_key = secrets.token_hex(16)
 # OpenRouter API Configuration
 OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY', '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')
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-
-# Store conversation history in a simple file-based system
+OPENROUTER_MODEL = os.environ.get('OPENROUTER_MODEL', 'meta-llama/llama-3.3-70b-instruct:free')
+
+# LLM backend: 'openrouter', 'local' (an OpenAI-compatible server such as
+# llama.cpp's server or Ollama at LLM_URL) or 'stub' (canned offline replies)
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'openrouter')
+LOCAL_LLM_URL = "http://localhost:8080/v1/chat/completions"
+
+if LLM_BACKEND == 'stub':
+    llm_client = StubLLMClient(
+        reply_words=int(os.environ.get('LLM_STUB_WORDS', '60')),
+        latency=float(os.environ.get('LLM_STUB_LATENCY', '0')),
+        token_delay=float(os.environ.get('LLM_STUB_TOKEN_DELAY', '0'))
+    )
+elif LLM_BACKEND in ('openrouter', 'local'):
+    # Shared keep-alive client; timeouts and retries can be tuned per deployment
+    hosted = LLM_BACKEND == 'openrouter'
+    llm_client = LLMClient(
+        url=OPENROUTER_URL if hosted else os.environ.get('LLM_URL', LOCAL_LLM_URL),
+        api_key=OPENROUTER_API_KEY if hosted else os.environ.get('LLM_API_KEY'),
+        model=OPENROUTER_MODEL if hosted else os.environ.get('LLM_MODEL', 'local'),
+        headers={
+            "HTTP-Referer": "http://localhost:5000",
+            "X-Title": "Disease Prediction Chatbot",
+        } if hosted else None,
+        connect_timeout=float(os.environ.get('LLM_CONNECT_TIMEOUT', '5')),
+        read_timeout=float(os.environ.get('LLM_READ_TIMEOUT', '30')),
+        max_retries=int(os.environ.get('LLM_MAX_RETRIES', '2'))
+    )
+else:
+    raise ValueError(f"Unknown LLM_BACKEND '{LLM_BACKEND}', expected openrouter, local or stub")
+
+# Store conversation history in an append-only SQLite log
 CHAT_HISTORY_DIR = "chat_history"
 if not os.path.exists(CHAT_HISTORY_DIR):
     os.makedirs(CHAT_HISTORY_DIR)
+conversation_store = ConversationStore(os.path.join(CHAT_HISTORY_DIR, 'conversations.db'))
+
+# Number of most recent messages read from the store when building a prompt
+PROMPT_HISTORY_MESSAGES = 40
+
+# Prompt assembly: everything sent to the LLM is fitted into this many tokens
+SYSTEM_PROMPT = 'You are a helpful medical assistant chatbot. You can answer questions about symptoms, diseases, and health. Be empathetic and informative, but always remind users to consult healthcare professionals for serious concerns.'
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '4096'))
+context_builder = ContextBuilder(max_tokens=PROMPT_TOKEN_BUDGET)
+
+# Independent pre-LLM stages of a chat turn run concurrently on this pool
+chat_pipeline = ChatPipeline(max_workers=int(os.environ.get('CHAT_PIPELINE_WORKERS', '8')))
+PARALLEL_STAGES = ('history', 'prediction', 'rag')
+
+# Replies to first messages of a conversation, reused for semantically equivalent
+# questions with the same prediction and retrieved documents (0 disables)
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '1024'))
+response_cache = SemanticResponseCache(
+    threshold=float(os.environ.get('RESPONSE_CACHE_THRESHOLD', '0.92')),
+    max_size=RESPONSE_CACHE_SIZE,
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', '3600'))
+) if RESPONSE_CACHE_SIZE > 0 else None
+
+# Concurrent identical requests share one RAG retrieval, and first messages
+# with identical prompts share one LLM call
+rag_flight = SingleFlight('rag')
+llm_flight = SingleFlight('llm')
 
 # Initialize RAG system
 rag_system = None
+RAG_INDEX_DIR = os.environ.get('RAG_INDEX_DIR', 'rag_index')
+LEGACY_RAG_PICKLE = 'rag_system.pkl'
 
 # Initialize Disease Prediction System
 predictor = None
 
+# Upper bound on symptom sets accepted by /api/predict-disease/batch
+MAX_BATCH_SIZE = 1000
+
+# Phrases that introduce the user's own symptoms, and words that open a question
+PREDICTION_CUES = re.compile(r'i have|my symptoms|symptoms are|symptoms:|predict from')
+QUESTION_WORDS = frozenset(['what', 'how', 'why', 'when', 'where', 'who', 'can', 'do'])
+
+# Start-up state of each subsystem (pending, loading, ready, failed or skipped),
+# reported by /api/ready; the RAG index and embedding model load in the background
+SUBSYSTEMS = ('predictor', 'rag_index', 'embedding_model')
+subsystem_status = {name: {'state': 'pending'} for name in SUBSYSTEMS}
+subsystem_lock = threading.Lock()
+predictor_lock = threading.Lock()
+startup_started = False
+
+# Load the embedding model during warm-up instead of on the first dense RAG query
+RAG_WARM_UP_MODEL = os.environ.get('RAG_WARM_UP_MODEL', '1') != '0'
+
 def initialize_rag():
     """Initialize or load RAG system"""
     global rag_system
     try:
-        from rag_system import MedicalRAG
-        rag_system = MedicalRAG()
+        from rag_system import MedicalRAG, knowledge_base_changed
+        from rag_storage import manifest_path
+        from embedding_cache import EmbeddingCache
+        embedding_cache = EmbeddingCache(
+            max_size=int(os.environ.get('RAG_EMBEDDING_CACHE_SIZE', '2048')),
+            ttl=float(os.environ.get('RAG_EMBEDDING_CACHE_TTL', '3600')),
+            disk_path=os.environ.get('RAG_EMBEDDING_CACHE_DIR', 'embedding_cache') or None
+        )
+        # The model itself is only loaded on first use (see warm_up_in_background);
+        # requests see rag_system once its index is fully loaded
+        rag = MedicalRAG(
+            embedding_cache=embedding_cache,
+            encode_batch_size=int(os.environ.get('RAG_ENCODE_BATCH_SIZE', '64')),
+            encode_workers=int(os.environ.get('RAG_ENCODE_WORKERS', '1')),
+            index_type=os.environ.get('RAG_INDEX_TYPE') or None,
+            retrieval=os.environ.get('RAG_RETRIEVAL', 'hybrid')
+        )
         
-        # Try to load existing RAG system
-        if os.path.exists('rag_system.pkl'):
-            if rag_system.load('rag_system.pkl'):
+        # Try to load existing RAG system (memory-mapped index directory)
+        if manifest_path(RAG_INDEX_DIR) is not None:
+            if rag.load(RAG_INDEX_DIR):
+                # Re-encode only the documents whose CSV rows changed since the last save
+                if knowledge_base_changed(RAG_INDEX_DIR) and rag.update_index() is not None:
+                    rag.save(RAG_INDEX_DIR)
+                rag_system = rag
                 print("RAG system loaded successfully!")
                 return True
         
+        # Convert a legacy pickle once instead of re-embedding everything
+        if os.path.exists(LEGACY_RAG_PICKLE):
+            if rag.load(LEGACY_RAG_PICKLE):
+                rag.save(RAG_INDEX_DIR)
+                rag.load(RAG_INDEX_DIR)
+                rag_system = rag
+                print(f"Converted {LEGACY_RAG_PICKLE} to {RAG_INDEX_DIR}/")
+                return True
+        
         # If not found, build new one
         print("Building new RAG system...")
-        if rag_system.load_medical_knowledge() and rag_system.build_index():
-            rag_system.save()
+        if rag.load_medical_knowledge() and rag.build_index():
+            rag.save(RAG_INDEX_DIR)
+            rag_system = rag
             print("RAG system built and saved!")
             return True
         
@@ -55,13 +172,113 @@ def initialize_predictor():
     global predictor
     try:
         predictor = DiseasePredictionSystem()
-        print("Disease prediction system loaded successfully!")
+        warmed = predictor.warm_up_cache()
+        print(f"Disease prediction system loaded successfully! ({warmed} symptom sets cached)")
         return True
     except Exception as e:
         print(f"Error initializing disease prediction system: {e}")
         return False
 
 
+def run_startup_step(name, func):
+    """
+    Run one subsystem's initialization, recording its state and duration for /api/ready
+    
+    Returns:
+    The result of func (False if it raised)
+    """
+    with subsystem_lock:
+        subsystem_status[name] = {'state': 'loading'}
+    start = time.perf_counter()
+    try:
+        result = func()
+        state = {'state': 'ready' if result else 'failed'}
+    except Exception as e:
+        result = False
+        state = {'state': 'failed', 'error': str(e)}
+    state['seconds'] = round(time.perf_counter() - start, 3)
+    with subsystem_lock:
+        subsystem_status[name] = state
+    return result
+
+
+def warm_up_in_background():
+    """
+    Load the RAG index, then the embedding model, on a daemon thread
+    
+    The server starts answering immediately; chat turns run without RAG
+    context until the index is in place, and a dense query arriving before
+    the model is warm loads it itself.
+    """
+    def warm_up():
+        if run_startup_step('rag_index', initialize_rag):
+            print("✓ RAG system ready!")
+            if RAG_WARM_UP_MODEL:
+                run_startup_step('embedding_model', lambda: rag_system.warm_up() is not None)
+                return
+        else:
+            print("✗ RAG system not available (chatbot will work without it)")
+        skip_startup_step('embedding_model')
+    
+    # Mark the index as loading before the thread runs so start_subsystems never starts it twice
+    with subsystem_lock:
+        subsystem_status['rag_index'] = {'state': 'loading'}
+    thread = threading.Thread(target=warm_up, name='rag-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def skip_startup_step(name):
+    """Record that a subsystem will not be loaded"""
+    with subsystem_lock:
+        subsystem_status[name] = {'state': 'skipped'}
+
+
+def ensure_predictor():
+    """
+    Load the disease prediction system unless it is already loaded
+    
+    Concurrent callers wait for a load in progress instead of starting their own.
+    
+    Returns:
+    True if the predictor is available
+    """
+    with predictor_lock:
+        if predictor is None:
+            run_startup_step('predictor', initialize_predictor)
+        return predictor is not None
+
+
+def start_subsystems():
+    """
+    Start loading every subsystem that is still pending, once per process
+    
+    Runs before the first request, so /api/ready reaches 200 under any WSGI
+    server (gunicorn app:app never executes the __main__ block, and its
+    workers fork after import, so nothing can be started at import time).
+    The predictor and the RAG index load on background threads.
+    """
+    global startup_started
+    if startup_started:
+        return
+    with subsystem_lock:
+        if startup_started:
+            return
+        startup_started = True
+        pending = {name for name in ('predictor', 'rag_index') if subsystem_status[name]['state'] == 'pending'}
+        if 'predictor' in pending:
+            subsystem_status['predictor'] = {'state': 'loading'}
+    if 'rag_index' in pending:
+        warm_up_in_background()
+    if 'predictor' in pending:
+        threading.Thread(target=ensure_predictor, name='predictor-warm-up', daemon=True).start()
+
+
+@app.before_request
+def start_on_first_request():
+    start_subsystems()
+
+
 def get_session_id():
     """Get or create a session ID for the current user"""
     if 'session_id' not in session:
@@ -69,71 +286,180 @@ def get_session_id():
     return session['session_id']
 
 
-def get_chat_history_file():
-    """Get the chat history file path for the current session"""
+def load_chat_history(limit=None):
+    """
+    Load chat history for the current session
+    
+    Parameters:
+    limit: If given, only the most recent `limit` messages are read
+    """
     session_id = get_session_id()
-    return os.path.join(CHAT_HISTORY_DIR, f"{session_id}.json")
-
-
-def load_chat_history():
-    """Load chat history from file"""
-    history_file = get_chat_history_file()
-    if os.path.exists(history_file):
-        try:
-            with open(history_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    if limit is None:
+        return conversation_store.load(session_id)
+    return conversation_store.tail(session_id, limit)
 
 
-def save_chat_history(history):
-    """Save chat history to file"""
-    history_file = get_chat_history_file()
-    with open(history_file, 'w', encoding='utf-8') as f:
-        json.dump(history, f, indent=2, ensure_ascii=False)
+def append_chat_history(entries):
+    """Append new messages to the current session's history"""
+    conversation_store.append(get_session_id(), entries)
 
 
-def call_openrouter_api(messages):
+def call_llm_api(messages, cache_key=None):
     """
-    Call OpenRouter API with message history
+    Call the configured LLM backend with message history
     
     Parameters:
     messages: List of message dictionaries with 'role' and 'content'
+    cache_key: Response cache key of the turn (see prepare_chat_turn); a
+               successful reply is stored under it
     
     Returns:
     Response text from the AI
     """
     try:
-        response = requests.post(
-            url=OPENROUTER_URL,
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "http://localhost:5000",
-                "X-Title": "Disease Prediction Chatbot",
-            },
-            data=json.dumps({
-                "model": "meta-llama/llama-3.3-70b-instruct:free",
-                "messages": messages,
-            }),
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        result = response.json()
-        
-        if 'choices' in result and len(result['choices']) > 0:
-            return result['choices'][0]['message']['content']
-        else:
+        start = time.perf_counter()
+        content = llm_client.complete(messages)
+        if content is None:
             return "Sorry, I couldn't generate a response."
+        store_cached_response(cache_key, content, time.perf_counter() - start)
+        return content
     
-    except requests.exceptions.RequestException as e:
+    except LLMError as e:
         return f"Error connecting to AI service: {str(e)}"
     except Exception as e:
         return f"Error: {str(e)}"
 
 
+def build_prediction_text(user_message):
+    """
+    Run the disease predictor if the message looks like a list of symptoms
+    
+    Returns:
+    Formatted prediction text, or an empty string if no prediction was made
+    """
+    prediction_text = ""
+    if predictor:
+        # Trigger if the message looks like a list or description of symptoms,
+        # unless it opens with a question word
+        message_lower = user_message.lower()
+        is_question = not QUESTION_WORDS.isdisjoint(message_lower.split()[:3])
+        
+        symptoms = [] if is_question else predictor.extract_symptoms_from_message(user_message)
+        should_predict = ',' in user_message or PREDICTION_CUES.search(message_lower) is not None or len(symptoms) > 1
+        
+        if should_predict and symptoms:
+            result = predictor.predict_disease(symptoms, top_n=3)
+            if 'predictions' in result and result['predictions']:
+                prediction_text = "Based on your symptoms, here are the top predictions:\n\n"
+                for i, pred in enumerate(result['predictions'], 1):
+                    prediction_text += f"{i}. **{pred['disease']}**\n"
+                    prediction_text += f"   - Confidence: {pred['confidence']}%\n"
+                    prediction_text += f"   - Severity: {pred['severity_level']}\n"
+                    prediction_text += f"   - Description: {pred['description']}\n"
+                    if pred['precautions']:
+                        prediction_text += f"   - Precautions: {', '.join(pred['precautions'])}\n"
+                    prediction_text += "\n"
+                
+                if result['corrected_symptoms']:
+                    corrections = ', '.join(f"{c['input']} as {c['symptom']} ({round(c['confidence'] * 100)}% match)"
+                                            for c in result['corrected_symptoms'])
+                    prediction_text += f"Note: Interpreted {corrections}\n\n"
+                if result['unmatched_symptoms']:
+                    prediction_text += f"Note: Some symptoms were not recognized: {', '.join(result['unmatched_symptoms'])}\n\n"
+            elif 'error' in result:
+                prediction_text = f"Could not predict disease: {result['error']}\n\n"
+    
+    return prediction_text
+
+
+def prepare_chat_turn(user_message, session_id):
+    """
+    Build everything a chat turn needs before the LLM call
+    
+    History loading, disease prediction and RAG retrieval do not depend on
+    each other, so they run concurrently on the pipeline's thread pool.
+    
+    Returns:
+    Tuple of (user history entry, prediction text, messages for the LLM,
+    stage durations in seconds, response cache key or None, LLM coalescing
+    key or None)
+    """
+    # Add user message to history
+    user_entry = {
+        'role': 'user',
+        'content': user_message,
+        'timestamp': datetime.now().isoformat()
+    }
+    
+    stages = {
+        # Load the recent part of the chat history used for the prompt
+        'history': lambda: conversation_store.tail(session_id, PROMPT_HISTORY_MESSAGES),
+        # Check for disease prediction request
+        'prediction': lambda: build_prediction_text(user_message),
+    }
+    if rag_system:
+        # Get relevant context from RAG system
+        stages['rag'] = lambda: rag_flight.do((normalize_query(user_message), 5),
+                                              lambda: rag_system.get_context_with_ids(user_message, top_k=5))
+    
+    results, timings = chat_pipeline.run_parallel(stages)
+    chat_history = results['history']
+    prediction_text = results['prediction']
+    context, doc_ids = results.get('rag', ("", ()))
+    
+    # Only a conversation's first message is answered from the response cache;
+    # later replies depend on the personal history in the prompt. Similar
+    # questions are matched by the embedding retrieval computed, if any
+    # (symptom lists answered from the BM25 index only match exactly)
+    cache_key = None
+    if response_cache is not None and rag_system:
+        if chat_history:
+            response_cache.bypass()
+        else:
+            cache_key = (normalize_query(user_message), response_scope(prediction_text, doc_ids),
+                         rag_system.cached_query_embedding(user_message))
+    
+    # Fit system prompt, RAG context, prediction and recent turns into the token budget
+    api_messages, _ = chat_pipeline.time_stage(timings, 'context_build', lambda: context_builder.build(
+        SYSTEM_PROMPT, chat_history, user_message,
+        rag_context=context, prediction_text=prediction_text
+    ))
+    
+    # Without history the prompt is fully determined by the message, so
+    # identical concurrent first messages can share one LLM call
+    flight_key = None
+    if not chat_history:
+        flight_key = hashlib.sha256(json.dumps(api_messages, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    return user_entry, prediction_text, api_messages, timings, cache_key, flight_key
+
+
+def get_cached_response(cache_key, timings):
+    """Cached LLM reply for the turn, or None (also when caching is off for it)"""
+    if cache_key is None:
+        return None
+    query, scope, embedding = cache_key
+    return chat_pipeline.time_stage(timings, 'response_cache', lambda: response_cache.get(query, scope, embedding))
+
+
+def store_cached_response(cache_key, reply, llm_seconds):
+    """Remember a successful LLM reply; llm_seconds is what a later hit saves"""
+    if cache_key is not None:
+        query, scope, embedding = cache_key
+        response_cache.put(query, scope, reply, llm_seconds, embedding)
+
+
+def record_chat_timings(timings, start):
+    """Store one chat turn's stage durations and its end-to-end time"""
+    timings['total'] = time.perf_counter() - start
+    chat_pipeline.metrics.record(timings, parallel_stages=PARALLEL_STAGES)
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Events frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @app.route('/')
 def index():
     """Render the main chatbot interface"""
@@ -152,76 +478,17 @@ def chat():
         if not user_message:
             return jsonify({'error': 'Message cannot be empty'}), 400
         
-        # Load existing chat history
-        chat_history = load_chat_history()
+        start = time.perf_counter()
+        user_entry, prediction_text, api_messages, timings, cache_key, flight_key = \
+            prepare_chat_turn(user_message, get_session_id())
         
-        # Add user message to history
-        user_entry = {
-            'role': 'user',
-            'content': user_message,
-            'timestamp': datetime.now().isoformat()
-        }
-        chat_history.append(user_entry)
-        
-        # Check for disease prediction request
-        prediction_text = ""
-        if predictor:
-            # Improved detection: trigger if message looks like providing symptoms
-            message_lower = user_message.lower()
-            has_comma = ',' in user_message
-            has_keywords = any(keyword in message_lower for keyword in ['symptoms', 'symptom', 'predict', 'disease'])
-            has_indicators = any(phrase in message_lower for phrase in ['i have', 'my symptoms', 'symptoms are', 'symptoms:', 'predict from'])
-            is_question = any(qw in message_lower.split()[:3] for qw in ['what', 'how', 'why', 'when', 'where', 'who', 'can', 'do'])
-            
-            should_predict = (has_comma and has_keywords) or has_indicators or (has_comma and len(user_message.split(',')) > 1)
-            should_predict = should_predict and not is_question
-            
-            if should_predict:
-                # Extract symptoms
-                symptoms = predictor.extract_symptoms_from_message(user_message)
-                if symptoms:
-                    result = predictor.predict_disease(symptoms, top_n=3)
-                    if 'predictions' in result and result['predictions']:
-                        prediction_text = "Based on your symptoms, here are the top predictions:\n\n"
-                        for i, pred in enumerate(result['predictions'], 1):
-                            prediction_text += f"{i}. **{pred['disease']}**\n"
-                            prediction_text += f"   - Confidence: {pred['confidence']}%\n"
-                            prediction_text += f"   - Severity: {pred['severity_level']}\n"
-                            prediction_text += f"   - Description: {pred['description']}\n"
-                            if pred['precautions']:
-                                prediction_text += f"   - Precautions: {', '.join(pred['precautions'])}\n"
-                            prediction_text += "\n"
-                        
-                        if result['unmatched_symptoms']:
-                            prediction_text += f"Note: Some symptoms were not recognized: {', '.join(result['unmatched_symptoms'])}\n\n"
-                    elif 'error' in result:
-                        prediction_text = f"Could not predict disease: {result['error']}\n\n"
-        
-        # Prepare messages for API
-        api_messages = [{'role': msg['role'], 'content': msg['content']} for msg in chat_history]
-        
-        # Get relevant context from RAG system
-        context = ""
-        if rag_system:
-            context = rag_system.get_context_for_query(user_message, top_k=5)
-        
-        # Add system message with RAG context and prediction info
-        system_content = 'You are a helpful medical assistant chatbot. You can answer questions about symptoms, diseases, and health. Be empathetic and informative, but always remind users to consult healthcare professionals for serious concerns.'
-        
-        if context:
-            system_content += f"\n\nRelevant medical context:\n{context}"
-        
-        if prediction_text:
-            system_content += f"\n\nDisease prediction results based on user input:\n{prediction_text}"
-        
-        system_message = {
-            'role': 'system',
-            'content': system_content
-        }
-        api_messages.insert(0, system_message)
-        
-        # Get AI response
-        ai_response = call_openrouter_api(api_messages)
+        # Get AI response (from the response cache for a repeated question)
+        ai_response = get_cached_response(cache_key, timings)
+        if ai_response is None and flight_key is not None:
+            ai_response = chat_pipeline.time_stage(timings, 'llm', lambda: llm_flight.do(
+                flight_key, lambda: call_llm_api(api_messages, cache_key)))
+        elif ai_response is None:
+            ai_response = chat_pipeline.time_stage(timings, 'llm', lambda: call_llm_api(api_messages, cache_key))
         
         # Combine prediction and AI response
         full_response = prediction_text + ai_response
@@ -232,10 +499,10 @@ def chat():
             'content': full_response,
             'timestamp': datetime.now().isoformat()
         }
-        chat_history.append(ai_entry)
         
-        # Save updated history
-        save_chat_history(chat_history)
+        # Persist this turn (user message and reply) in one append
+        chat_pipeline.time_stage(timings, 'save', lambda: append_chat_history([user_entry, ai_entry]))
+        record_chat_timings(timings, start)
         
         return jsonify({
             'response': full_response,
@@ -246,6 +513,82 @@ def chat():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming variant of /api/chat using Server-Sent Events
+    
+    Emits a 'prediction' event with the locally computed prediction text
+    first, then one 'token' event per LLM text delta, and finally a 'done'
+    event once the whole turn has been saved to the history.
+    """
+    try:
+        data = request.json
+        user_message = data.get('message', '').strip()
+        
+        if not user_message:
+            return jsonify({'error': 'Message cannot be empty'}), 400
+        
+        start = time.perf_counter()
+        session_id = get_session_id()
+        user_entry, prediction_text, api_messages, timings, cache_key, flight_key = \
+            prepare_chat_turn(user_message, session_id)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        parts = []
+        ai_entry = {'role': 'assistant', 'content': ''}
+        try:
+            if prediction_text:
+                yield format_sse('prediction', {'content': prediction_text})
+            
+            cached = get_cached_response(cache_key, timings)
+            try:
+                if cached is not None:
+                    parts.append(cached)
+                    yield format_sse('token', {'content': cached})
+                else:
+                    llm_start = time.perf_counter()
+                    # Identical concurrent first messages subscribe to one upstream stream
+                    leader = True
+                    if flight_key is not None:
+                        deltas, leader = llm_flight.stream(flight_key, lambda: llm_client.stream(api_messages))
+                    else:
+                        deltas = llm_client.stream(api_messages)
+                    for delta in deltas:
+                        if not parts:
+                            timings['llm_first_token'] = time.perf_counter() - llm_start
+                        parts.append(delta)
+                        yield format_sse('token', {'content': delta})
+                    timings['llm'] = time.perf_counter() - llm_start
+                    if parts and leader:
+                        store_cached_response(cache_key, ''.join(parts), timings['llm'])
+            except LLMError as e:
+                error_text = f"Error connecting to AI service: {str(e)}"
+                parts.append(error_text)
+                yield format_sse('token', {'content': error_text})
+            
+            if not parts:
+                parts.append("Sorry, I couldn't generate a response.")
+                yield format_sse('token', {'content': parts[0]})
+        finally:
+            # Save whatever was produced, even if the client disconnected mid-stream
+            ai_entry['content'] = prediction_text + ''.join(parts)
+            ai_entry['timestamp'] = datetime.now().isoformat()
+            chat_pipeline.time_stage(timings, 'save', lambda: conversation_store.append(session_id, [user_entry, ai_entry]))
+            record_chat_timings(timings, start)
+        
+        yield format_sse('done', {'timestamp': ai_entry['timestamp']})
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/history', methods=['GET'])
 def get_history():
     """Get chat history for the current session"""
@@ -260,9 +603,7 @@ def get_history():
 def clear_history():
     """Clear chat history for the current session"""
     try:
-        history_file = get_chat_history_file()
-        if os.path.exists(history_file):
-            os.remove(history_file)
+        conversation_store.clear(get_session_id())
         return jsonify({'message': 'Chat history cleared'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -272,7 +613,6 @@ def clear_history():
 def predict_disease():
     """Predict disease based on symptoms using the trained model"""
     try:
-        import pickle
         import numpy as np
         
         data = request.json
@@ -281,32 +621,24 @@ def predict_disease():
         if not symptoms:
             return jsonify({'error': 'No symptoms provided'}), 400
         
-        # Load model
-        with open('random_forest_model.pkl', 'rb') as f:
-            model = pickle.load(f)
-        
-        with open('model_data.pkl', 'rb') as f:
-            model_data = pickle.load(f)
+        # Get the shared model (loaded once, hot-reloaded when the files change)
+        bundle = get_registry().get()
+        model = bundle.engine  # compiled forest, same probabilities as the sklearn model
         
-        all_symptoms = model_data['all_symptoms']
-        description_dict = model_data['description_dict']
-        precaution_dict = model_data['precaution_dict']
-        disease_severity_dict = model_data['disease_severity_dict']
+        all_symptoms = bundle.all_symptoms
+        description_dict = bundle.description_dict
+        precaution_dict = bundle.precaution_dict
+        disease_severity_dict = bundle.disease_severity_dict
         
-        # Create feature vector
+        # Create feature vector (misspelled symptoms are corrected when the match is confident)
         feature_vector = [0] * len(all_symptoms)
-        matched_symptoms = []
-        
-        for symptom in symptoms:
-            symptom = symptom.strip().lower().replace(' ', '_')
-            for idx, existing_symptom in enumerate(all_symptoms):
-                if existing_symptom.lower() == symptom:
-                    feature_vector[idx] = 1
-                    matched_symptoms.append(existing_symptom)
-                    break
+        indices, matched_symptoms, _, corrected_symptoms, suggestions = \
+            bundle.symptom_index.match_fuzzy(symptoms, bundle.fuzzy_index)
+        for idx in indices:
+            feature_vector[idx] = 1
         
         if sum(feature_vector) == 0:
-            return jsonify({'error': 'No matching symptoms found'}), 400
+            return jsonify({'error': 'No matching symptoms found', 'suggestions': suggestions}), 400
         
         # Predict
         prediction_proba = model.predict_proba([feature_vector])[0]
@@ -342,7 +674,9 @@ def predict_disease():
         
         return jsonify({
             'predictions': results,
-            'matched_symptoms': matched_symptoms
+            'matched_symptoms': matched_symptoms,
+            'corrected_symptoms': corrected_symptoms,
+            'suggestions': suggestions
         })
     
     except FileNotFoundError:
@@ -351,14 +685,78 @@ def predict_disease():
         return jsonify({'error': str(e)}), 500
 
 
+def batch_item(result=None, error=None):
+    """
+    One /api/predict-disease/batch result
+    
+    Every item has the same keys; a failed one has an error message, no
+    predictions and whatever symptom matching produced (empty lists for a
+    malformed set).
+    """
+    result = result or {}
+    item = {
+        'predictions': [pred for pred in result.get('predictions', []) if pred['confidence'] >= 1],
+        'matched_symptoms': result.get('matched_symptoms', []),
+        'unmatched_symptoms': result.get('unmatched_symptoms', []),
+        'corrected_symptoms': result.get('corrected_symptoms', []),
+        'suggestions': result.get('suggestions', {})
+    }
+    error = error or result.get('error')
+    if error:
+        item['error'] = error
+    return item
+
+
+@app.route('/api/predict-disease/batch', methods=['POST'])
+def predict_disease_batch():
+    """Predict diseases for many symptom sets with one model call"""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        symptom_sets = data.get('symptom_sets', [])
+        top_n = int(data.get('top_n', 3))
+        
+        if not symptom_sets or not isinstance(symptom_sets, list):
+            return jsonify({'error': 'No symptom sets provided'}), 400
+        if len(symptom_sets) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'Too many symptom sets (max {MAX_BATCH_SIZE})'}), 400
+        if top_n < 1:
+            return jsonify({'error': 'top_n must be a positive integer'}), 400
+        
+        # Malformed sets get their own error entry; the rest are still predicted
+        invalid = {}
+        for row, symptoms in enumerate(symptom_sets):
+            if not isinstance(symptoms, list):
+                invalid[row] = 'Symptom set must be a list of symptom names'
+            elif not all(isinstance(symptom, str) for symptom in symptoms):
+                invalid[row] = 'Every symptom must be a string'
+        if len(invalid) == len(symptom_sets):
+            return jsonify({'error': 'No valid symptom sets provided',
+                            'results': [batch_item(error=invalid[row]) for row in range(len(symptom_sets))]}), 400
+        
+        if not ensure_predictor():
+            return jsonify({'error': 'Model not found. Please train the model first using trainmodel.py'}), 500
+        
+        valid_sets = [symptoms for row, symptoms in enumerate(symptom_sets) if row not in invalid]
+        predicted = iter(predictor.predict_batch(valid_sets, top_n=top_n))
+        # Same prediction shape as /api/predict-disease: very low confidence predictions are skipped
+        results = [batch_item(error=invalid[row]) if row in invalid else batch_item(next(predicted))
+                   for row in range(len(symptom_sets))]
+        
+        return jsonify({'results': results})
+    
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid request: {e}'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/symptoms', methods=['GET'])
 def get_symptoms():
     """Get list of all available symptoms"""
     try:
-        import pickle
-        
-        with open('model_data.pkl', 'rb') as f:
-            model_data = pickle.load(f)
+        model_data = get_registry().get_model_data()
         
         symptoms = model_data['all_symptoms']
         return jsonify({'symptoms': symptoms})
@@ -369,29 +767,75 @@ def get_symptoms():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Report runtime metrics for the chat pipeline"""
+    return jsonify({
+        'prompt': context_builder.stats.snapshot(),
+        'llm': llm_client.stats(),
+        'pipeline': chat_pipeline.metrics.snapshot(),
+        'rag': rag_system.cache_stats() if rag_system else None,
+        'response_cache': response_cache.stats() if response_cache is not None else None,
+        'coalescing': {'rag': rag_flight.stats(), 'llm': llm_flight.stats()}
+    })
+
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """
+    Report which subsystems are warm
+    
+    Returns 200 once the predictor is loaded and RAG start-up has finished
+    (successfully or not), 503 before that.
+    """
+    with subsystem_lock:
+        status = {name: dict(state) for name, state in subsystem_status.items()}
+    # The model may also have been loaded on demand by a dense query
+    if rag_system is not None and rag_system.model_loaded:
+        status['embedding_model']['state'] = 'ready'
+    
+    is_ready = status['predictor']['state'] == 'ready' and \
+        status['rag_index']['state'] in ('ready', 'failed')
+    return jsonify({'ready': is_ready, 'subsystems': status}), 200 if is_ready else 503
+
+
+@app.route('/api/model-status', methods=['GET'])
+def model_status():
+    """Report which model version is loaded, its load time and memory"""
+    status = get_registry().stats()
+    if predictor:
+        status['prediction_cache'] = predictor.prediction_cache.stats()
+    return jsonify(status)
+
+
 if __name__ == '__main__':
     print("="*80)
     print("MEDICAL CHATBOT WITH AI AND RAG")
     print("="*80)
     
-    # Initialize RAG system
-    print("\nInitializing RAG system...")
-    if initialize_rag():
-        print("✓ RAG system ready!")
-    else:
-        print("✗ RAG system not available (chatbot will work without it)")
+    # Import any per-session JSON history files left by older versions
+    migrated = migrate_json_history(conversation_store, CHAT_HISTORY_DIR)
+    if migrated['sessions']:
+        print(f"\nMigrated {migrated['messages']} messages from {migrated['sessions']} legacy history files")
+    
+    # Initialize RAG system (in the background; progress is reported by /api/ready)
+    print("\nInitializing RAG system in the background...")
+    warm_up_in_background()
     
     # Initialize Disease Prediction System
     print("\nInitializing disease prediction system...")
-    if initialize_predictor():
+    if ensure_predictor():
         print("✓ Disease prediction system ready!")
     else:
         print("✗ Disease prediction system not available")
     
     print("\nStarting Flask server...")
     print("Open your browser and go to: http://localhost:5000")
-    print("\nNote: Set your OpenRouter API key as environment variable:")
-    print("  set OPENROUTER_API_KEY=your-api-key-here")
+    if LLM_BACKEND == 'openrouter':
+        print("\nNote: Set your OpenRouter API key as environment variable:")
+        print("  set OPENROUTER_API_KEY=your-api-key-here")
+    else:
+        print(f"\nLLM backend: {LLM_BACKEND}")
     print("\nPress Ctrl+C to stop the server")
     print("="*80)
     
@@ -0,0 +1,1048 @@
+"""
+Performance checks for the chatbot's local components
+
+Usage:
+    python benchmark.py forest [--repeat N]
+    python benchmark.py history [--turns N]
+    python benchmark.py rag-load [--source PATH] [--runs N]
+    python benchmark.py embed [--scale N] [--batch-size N] [--chunk-size N] [--workers N]
+    python benchmark.py ann [--scale N] [--queries N] [--k K] [--types flat,ivf,hnsw,ivfpq]
+    python benchmark.py kb [--k K]
+    python benchmark.py ingest [--scale N]
+    python benchmark.py retrieval [--k K] [--cases N]
+    python benchmark.py startup [--index-dir DIR] [--runs N]
+    python benchmark.py extract [--messages N]
+    python benchmark.py fuzzy [--typos N]
+    python benchmark.py chat [--sessions N] [--turns N] [--concurrency N] [--llm-latency S] [--rag]
+    python benchmark.py response-cache [--sessions N] [--llm-latency S]
+    python benchmark.py coalesce [--clients N] [--llm-latency S] [--stream | --mixed]
+
+Each subcommand prints its measurements and exits non-zero if a
+correctness check fails, so it can be run after retraining the model.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def _timeit(func, repeat):
+    """Return per-call latencies in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def _report(label, timings):
+    print(f"  {label:<32} p50 {np.percentile(timings, 50):8.3f} ms   "
+          f"p99 {np.percentile(timings, 99):8.3f} ms")
+
+
+def _training_matrix(bundle):
+    """Binary feature matrix for every row of dataset/dataset.csv"""
+    df_dataset = pd.read_csv('dataset/dataset.csv')
+    symptom_columns = df_dataset.columns[1:]
+    X = np.zeros((len(df_dataset), len(bundle.all_symptoms)), dtype=np.float32)
+    for row, values in enumerate(df_dataset[symptom_columns].itertuples(index=False)):
+        indices, _, _ = bundle.symptom_index.match([v for v in values if isinstance(v, str)])
+        X[row, indices] = 1
+    return X
+
+
+def bench_forest(args):
+    """Parity and latency of the compiled forest against sklearn's predict_proba"""
+    from model_registry import get_registry
+
+    bundle = get_registry().get()
+    model, engine = bundle.model, bundle.engine
+    model.verbose = 0
+    X = _training_matrix(bundle)
+
+    print(f"Compiled forest: {len(engine.roots)} trees, {engine.n_nodes} nodes, "
+          f"{engine.nbytes / 1e6:.2f} MB")
+
+    expected = model.predict_proba(X)
+    actual = engine.predict_proba(X)
+    max_error = float(np.abs(expected - actual).max())
+    same_top = float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean())
+    print(f"Parity on {len(X)} training rows: max |diff| {max_error:.2e}, "
+          f"top-1 agreement {same_top * 100:.2f}%")
+
+    row = X[:1]
+    print("Single-row latency:")
+    _report('sklearn predict_proba', _timeit(lambda: model.predict_proba(row), args.repeat))
+    _report('compiled predict_proba', _timeit(lambda: engine.predict_proba(row), args.repeat))
+
+    batch = X[:256]
+    print(f"Batch latency ({len(batch)} rows):")
+    _report('sklearn predict_proba', _timeit(lambda: model.predict_proba(batch), args.repeat))
+    _report('compiled predict_proba', _timeit(lambda: engine.predict_proba(batch), args.repeat))
+
+    return max_error < 1e-9
+
+
+def bench_history(args):
+    """Per-turn cost of rewriting a JSON history file vs. appending to the store"""
+    from conversation_store import ConversationStore
+
+    message = {'role': 'user', 'content': 'I have itching, skin rash and a mild fever ' * 8,
+               'timestamp': '2025-01-01T00:00:00'}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Legacy behaviour: load the whole file, append, rewrite with indent=2
+        history_file = os.path.join(tmp, 'session.json')
+        start = time.perf_counter()
+        for _ in range(args.turns):
+            history = []
+            if os.path.exists(history_file):
+                with open(history_file, 'r', encoding='utf-8') as f:
+                    history = json.load(f)
+            history.extend([message, message])
+            with open(history_file, 'w', encoding='utf-8') as f:
+                json.dump(history, f, indent=2, ensure_ascii=False)
+        json_elapsed = time.perf_counter() - start
+
+        store = ConversationStore(os.path.join(tmp, 'conversations.db'))
+        start = time.perf_counter()
+        for _ in range(args.turns):
+            store.tail('session', 40)
+            store.append('session', [message, message])
+        store_elapsed = time.perf_counter() - start
+        ok = store.count('session') == 2 * args.turns
+        store.close()
+
+    print(f"{args.turns} chat turns in one session (2 messages per turn):")
+    print(f"  JSON rewrite      {args.turns / json_elapsed:10.1f} turns/s   "
+          f"{json_elapsed / args.turns * 1000:8.3f} ms/turn")
+    print(f"  SQLite WAL append {args.turns / store_elapsed:10.1f} turns/s   "
+          f"{store_elapsed / args.turns * 1000:8.3f} ms/turn")
+    return ok
+
+
+# Child process for bench_rag_load: loads one layout cold, runs a query, prints JSON
+_RAG_LOAD_SCRIPT = """
+import json, os, sys, time
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+import pickle
+import faiss
+import numpy as np
+import rag_storage
+layout, path = sys.argv[1], sys.argv[2]
+before = rss()
+start = time.perf_counter()
+if layout == 'pickle':
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    index = faiss.deserialize_index(data['index'])
+    documents, metadata, doc_ids = data['documents'], data['metadata'], data.get('doc_ids')
+else:
+    index, documents, metadata, doc_ids, _ = rag_storage.load_rag_index(path)
+load_ms = (time.perf_counter() - start) * 1000
+rows = {int(doc_id): row for row, doc_id in enumerate(doc_ids)} if doc_ids is not None else None
+first = int(doc_ids[0]) if doc_ids is not None else 0
+query = np.asarray(index.reconstruct(first), dtype=np.float32).reshape(1, -1)
+start = time.perf_counter()
+_, ids = index.search(query, 5)
+hits = [(documents[rows[i] if rows else i], metadata[rows[i] if rows else i]) for i in ids[0].tolist() if i >= 0]
+query_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({'load_ms': load_ms, 'first_query_ms': query_ms, 'rss_delta': rss() - before,
+                  'ids': [int(i) for i in ids[0]], 'hits': hits}))
+"""
+
+
+def bench_rag_load(args):
+    """Cold-start time and resident memory of the pickle vs. memory-mapped RAG layouts"""
+    import pickle
+    import faiss
+    from rag_storage import load_rag_index, save_rag_index
+
+    if args.source.endswith('.pkl'):
+        with open(args.source, 'rb') as f:
+            data = pickle.load(f)
+        index = faiss.deserialize_index(data['index'])
+        documents, metadata, doc_ids = data['documents'], data['metadata'], data.get('doc_ids')
+    else:
+        index, documents, metadata, doc_ids, _ = load_rag_index(args.source, mmap_index=False)
+        documents, metadata = list(documents), list(metadata)
+        doc_ids = np.array(doc_ids) if doc_ids is not None else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = os.path.join(tmp, 'rag_system.pkl')
+        with open(pickle_path, 'wb') as f:
+            pickle.dump({'documents': documents, 'metadata': metadata, 'doc_ids': doc_ids,
+                         'index': faiss.serialize_index(index)}, f)
+        index_dir = os.path.join(tmp, 'rag_index')
+        save_rag_index(index_dir, index, documents, metadata, doc_ids)
+
+        print(f"{len(documents)} documents, {index.ntotal} vectors of dimension {index.d}")
+        print(f"  pickle size {os.path.getsize(pickle_path) / 1e6:8.2f} MB   "
+              f"directory size {sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(index_dir) for name in names) / 1e6:8.2f} MB")
+
+        results = {}
+        for layout, path in (('pickle', pickle_path), ('mmap', index_dir)):
+            runs = []
+            for _ in range(args.runs):
+                output = subprocess.run([sys.executable, '-c', _RAG_LOAD_SCRIPT, layout, path],
+                                        capture_output=True, text=True, check=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__)))
+                runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+            results[layout] = runs
+            print(f"  {layout:<7} load p50 {np.median([r['load_ms'] for r in runs]):8.2f} ms   "
+                  f"first query p50 {np.median([r['first_query_ms'] for r in runs]):8.2f} ms   "
+                  f"RSS +{np.median([r['rss_delta'] for r in runs]) / 1e6:7.2f} MB")
+
+    ok = results['pickle'][0]['ids'] == results['mmap'][0]['ids'] and \
+        results['pickle'][0]['hits'] == results['mmap'][0]['hits']
+    print(f"Same results from both layouts: {ok}")
+    return ok
+
+
+# Child process for bench_embed: encodes the knowledge base one way, prints JSON
+_EMBED_SCRIPT = """
+import json, resource, sys, tempfile, os, time
+import faiss
+import numpy as np
+from rag_system import MedicalRAG
+mode, scale, batch_size, chunk_size, workers = sys.argv[1], *map(int, sys.argv[2:6])
+rag = MedicalRAG(encode_batch_size=batch_size, encode_chunk_size=chunk_size, encode_workers=workers)
+rag.load_medical_knowledge()
+documents = list(rag.documents) * scale
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if mode == 'one-shot':
+    embeddings = rag.embedding_model.encode(documents, batch_size=batch_size, convert_to_numpy=True).astype(np.float32)
+    faiss.normalize_L2(embeddings)
+else:
+    scratch = tempfile.mkdtemp()
+    embeddings = rag.pipeline.encode_to_memmap(documents, os.path.join(scratch, 'embeddings.npy'))
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'seconds': elapsed, 'peak_kb': peak - baseline, 'documents': len(documents),
+                  'checksum': float(np.asarray(embeddings[::997]).sum())}))
+"""
+
+
+def bench_embed(args):
+    """Throughput and peak memory of one-shot encoding vs. the chunked pipeline"""
+    configs = [('one-shot', 1), ('pipeline', 1)]
+    if args.workers > 1:
+        configs.append(('pipeline', args.workers))
+
+    results = []
+    for mode, workers in configs:
+        output = subprocess.run([sys.executable, '-c', _EMBED_SCRIPT, mode, str(args.scale), str(args.batch_size),
+                                 str(args.chunk_size), str(workers)],
+                                capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        results.append(result)
+        label = f"{mode} ({workers} worker{'s' if workers > 1 else ''})"
+        print(f"  {label:<24} {result['documents'] / result['seconds']:10.0f} docs/s   "
+              f"peak RSS +{result['peak_kb'] / 1024:8.1f} MB")
+
+    # Every configuration must produce the same vectors
+    checksums = [r['checksum'] for r in results]
+    ok = all(abs(c - checksums[0]) <= 1e-3 * max(1.0, abs(checksums[0])) for c in checksums)
+    print(f"{results[0]['documents']} documents; identical embeddings across configurations: {ok}")
+    return ok
+
+
+def bench_ann(args):
+    """Recall@k against exact search, query latency and memory of each ANN index type"""
+    import faiss
+    from ann_index import INDEX_TYPES, create_index, describe_index, train_index
+    from rag_system import MedicalRAG
+
+    rag = MedicalRAG()
+    rag.load_medical_knowledge()
+    with tempfile.TemporaryDirectory() as tmp:
+        base = np.array(rag.pipeline.encode_to_memmap(list(rag.documents), os.path.join(tmp, 'embeddings.npy')))
+
+    # Larger corpora are simulated with jittered copies of the real embeddings
+    rng = np.random.default_rng(0)
+    corpus = np.vstack([base] + [base + rng.normal(0, 0.05, base.shape).astype(np.float32)
+                                 for _ in range(args.scale - 1)])
+    faiss.normalize_L2(corpus)
+    queries = corpus[rng.choice(len(corpus), args.queries, replace=False)]
+    queries = queries + rng.normal(0, 0.1, queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+    ids = np.arange(len(corpus), dtype=np.int64)
+    print(f"{len(corpus)} vectors of dimension {corpus.shape[1]}, {len(queries)} queries, k={args.k}")
+
+    exact = faiss.IndexFlatIP(corpus.shape[1])
+    exact.add(corpus)
+    truth_scores, _ = exact.search(queries, args.k)
+    # The knowledge base has many identical documents, so recall counts a hit
+    # as any result scoring at least the exact k-th score (ties are equivalent)
+    kth_score = truth_scores[:, -1:] - 1e-5
+
+    results = {}
+    for index_type in args.types.split(','):
+        if index_type not in INDEX_TYPES:
+            print(f"  unknown index type {index_type}")
+            return False
+        start = time.perf_counter()
+        index, _ = create_index(index_type, corpus.shape[1], len(corpus))
+        train_index(index, corpus)
+        index.add_with_ids(corpus, ids)
+        build_seconds = time.perf_counter() - start
+
+        _, found = index.search(queries, args.k)
+        true_scores = np.einsum('qkd,qd->qk', corpus[np.maximum(found, 0)], queries)
+        recall = float(np.mean(((true_scores >= kth_score) & (found >= 0)).sum(axis=1) / args.k))
+        latencies = []
+        for i in range(args.repeat):
+            query = queries[i % len(queries)][None, :]
+            start = time.perf_counter()
+            index.search(query, args.k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        memory = len(faiss.serialize_index(index))
+        results[index_type] = recall
+        print(f"  {index_type:<6} recall@{args.k} {recall:6.3f}   p50 {np.percentile(latencies, 50):7.3f} ms   "
+              f"p99 {np.percentile(latencies, 99):7.3f} ms   {memory / 1e6:8.2f} MB   build {build_seconds:6.2f} s   "
+              f"{describe_index(index)}")
+
+    # Exact search must agree with itself; ANN recall is reported, not enforced
+    return results.get('flat', 1.0) == 1.0
+
+
+# Retrieval probes for bench_kb: symptom descriptions and disease questions
+_KB_QUERIES = [
+    "What are the symptoms of diabetes?",
+    "How to prevent heart disease?",
+    "What causes fever and headache?",
+    "I have itching and a skin rash",
+    "high fever, chills and sweating",
+    "stomach pain with vomiting and nausea",
+    "yellowish skin and dark urine",
+    "cough, breathlessness and chest pain",
+    "joint pain and swelling",
+    "burning sensation while urinating",
+    "headache with blurred vision",
+    "How is malaria treated?"
+]
+
+
+def bench_kb(args):
+    """Knowledge base size, build time, index memory and top-k diversity per document layout"""
+    import faiss
+    from rag_system import MedicalRAG
+
+    rag = MedicalRAG()
+    layouts = {}
+    for label, aggregate in (('per-row', False), ('aggregated', True)):
+        rag.load_medical_knowledge(aggregate=aggregate)
+        start = time.perf_counter()
+        rag.build_index()
+        build_seconds = time.perf_counter() - start
+
+        distinct_diseases = []
+        distinct_texts = []
+        for query in _KB_QUERIES:
+            results = rag.search(query, args.k)
+            distinct_diseases.append(len({r['metadata'].get('disease') or r['metadata'].get('symptom') for r in results}))
+            distinct_texts.append(len({r['document'] for r in results}))
+        layouts[label] = {
+            'documents': len(rag.documents),
+            'build_seconds': build_seconds,
+            'index_bytes': len(faiss.serialize_index(rag.index)),
+            'distinct_subjects': float(np.mean(distinct_diseases)),
+            'distinct_texts': float(np.mean(distinct_texts))
+        }
+
+    print(f"{len(_KB_QUERIES)} probe queries, top-{args.k}:")
+    for label, result in layouts.items():
+        print(f"  {label:<11} {result['documents']:6d} docs   build {result['build_seconds']:7.2f} s   "
+              f"index {result['index_bytes'] / 1e6:7.2f} MB   distinct subjects {result['distinct_subjects']:4.2f}   "
+              f"distinct texts {result['distinct_texts']:4.2f}")
+
+    # Aggregation must never return the same text twice in one result list
+    return layouts['aggregated']['distinct_texts'] == args.k
+
+
+# Hand-labelled free-text queries: (query, disease the answer should come from)
+_LABELLED_QUERIES = [
+    ("What are the symptoms of diabetes?", "Diabetes"),
+    ("How can I prevent malaria?", "Malaria"),
+    ("What is psoriasis?", "Psoriasis"),
+    ("precautions for chicken pox", "Chicken pox"),
+    ("my skin and eyes turned yellow and my urine is dark", "Jaundice"),
+    ("I get a burning feeling when I pee", "Urinary tract infection"),
+    ("crushing chest pain spreading to my arm and sweating", "Heart attack"),
+    ("pimples and blackheads on my face", "Acne"),
+    ("the room spins when I move my head", "(vertigo) Paroymsal  Positional Vertigo"),
+    ("itchy red patches between my toes", "Fungal infection"),
+    ("acid coming up into my throat after meals", "GERD"),
+    ("wheezing and shortness of breath at night", "Bronchial Asthma"),
+    ("painful swollen veins in my legs", "Varicose veins"),
+    ("stiff neck and pain in the back of the neck", "Cervical spondylosis"),
+    ("sneezing and a runny nose with watery eyes", "Allergy"),
+    ("I feel shaky, sweaty and hungry and my sugar is low", "Hypoglycemia"),
+    ("one side of my body suddenly became weak", "Paralysis (brain hemorrhage)"),
+    ("throbbing headache with nausea and sensitivity to light", "Migraine"),
+    ("persistent cough with blood and weight loss", "Tuberculosis"),
+    ("feeling cold all the time, weight gain and tiredness", "Hypothyroidism")
+]
+
+
+def _symptom_queries(count, seed=0):
+    """
+    Symptom-list queries labelled with the disease of a random dataset case
+
+    Half are written like the model's input ("itching, skin_rash, chills"),
+    half as a sentence with spaces ("I have itching, skin rash and chills").
+    """
+    from medical_dataset import load_dataset
+
+    rng = np.random.default_rng(seed)
+    dataset = load_dataset()
+    lists = dataset.case_symptom_lists()
+    diseases = dataset.labels
+    queries = []
+    for i, case in enumerate(rng.choice(lists.index.to_numpy(), size=count, replace=False)):
+        symptoms = [s.strip() for s in lists[case]]
+        picked = [symptoms[j] for j in sorted(rng.choice(len(symptoms), size=min(3, len(symptoms)), replace=False))]
+        if i % 2:
+            words = [s.replace('_', ' ') for s in picked]
+            text = 'I have ' + (', '.join(words[:-1]) + ' and ' + words[-1] if len(words) > 1 else words[0])
+        else:
+            text = ', '.join(picked)
+        queries.append((text, diseases[case]))
+    return queries
+
+
+def bench_retrieval(args):
+    """Dense vs. BM25 vs. hybrid retrieval: hit@k, MRR and cold-query latency"""
+    from rag_system import MedicalRAG
+
+    rag = MedicalRAG()
+    rag.load_medical_knowledge()
+    rag.build_index()
+
+    def disease_of(meta):
+        disease = meta.get('disease')
+        return disease.strip().lower() if disease else None
+
+    def run(mode, queries):
+        """Diseases of the top-k results of every query, and per-query latency"""
+        rag.retrieval = 'dense' if mode == 'dense' else 'hybrid'
+        rag.embedding_cache.clear()
+        ranked = []
+        timings = []
+        for query, _ in queries:
+            start = time.perf_counter()
+            if mode == 'bm25':
+                metadata = [rag.metadata[row] for row, _ in rag.lexical.search(query, args.k)]
+            else:
+                metadata = [r['metadata'] for r in rag.search(query, args.k)]
+            timings.append((time.perf_counter() - start) * 1000)
+            ranked.append([disease_of(meta) for meta in metadata])
+        return ranked, np.array(timings)
+
+    sets = {'free text': _LABELLED_QUERIES, 'symptom lists': _symptom_queries(args.cases)}
+    ok = True
+    for label, queries in sets.items():
+        print(f"{label}: {len(queries)} labelled queries, top-{args.k}")
+        before = dict(rag.retrieval_counts)
+        for mode in ('dense', 'bm25', 'hybrid'):
+            ranked, timings = run(mode, queries)
+            reciprocal = []
+            for diseases, (_, expected) in zip(ranked, queries):
+                target = expected.strip().lower()
+                reciprocal.append(1.0 / (diseases.index(target) + 1) if target in diseases else 0.0)
+            reciprocal = np.array(reciprocal)
+            print(f"  {mode:<7} hit@{args.k} {np.mean(reciprocal > 0):5.3f}   MRR {reciprocal.mean():5.3f}   "
+                  f"p50 {np.percentile(timings, 50):7.3f} ms   p99 {np.percentile(timings, 99):7.3f} ms")
+        fast = rag.retrieval_counts['lexical'] - before['lexical']
+        print(f"  hybrid answered {fast}/{len(queries)} queries on the lexical fast path")
+        if label == 'symptom lists' and fast != len(queries):
+            # Every generated query consists of dataset symptom names only
+            ok = False
+    return ok
+
+
+# Modules whose import cost is reported by bench_startup, cheapest dependencies first
+_STARTUP_MODULES = ['numpy', 'pandas', 'sklearn', 'faiss', 'sentence_transformers',
+                    'model_registry', 'ai', 'rag_system', 'app']
+
+# Heavy third-party packages; importing rag_system must not pull in any of them
+_HEAVY_MODULES = ('torch', 'sentence_transformers', 'faiss', 'pandas')
+
+# Child process for bench_startup: imports one module or replays RAG start-up, prints JSON
+_STARTUP_SCRIPT = """
+import json, os, sys, time
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+heavy = sys.argv[2].split(',')
+steps = []
+def step(label, func):
+    before, start = rss(), time.perf_counter()
+    func()
+    steps.append({'label': label, 'ms': (time.perf_counter() - start) * 1000, 'rss_delta': rss() - before,
+                  'heavy': [m for m in heavy if m in sys.modules]})
+if sys.argv[1] == 'rag':
+    index_dir = sys.argv[3]
+    state = {}
+    step('import rag_system', lambda: state.update(module=__import__('rag_system')))
+    step('MedicalRAG()', lambda: state.update(rag=state['module'].MedicalRAG()))
+    step('load index', lambda: state['rag'].load(index_dir))
+    step('symptom-list query', lambda: state['rag'].search('itching, skin rash, chills'))
+    step('free-text query', lambda: state['rag'].search('what causes fever and headache?'))
+else:
+    step(sys.argv[1], lambda: __import__(sys.argv[1]))
+print(json.dumps(steps))
+"""
+
+
+def _startup_child(*argv):
+    output = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT, *argv], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if output.returncode != 0:
+        return None
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def bench_startup(args):
+    """Per-module import time and RSS, and where RAG start-up spends its time and memory"""
+    heavy = ','.join(_HEAVY_MODULES)
+    print(f"Import cost per module (fresh interpreter, median of {args.runs}):")
+    for module in _STARTUP_MODULES:
+        runs = [_startup_child(module, heavy) for _ in range(args.runs)]
+        if runs[0] is None:
+            print(f"  {module:<24} not importable here")
+            continue
+        loaded = runs[0][0]['heavy']
+        print(f"  {module:<24} {np.median([r[0]['ms'] for r in runs]):9.1f} ms   "
+              f"RSS +{np.median([r[0]['rss_delta'] for r in runs]) / 1e6:7.1f} MB   "
+              f"pulls in: {', '.join(loaded) or '-'}")
+
+    from rag_storage import manifest_path
+
+    if manifest_path(args.index_dir) is None:
+        print(f"No index directory at {args.index_dir}; build one with rag_indexer.py to time RAG start-up")
+        return True
+    steps = _startup_child('rag', heavy, os.path.abspath(args.index_dir))
+    if steps is None:
+        print("RAG start-up replay failed")
+        return False
+    print("RAG start-up, step by step:")
+    for entry in steps:
+        print(f"  {entry['label']:<24} {entry['ms']:9.1f} ms   RSS +{entry['rss_delta'] / 1e6:7.1f} MB   "
+              f"loaded so far: {', '.join(entry['heavy']) or '-'}")
+
+    # The model must not be loaded before a query actually needs an embedding
+    lazy = 'sentence_transformers' not in steps[3]['heavy'] and not steps[0]['heavy']
+    print(f"Embedding model deferred past import, load and symptom-list query: {lazy}")
+    return lazy
+
+
+# Chat message shapes for bench_extract; {0}, {1}, {2} are symptom phrases
+_MESSAGE_TEMPLATES = [
+    "{0}, {1}, {2}",
+    "I have {0} and {1}",
+    "Since Monday I keep getting {0} with some {1}",
+    "I've been having {0}, and also {1} since yesterday",
+    "my symptoms are {0} {1} {2}",
+    "Doctor, for two days now there is {0}. Also {1} in the evenings and {2}."
+]
+
+
+def _legacy_extract(message, all_symptoms):
+    """extract_symptoms_from_message as it was before the symptom matcher"""
+    parts = [s.strip() for s in message.split(',') if s.strip()]
+    if len(parts) > 1:
+        return parts
+    words = message.lower().split()
+    symptom_names = [s.lower().replace('_', ' ') for s in all_symptoms]
+    return [word.replace(' ', '_') for word in words if word in symptom_names]
+
+
+def bench_extract(args):
+    """Symptom extraction from chat messages: per-word scan vs. precompiled token trie"""
+    from model_registry import get_registry
+    from medical_dataset import load_dataset
+
+    bundle = get_registry().get()
+    rng = np.random.default_rng(0)
+    lists = load_dataset().case_symptom_lists()
+    corpus = []
+    for i, case in enumerate(rng.choice(lists.index.to_numpy(), size=args.messages)):
+        symptoms = [s.strip() for s in lists[case]]
+        template = _MESSAGE_TEMPLATES[i % len(_MESSAGE_TEMPLATES)]
+        slots = template.count('{')
+        picked = [symptoms[j] for j in rng.choice(len(symptoms), size=slots, replace=len(symptoms) < slots)]
+        picked = list(dict.fromkeys(picked))
+        # Model-style lists keep underscores; prose spells symptoms with spaces
+        phrases = picked if i % len(_MESSAGE_TEMPLATES) == 0 else [p.replace('_', ' ') for p in picked]
+        phrases += phrases[-1:] * (slots - len(phrases))
+        corpus.append((template.format(*phrases), set(picked)))
+
+    def recall(extract):
+        found = 0
+        expected = 0
+        for message, symptoms in corpus:
+            _, matched, _ = bundle.symptom_index.match(extract(message))
+            found += len(symptoms & set(matched))
+            expected += len(symptoms)
+        return found / expected
+
+    methods = {
+        'per-word scan': lambda message: _legacy_extract(message, bundle.all_symptoms),
+        'token trie': bundle.symptom_matcher.extract
+    }
+    print(f"{len(corpus)} chat messages, {len(bundle.all_symptoms)} symptoms, "
+          f"trie depth {bundle.symptom_matcher.max_tokens}")
+    recalls = {}
+    for label, extract in methods.items():
+        timings = []
+        for message, _ in corpus:
+            start = time.perf_counter()
+            extract(message)
+            timings.append((time.perf_counter() - start) * 1e6)
+        recalls[label] = recall(extract)
+        print(f"  {label:<14} recall {recalls[label]:5.3f}   p50 {np.percentile(timings, 50):8.1f} us   "
+              f"p99 {np.percentile(timings, 99):8.1f} us   {len(corpus) / (sum(timings) / 1e6):10.0f} msg/s")
+
+    # Exact symptom lists must come out identical, whatever the spelling in the message
+    lists_ok = all(bundle.symptom_matcher.extract(', '.join(sorted(symptoms))) == sorted(symptoms)
+                   for _, symptoms in corpus)
+    print(f"Comma-separated symptom names extracted exactly: {lists_ok}")
+    return lists_ok and recalls['token trie'] >= recalls['per-word scan']
+
+
+def _typo(text, rng):
+    """text with one random deletion, insertion, substitution or adjacent transposition"""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    i = int(rng.integers(len(text)))
+    kind = rng.integers(4)
+    if kind == 0 and len(text) > 3:
+        return text[:i] + text[i + 1:]
+    if kind == 1:
+        return text[:i] + letters[rng.integers(26)] + text[i:]
+    if kind == 2 or i == len(text) - 1:
+        return text[:i] + letters[rng.integers(26)] + text[i + 1:]
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def bench_fuzzy(args):
+    """Typo correction: trigram-shortlisted edit distance vs. a scan over every phrase"""
+    from model_registry import get_registry
+    from symptom_index import SYMPTOM_SYNONYMS, FuzzySymptomIndex, bounded_edit_distance, _phrase
+
+    bundle = get_registry().get()
+    known = set(bundle.all_symptoms)
+    phrases = [(_phrase(s), s) for s in bundle.all_symptoms]
+    phrases += [(_phrase(p), s) for s, ps in SYMPTOM_SYNONYMS.items() if s in known for p in ps]
+
+    rng = np.random.default_rng(0)
+    typos = []
+    for i in rng.integers(len(phrases), size=args.typos):
+        phrase, symptom = phrases[i]
+        typo = _typo(phrase, rng)
+        if len(phrase) > 12:
+            typo = _typo(typo, rng)
+        typos.append((typo, symptom))
+
+    def scan(text):
+        """Reference: bounded edit distance against every known phrase"""
+        text = _phrase(text)
+        budget = FuzzySymptomIndex.max_distance(text)
+        best = None
+        for phrase, symptom in phrases:
+            distance = bounded_edit_distance(text, phrase, budget)
+            if distance is not None:
+                confidence = 1 - distance / max(len(text), len(phrase))
+                if best is None or confidence > best[0] or (confidence == best[0] and symptom < best[1]):
+                    best = (confidence, symptom)
+        return best[1] if best else None
+
+    def indexed(text):
+        candidates = bundle.fuzzy_index.candidates(text, limit=1)
+        return candidates[0]['symptom'] if candidates else None
+
+    start = time.perf_counter()
+    FuzzySymptomIndex(bundle.all_symptoms)
+    print(f"{len(phrases)} phrases indexed in {(time.perf_counter() - start) * 1000:.1f} ms; "
+          f"{len(typos)} misspelled inputs")
+    answers = {}
+    for label, resolve in (('full scan', scan), ('trigram index', indexed)):
+        timings = []
+        answers[label] = []
+        for text, _ in typos:
+            start = time.perf_counter()
+            answers[label].append(resolve(text))
+            timings.append((time.perf_counter() - start) * 1e6)
+        correct = np.mean([answer == symptom for answer, (_, symptom) in zip(answers[label], typos)])
+        print(f"  {label:<14} top-1 correct {correct:5.3f}   p50 {np.percentile(timings, 50):8.1f} us   "
+              f"p99 {np.percentile(timings, 99):8.1f} us")
+
+    # The shortlist must not lose the answer the exhaustive scan finds
+    agreement = np.mean([a == b for a, b in zip(answers['full scan'], answers['trigram index'])])
+    print(f"Agreement with full scan: {agreement:.3f}")
+    return agreement >= 0.99
+
+
+# Chat turns replayed by bench_chat: symptom reports and general questions
+_CHAT_MESSAGES = [
+    "I have itching, skin rash and nodal skin eruptions",
+    "What is malaria?",
+    "high fever, chills, vomiting",
+    "How can I prevent diabetes?",
+    "I have been throwing up with a high fever and a headache",
+    "stomach pain, acidity, ulcers on tongue",
+    "What should I do about a persistent cough?",
+    "I have joint pain and swelling joints"
+]
+
+
+def bench_chat(args):
+    """End-to-end /api/chat throughput of this application with the offline stub LLM"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    os.environ['LLM_BACKEND'] = 'stub'
+    os.environ['LLM_STUB_LATENCY'] = str(args.llm_latency)
+    import app
+    from conversation_store import ConversationStore
+
+    app.ensure_predictor()
+    if args.rag:
+        app.run_startup_step('rag_index', app.initialize_rag)
+    else:
+        app.skip_startup_step('rag_index')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep benchmark conversations out of the real chat history
+        app.conversation_store = ConversationStore(os.path.join(tmp, 'conversations.db'))
+
+        def session(number):
+            client = app.app.test_client()
+            results = []
+            for turn in range(args.turns):
+                message = _CHAT_MESSAGES[(number + turn) % len(_CHAT_MESSAGES)]
+                start = time.perf_counter()
+                response = client.post('/api/chat', json={'message': message})
+                results.append((response.status_code, (time.perf_counter() - start) * 1000))
+            return results
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = [r for session_results in pool.map(session, range(args.sessions)) for r in session_results]
+        elapsed = time.perf_counter() - start
+        app.conversation_store.close()
+
+    statuses = [status for status, _ in results]
+    latencies = np.array([ms for _, ms in results])
+    print(f"{len(results)} chat turns ({args.sessions} sessions x {args.turns}), concurrency {args.concurrency}, "
+          f"stub LLM latency {args.llm_latency * 1000:.0f} ms, RAG {'on' if app.rag_system else 'off'}")
+    print(f"  throughput {len(results) / elapsed:8.1f} turns/s   p50 {np.percentile(latencies, 50):8.2f} ms   "
+          f"p99 {np.percentile(latencies, 99):8.2f} ms")
+    for stage, summary in app.chat_pipeline.metrics.snapshot()['stages'].items():
+        print(f"  {stage:<16} p50 {summary['p50_ms']:8.2f} ms   p95 {summary['p95_ms']:8.2f} ms")
+
+    ok = all(status == 200 for status in statuses)
+    print(f"All turns answered: {ok}")
+    return ok
+
+
+def bench_response_cache(args):
+    """Semantic response cache on first questions of new conversations, with the stub LLM"""
+    os.environ['LLM_BACKEND'] = 'stub'
+    os.environ['LLM_STUB_LATENCY'] = str(args.llm_latency)
+    import app
+    from conversation_store import ConversationStore
+
+    app.ensure_predictor()
+    if not app.run_startup_step('rag_index', app.initialize_rag) or app.response_cache is None:
+        print("The response cache needs the RAG index and RESPONSE_CACHE_SIZE > 0")
+        return False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app.conversation_store = ConversationStore(os.path.join(tmp, 'conversations.db'))
+        first, follow_up, replies = [], [], {}
+        for number in range(args.sessions):
+            # A fresh client is a new session, so its first message has no history
+            client = app.app.test_client()
+            message = _CHAT_MESSAGES[number % len(_CHAT_MESSAGES)]
+            start = time.perf_counter()
+            response = client.post('/api/chat', json={'message': message})
+            first.append((time.perf_counter() - start) * 1000)
+            replies.setdefault(message, set()).add(response.get_json().get('response'))
+            start = time.perf_counter()
+            client.post('/api/chat', json={'message': message})
+            follow_up.append((time.perf_counter() - start) * 1000)
+        app.conversation_store.close()
+
+    stats = app.response_cache.stats()
+    print(f"{args.sessions} new conversations over {len(_CHAT_MESSAGES)} distinct questions, "
+          f"stub LLM latency {args.llm_latency * 1000:.0f} ms")
+    print(f"  first message  p50 {np.percentile(first, 50):8.2f} ms   p99 {np.percentile(first, 99):8.2f} ms")
+    print(f"  second message p50 {np.percentile(follow_up, 50):8.2f} ms   (history present, cache bypassed)")
+    print(f"  hits {stats['hits']}   misses {stats['misses']}   bypassed {stats['bypassed']}   "
+          f"hit rate {stats['hit_rate']:.3f}   LLM time saved {stats['time_saved_seconds']:.2f}s")
+
+    # Every repeat of a question is served from the cache, with the same reply
+    expected_hits = args.sessions - min(args.sessions, len(_CHAT_MESSAGES))
+    ok = (stats['hits'] == expected_hits and stats['bypassed'] == args.sessions
+          and all(len(texts) == 1 for texts in replies.values()))
+    print(f"Repeats answered from the cache, follow-ups bypassed: {ok}")
+    return ok
+
+
+def bench_coalesce(args):
+    """Identical first messages sent at the same moment, with the response cache off"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    os.environ['LLM_BACKEND'] = 'stub'
+    os.environ['LLM_STUB_LATENCY'] = str(args.llm_latency)
+    os.environ['RESPONSE_CACHE_SIZE'] = '0'
+    import app
+    from conversation_store import ConversationStore
+
+    app.ensure_predictor()
+    app.run_startup_step('rag_index', app.initialize_rag)
+    # --mixed alternates the blocking and streaming routes between clients
+    endpoints = ['/api/chat', '/api/chat/stream'] if args.mixed else \
+        ['/api/chat/stream' if args.stream else '/api/chat']
+    barrier = threading.Barrier(args.clients)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app.conversation_store = ConversationStore(os.path.join(tmp, 'conversations.db'))
+
+        def send(number):
+            client = app.app.test_client()
+            endpoint = endpoints[number % len(endpoints)]
+            barrier.wait()
+            start = time.perf_counter()
+            response = client.post(endpoint, json={'message': _CHAT_MESSAGES[0]})
+            body = response.get_data(as_text=True)
+            return endpoint, response.status_code, body, (time.perf_counter() - start) * 1000
+
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            results = list(pool.map(send, range(args.clients)))
+        app.conversation_store.close()
+
+    llm = app.llm_flight.stats()
+    rag = app.rag_flight.stats()
+    latencies = [ms for _, _, _, ms in results]
+    print(f"{args.clients} identical first messages to {' and '.join(endpoints)}, "
+          f"stub LLM latency {args.llm_latency * 1000:.0f} ms, "
+          f"RAG {'on' if app.rag_system else 'off'}")
+    print(f"  p50 {np.percentile(latencies, 50):8.2f} ms   max {max(latencies):8.2f} ms")
+    print(f"  LLM calls {llm['calls']}   collapsed {llm['collapsed']}   (backend saw {app.llm_client.stats()['requests']})")
+    print(f"  RAG calls {rag['calls']}   collapsed {rag['collapsed']}")
+
+    # Compare the replies per route; the final event and JSON carry per-request timestamps
+    replies = {}
+    for endpoint, status, body, _ in results:
+        if endpoint == '/api/chat':
+            reply = json.loads(body).get('response') if status == 200 else None
+        else:
+            # A stream that was cut short has no 'done' event
+            reply = body.rsplit('event: done', 1)[0] if 'event: done' in body else None
+        replies.setdefault(endpoint, set()).add(reply)
+    ok = (all(status == 200 for _, status, _, _ in results)
+          and all(len(texts) == 1 and None not in texts for texts in replies.values())
+          and app.llm_client.stats()['requests'] == llm['calls'] == len(endpoints) and llm['collapsed'] > 0)
+    print(f"One LLM call shared by all clients of each route, identical replies: {ok}")
+    return ok
+
+
+def _legacy_training_data(data_dir):
+    """The per-row feature matrix and severity loops trainmodel.py used before medical_dataset"""
+    df_dataset = pd.read_csv(os.path.join(data_dir, 'dataset.csv'))
+    df_severity = pd.read_csv(os.path.join(data_dir, 'Symptom-severity.csv'))
+    all_symptoms = set()
+    for col in df_dataset.columns[1:]:
+        for symptom in df_dataset[col].dropna().unique():
+            symptom_clean = str(symptom).strip()
+            if symptom_clean and symptom_clean != 'nan':
+                all_symptoms.add(symptom_clean)
+    all_symptoms = sorted(all_symptoms)
+    symptom_severity_dict = dict(zip(df_severity['Symptom'].str.strip(), df_severity['weight']))
+
+    X = []
+    for _, row in df_dataset.iterrows():
+        feature_vector = [0] * len(all_symptoms)
+        for col in df_dataset.columns[1:]:
+            symptom = str(row[col]).strip()
+            if symptom and symptom != 'nan' and symptom in all_symptoms:
+                feature_vector[all_symptoms.index(symptom)] = 1
+        X.append(feature_vector)
+
+    disease_severity_dict = {}
+    for disease in df_dataset['Disease'].unique():
+        disease_data = df_dataset[df_dataset['Disease'] == disease]
+        total_severity = 0
+        symptom_count = 0
+        for col in df_dataset.columns[1:]:
+            for symptom in disease_data[col].dropna().unique():
+                symptom_clean = str(symptom).strip()
+                if symptom_clean in symptom_severity_dict:
+                    total_severity += symptom_severity_dict[symptom_clean]
+                    symptom_count += 1
+        disease_severity_dict[disease] = round(total_severity / symptom_count, 2) if symptom_count else 0
+    return all_symptoms, np.array(X), disease_severity_dict
+
+
+def _legacy_symptom_documents(data_dir):
+    """The per-row iterrows loop load_medical_knowledge used before medical_dataset"""
+    df_dataset = pd.read_csv(os.path.join(data_dir, 'dataset.csv'))
+    documents = []
+    for _, row in df_dataset.iterrows():
+        symptoms = [str(row[col]) for col in df_dataset.columns[1:]
+                    if pd.notna(row[col]) and str(row[col]) != 'nan']
+        if symptoms:
+            documents.append(f"Disease: {row['Disease']}\nSymptoms: {', '.join(symptoms)}")
+    return documents
+
+
+def bench_ingest(args):
+    """Legacy per-row CSV processing vs. the vectorized medical_dataset module on a replicated dataset"""
+    import shutil
+    from medical_dataset import load_dataset
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in os.listdir('dataset'):
+            shutil.copy(os.path.join('dataset', name), tmp)
+        cases = pd.read_csv(os.path.join('dataset', 'dataset.csv'))
+        pd.concat([cases] * args.scale, ignore_index=True).to_csv(os.path.join(tmp, 'dataset.csv'), index=False)
+        print(f"dataset.csv replicated {args.scale}x: {len(cases) * args.scale} rows")
+
+        start = time.perf_counter()
+        legacy_symptoms, legacy_X, legacy_severity = _legacy_training_data(tmp)
+        legacy_train = time.perf_counter() - start
+        start = time.perf_counter()
+        legacy_documents = _legacy_symptom_documents(tmp)
+        legacy_rag = time.perf_counter() - start
+
+        start = time.perf_counter()
+        dataset = load_dataset(tmp)
+        parse = time.perf_counter() - start
+        start = time.perf_counter()
+        X = dataset.feature_matrix()
+        severity = dataset.disease_severity_dict()
+        new_train = time.perf_counter() - start
+        start = time.perf_counter()
+        diseases = dataset.cases['Disease']
+        documents = [f"Disease: {diseases[case]}\nSymptoms: {', '.join(symptoms)}"
+                     for case, symptoms in dataset.case_symptom_lists().items()]
+        new_rag = time.perf_counter() - start
+        start = time.perf_counter()
+        dataset.symptom_frequencies()
+        aggregate = time.perf_counter() - start
+
+    print(f"  {'':<30} {'legacy':>10} {'vectorized':>12}")
+    print(f"  {'parse CSVs (shared, once)':<30} {'':>10} {parse:11.3f}s")
+    print(f"  {'features + disease severity':<30} {legacy_train:9.3f}s {new_train:11.3f}s")
+    print(f"  {'per-row RAG documents':<30} {legacy_rag:9.3f}s {new_rag:11.3f}s")
+    print(f"  {'per-disease aggregation':<30} {'':>10} {aggregate:11.3f}s")
+    print(f"  speedup (including parse): {(legacy_train + legacy_rag) / (parse + new_train + new_rag):.1f}x")
+
+    ok = (legacy_symptoms == dataset.all_symptoms and np.array_equal(legacy_X, X)
+          and legacy_severity == severity and legacy_documents == documents)
+    print(f"Identical features, severities and documents: {ok}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    forest = subparsers.add_parser('forest', help='compiled forest parity and latency')
+    forest.add_argument('--repeat', type=int, default=50)
+    forest.set_defaults(func=bench_forest)
+
+    history = subparsers.add_parser('history', help='conversation store throughput')
+    history.add_argument('--turns', type=int, default=1000)
+    history.set_defaults(func=bench_history)
+
+    rag_load = subparsers.add_parser('rag-load', help='RAG index cold start: pickle vs. memory-mapped')
+    rag_load.add_argument('--source', default='rag_index',
+                          help='existing index directory or legacy rag_system.pkl')
+    rag_load.add_argument('--runs', type=int, default=5)
+    rag_load.set_defaults(func=bench_rag_load)
+
+    embed = subparsers.add_parser('embed', help='document encoding throughput and peak memory')
+    embed.add_argument('--scale', type=int, default=20, help='copies of the knowledge base to encode')
+    embed.add_argument('--batch-size', type=int, default=64)
+    embed.add_argument('--chunk-size', type=int, default=8192)
+    embed.add_argument('--workers', type=int, default=1)
+    embed.set_defaults(func=bench_embed)
+
+    ann = subparsers.add_parser('ann', help='ANN index recall, latency and memory')
+    ann.add_argument('--scale', type=int, default=10, help='jittered copies of the knowledge base')
+    ann.add_argument('--queries', type=int, default=500)
+    ann.add_argument('--k', type=int, default=5)
+    ann.add_argument('--repeat', type=int, default=500)
+    ann.add_argument('--types', default='flat,ivf,hnsw,ivfpq')
+    ann.set_defaults(func=bench_ann)
+
+    kb = subparsers.add_parser('kb', help='knowledge base size and retrieval diversity')
+    kb.add_argument('--k', type=int, default=5)
+    kb.set_defaults(func=bench_kb)
+
+    ingest = subparsers.add_parser('ingest', help='vectorized CSV ingestion vs. per-row loops')
+    ingest.add_argument('--scale', type=int, default=100, help='copies of dataset.csv to process')
+    ingest.set_defaults(func=bench_ingest)
+
+    retrieval = subparsers.add_parser('retrieval', help='dense vs. BM25 vs. hybrid retrieval quality and latency')
+    retrieval.add_argument('--k', type=int, default=5)
+    retrieval.add_argument('--cases', type=int, default=200, help='symptom-list queries sampled from dataset.csv')
+    retrieval.set_defaults(func=bench_retrieval)
+
+    startup = subparsers.add_parser('startup', help='per-module import time and RSS, lazy RAG start-up')
+    startup.add_argument('--index-dir', default='rag_index')
+    startup.add_argument('--runs', type=int, default=3)
+    startup.set_defaults(func=bench_startup)
+
+    extract = subparsers.add_parser('extract', help='symptom extraction from free-text chat messages')
+    extract.add_argument('--messages', type=int, default=5000)
+    extract.set_defaults(func=bench_extract)
+
+    fuzzy = subparsers.add_parser('fuzzy', help='typo correction accuracy and latency')
+    fuzzy.add_argument('--typos', type=int, default=2000)
+    fuzzy.set_defaults(func=bench_fuzzy)
+
+    chat = subparsers.add_parser('chat', help='end-to-end /api/chat throughput with the stub LLM backend')
+    chat.add_argument('--sessions', type=int, default=32)
+    chat.add_argument('--turns', type=int, default=10)
+    chat.add_argument('--concurrency', type=int, default=8)
+    chat.add_argument('--llm-latency', type=float, default=0.0, help='simulated LLM seconds per turn')
+    chat.add_argument('--rag', action='store_true', help='load the RAG index as the server would')
+    chat.set_defaults(func=bench_chat)
+
+    response_cache = subparsers.add_parser('response-cache', help='semantic LLM response cache hit rate and savings')
+    response_cache.add_argument('--sessions', type=int, default=64)
+    response_cache.add_argument('--llm-latency', type=float, default=0.5, help='simulated LLM seconds per turn')
+    response_cache.set_defaults(func=bench_response_cache)
+
+    coalesce = subparsers.add_parser('coalesce', help='single-flight sharing of identical concurrent requests')
+    coalesce.add_argument('--clients', type=int, default=16)
+    coalesce.add_argument('--llm-latency', type=float, default=0.5, help='simulated LLM seconds per turn')
+    mode = coalesce.add_mutually_exclusive_group()
+    mode.add_argument('--stream', action='store_true', help='use /api/chat/stream instead of /api/chat')
+    mode.add_argument('--mixed', action='store_true', help='send half of the clients to each route')
+    coalesce.set_defaults(func=bench_coalesce)
+
+    args = parser.parse_args()
+    ok = args.func(args)
+    if not ok:
+        print("FAILED")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
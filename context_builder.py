@@ -0,0 +1,176 @@
+import math
+import re
+import threading
+
+# Rough per-message framing cost of chat-completion formats (role markers etc.)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of LLM tokens in text without a model tokenizer
+
+    Words are counted as one token per started 4 characters and every
+    punctuation mark as one token, which tracks BPE tokenizers closely
+    enough for budgeting English prompts.
+    """
+    if not text:
+        return 0
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PIECES.findall(text))
+
+
+def _truncate_lines(text, budget):
+    """Keep whole lines from the start of text while they fit in budget tokens"""
+    kept = []
+    used = 0
+    for line in text.split('\n'):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return '\n'.join(kept).rstrip()
+
+
+class ContextStats:
+    """Running totals of prompt sizes sent to the LLM"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.dropped_turns = 0
+        self.summarized_requests = 0
+        self.truncated_context = 0
+
+    def record(self, info):
+        with self._lock:
+            self.requests += 1
+            self.total_tokens += info['prompt_tokens']
+            self.max_tokens = max(self.max_tokens, info['prompt_tokens'])
+            self.dropped_turns += info['dropped_messages']
+            self.summarized_requests += int(info['summarized'])
+            self.truncated_context += int(info['context_truncated'])
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'total_prompt_tokens': self.total_tokens,
+                'avg_prompt_tokens': round(self.total_tokens / self.requests, 1) if self.requests else 0,
+                'max_prompt_tokens': self.max_tokens,
+                'dropped_messages': self.dropped_turns,
+                'summarized_requests': self.summarized_requests,
+                'truncated_context_requests': self.truncated_context
+            }
+
+
+class ContextBuilder:
+    """
+    Assemble the chat-completion messages within a token budget
+
+    Priority order: the base system prompt and the new user message are
+    always sent, then the disease prediction text, then the RAG context
+    (capped at context_share of what is left), then as many recent turns as
+    fit, newest first. Older turns that do not fit are replaced by a short
+    extractive summary of what the user said, when summarize is enabled.
+    """
+
+    def __init__(self, max_tokens=4096, context_share=0.5, summarize=True, summary_tokens=150):
+        self.max_tokens = max_tokens
+        self.context_share = context_share
+        self.summarize = summarize
+        self.summary_tokens = summary_tokens
+        self.stats = ContextStats()
+
+    def build(self, system_prompt, history, user_message, rag_context='', prediction_text=''):
+        """
+        Build the message list for one chat turn
+
+        Parameters:
+        system_prompt: Base instructions for the assistant
+        history: Earlier messages (dicts with 'role' and 'content'), oldest first
+        user_message: The new user message
+        rag_context: Retrieved knowledge-base context, may be empty
+        prediction_text: Formatted disease prediction, may be empty
+
+        Returns:
+        Tuple of (messages, info) where info describes what was kept
+        """
+        remaining = self.max_tokens
+        remaining -= estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        remaining -= estimate_tokens(user_message) + MESSAGE_OVERHEAD_TOKENS
+
+        prediction_block = ''
+        if prediction_text:
+            prediction_block = f"\n\nDisease prediction results based on user input:\n{prediction_text}"
+            cost = estimate_tokens(prediction_block)
+            if cost > remaining:
+                prediction_block = _truncate_lines(prediction_block, max(remaining, 0))
+                cost = estimate_tokens(prediction_block)
+            remaining -= cost
+
+        context_block = ''
+        context_truncated = False
+        if rag_context and remaining > 0:
+            context_block = f"\n\nRelevant medical context:\n{rag_context}"
+            cap = int(remaining * self.context_share)
+            if estimate_tokens(context_block) > cap:
+                context_block = _truncate_lines(context_block, cap)
+                context_truncated = True
+            remaining -= estimate_tokens(context_block)
+
+        # Walk back from the newest message while turns still fit
+        kept = []
+        for message in reversed(history):
+            cost = estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+            if cost > remaining:
+                break
+            kept.append({'role': message['role'], 'content': message['content']})
+            remaining -= cost
+        kept.reverse()
+        dropped = history[:len(history) - len(kept)]
+
+        summary_block = ''
+        if dropped and self.summarize and remaining > 0:
+            summary_block = self._summarize(dropped, min(self.summary_tokens, remaining))
+            remaining -= estimate_tokens(summary_block)
+
+        system_content = system_prompt + context_block + prediction_block + summary_block
+        messages = [{'role': 'system', 'content': system_content}]
+        messages.extend(kept)
+        messages.append({'role': 'user', 'content': user_message})
+
+        info = {
+            'prompt_tokens': sum(estimate_tokens(m['content']) + MESSAGE_OVERHEAD_TOKENS for m in messages),
+            'budget': self.max_tokens,
+            'history_messages': len(kept),
+            'dropped_messages': len(dropped),
+            'summarized': bool(summary_block),
+            'context_truncated': context_truncated
+        }
+        self.stats.record(info)
+        return messages, info
+
+    def _summarize(self, messages, budget):
+        """Condense dropped turns into the user's own earlier statements"""
+        header = "\n\nEarlier in this conversation the user said:"
+        lines = []
+        used = estimate_tokens(header)
+        # Most recent dropped statements are the most relevant; keep them first
+        for message in reversed(messages):
+            if message['role'] != 'user':
+                continue
+            first_sentence = re.split(r'(?<=[.!?])\s', message['content'].strip(), maxsplit=1)[0]
+            line = f"\n- {first_sentence[:200]}"
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+        if not lines:
+            return ''
+        return header + ''.join(reversed(lines))
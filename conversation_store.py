@@ -0,0 +1,167 @@
+"""
+Append-only conversation storage backed by SQLite in WAL mode
+
+Each chat message is one row, so a chat turn costs a single small insert
+instead of rewriting the whole session file, and building a prompt reads
+only the most recent messages through the (session_id, id) index.
+
+Usage:
+    python conversation_store.py migrate [--dir chat_history] [--db chat_history/conversations.db]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+CHAT_HISTORY_DIR = 'chat_history'
+DEFAULT_DB_PATH = os.path.join(CHAT_HISTORY_DIR, 'conversations.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+"""
+
+
+class ConversationStore:
+    """
+    Per-session message log
+
+    Connections are kept per thread (sqlite3 connections must not be shared
+    across threads); WAL mode lets readers proceed while a writer appends.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # NORMAL is durable against application crashes in WAL mode and
+            # avoids an fsync on every commit
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def append(self, session_id, entries):
+        """
+        Append messages to a session in one transaction
+
+        Parameters:
+        session_id: Session identifier
+        entries: List of dicts with 'role', 'content' and optional 'timestamp'
+        """
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                'INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)',
+                [(session_id, e['role'], e['content'], e.get('timestamp')) for e in entries]
+            )
+
+    def load(self, session_id):
+        """Return the full history of a session, oldest first"""
+        rows = self._connect().execute(
+            'SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY id',
+            (session_id,)
+        ).fetchall()
+        return [_row_to_entry(row) for row in rows]
+
+    def tail(self, session_id, limit):
+        """Return the last `limit` messages of a session, oldest first"""
+        rows = self._connect().execute(
+            'SELECT role, content, timestamp FROM messages WHERE session_id = ? '
+            'ORDER BY id DESC LIMIT ?',
+            (session_id, limit)
+        ).fetchall()
+        return [_row_to_entry(row) for row in reversed(rows)]
+
+    def count(self, session_id):
+        """Return the number of messages stored for a session"""
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM messages WHERE session_id = ?', (session_id,)
+        ).fetchone()[0]
+
+    def clear(self, session_id):
+        """Delete every message of a session"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _row_to_entry(row):
+    role, content, timestamp = row
+    return {'role': role, 'content': content, 'timestamp': timestamp}
+
+
+def migrate_json_history(store, history_dir=CHAT_HISTORY_DIR):
+    """
+    Import legacy chat_history/<session>.json files into the store
+
+    Each imported file is renamed to <session>.json.migrated so running the
+    migration again does not duplicate messages.
+
+    Returns:
+    Dictionary with the number of sessions and messages imported and the
+    files that could not be read
+    """
+    summary = {'sessions': 0, 'messages': 0, 'failed': []}
+    if not os.path.isdir(history_dir):
+        return summary
+
+    for filename in sorted(os.listdir(history_dir)):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(history_dir, filename)
+        session_id = filename[:-len('.json')]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+            entries = [e for e in history if 'role' in e and 'content' in e]
+            store.append(session_id, entries)
+        except (OSError, ValueError, TypeError) as e:
+            summary['failed'].append(f"{filename}: {e}")
+            continue
+
+        os.replace(path, path + '.migrated')
+        summary['sessions'] += 1
+        summary['messages'] += len(entries)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help='import legacy per-session JSON files')
+    migrate.add_argument('--dir', default=CHAT_HISTORY_DIR)
+    migrate.add_argument('--db', default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    store = ConversationStore(args.db)
+    summary = migrate_json_history(store, args.dir)
+    print(f"Migrated {summary['messages']} messages from {summary['sessions']} sessions into {args.db}")
+    for failure in summary['failed']:
+        print(f"  skipped {failure}")
+
+
+if __name__ == '__main__':
+    main()
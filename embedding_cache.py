@@ -0,0 +1,316 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.,;:]+$')
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: lower-cased, whitespace collapsed, trailing punctuation dropped"""
+    query = _WHITESPACE.sub(' ', query.strip().lower())
+    return _TRAILING_PUNCTUATION.sub('', query)
+
+
+@contextmanager
+def file_lock(f, exclusive: bool = True):
+    """Lock an open file against other processes (shared locks need fcntl; msvcrt locks exclusively)"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                # LK_LOCK gives up after ten one-second attempts; keep waiting
+                continue
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class DiskEmbeddingStore:
+    """
+    Persistent second tier for query embeddings
+
+    Vectors live in a fixed-capacity memory-mapped float32 matrix
+    (<path>/vectors.f32) used as a ring buffer. The key -> row mapping is an
+    append-only log (<path>/keys.log, one "row<TAB>key" line per write);
+    the next row to write is the one after the last logged row.
+    meta.json records the model and dimension; a mismatch resets the store.
+
+    Several processes (e.g. gunicorn workers) may share one directory:
+    writes take an exclusive lock on <path>/lock, and every get or put
+    first reads the log lines other processes appended since the last
+    call, so all of them agree on which key owns which row.
+    """
+
+    def __init__(self, path: str, model_name: str, dimension: int, capacity: int = 50000):
+        self.path = path
+        self.model_name = model_name
+        self.dimension = dimension
+        self.capacity = capacity
+        self._rows: Dict[str, int] = {}
+        self._row_keys: Dict[int, str] = {}
+        self._row_order: Dict[int, int] = {}
+        self._write_counter = 0
+        self._next_row = 0
+        self._reader = None
+        self._log = None
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, 'meta.json')
+        vectors_path = os.path.join(path, 'vectors.f32')
+        self._log_path = os.path.join(path, 'keys.log')
+        self._lock_file = open(os.path.join(path, 'lock'), 'a+b')
+        meta = {'model_name': model_name, 'dimension': dimension, 'capacity': capacity}
+
+        with file_lock(self._lock_file):
+            existing = None
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    existing = json.load(f)
+            if existing != meta or not os.path.exists(vectors_path):
+                # Different model/shape (or first run): start from an empty store
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+                self._vectors = np.memmap(vectors_path, dtype=np.float32, mode='w+', shape=(capacity, dimension))
+                open(self._log_path, 'w').close()
+            else:
+                self._vectors = np.memmap(vectors_path, dtype=np.float32, mode='r+', shape=(capacity, dimension))
+            self._open_log()
+            self._compact_log()
+
+    def _open_log(self):
+        """(Re)open the current log file and read it from the start"""
+        for f in (self._reader, self._log):
+            if f is not None:
+                f.close()
+        self._rows.clear()
+        self._row_keys.clear()
+        self._row_order.clear()
+        self._next_row = 0
+        self._log = open(self._log_path, 'a', encoding='utf-8')
+        self._reader = open(self._log_path, 'rb')
+        self._catch_up()
+
+    def _catch_up(self) -> int:
+        """Apply log lines written since the last call (by any process); returns how many"""
+        try:
+            replaced = os.stat(self._log_path).st_ino != os.fstat(self._reader.fileno()).st_ino
+        except FileNotFoundError:
+            replaced = False
+        if replaced:
+            # Another process compacted the log into a new file
+            self._open_log()
+            return len(self._rows)
+        lines = 0
+        for line in self._reader:
+            row_text, sep, key = line.decode('utf-8').rstrip('\n').partition('\t')
+            if not sep or not row_text.isdigit():
+                continue
+            self._assign(int(row_text), key)
+            lines += 1
+        return lines
+
+    def _compact_log(self):
+        """Rewrite the log once it has grown well past the live entries (caller holds the file lock)"""
+        if self._write_counter <= 4 * self.capacity:
+            return
+        temp_path = self._log_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for row in sorted(self._row_keys, key=self._row_order.get):
+                f.write(f"{row}\t{self._row_keys[row]}\n")
+        try:
+            os.replace(temp_path, self._log_path)
+        except OSError:
+            # Windows cannot replace a file other processes have open; compact later
+            os.remove(temp_path)
+            return
+        self._open_log()
+
+    def _assign(self, row: int, key: str):
+        """Point key at row, dropping whatever key previously owned the row"""
+        previous = self._row_keys.get(row)
+        if previous is not None and self._rows.get(previous) == row:
+            del self._rows[previous]
+        old_row = self._rows.get(key)
+        if old_row is not None and old_row != row:
+            self._row_keys.pop(old_row, None)
+        self._rows[key] = row
+        self._row_keys[row] = key
+        self._write_counter += 1
+        self._row_order[row] = self._write_counter
+        self._next_row = (row + 1) % self.capacity
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock, file_lock(self._lock_file, exclusive=False):
+            self._catch_up()
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return np.array(self._vectors[row])
+
+    def put(self, key: str, vector: np.ndarray):
+        if '\n' in key or '\t' in key:
+            return
+        with self._lock, file_lock(self._lock_file):
+            self._catch_up()
+            if key in self._rows:
+                return
+            row = self._next_row
+            self._vectors[row] = vector
+            self._log.write(f"{row}\t{key}\n")
+            self._log.flush()
+            self._catch_up()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def close(self):
+        with self._lock:
+            self._vectors.flush()
+            self._log.close()
+            self._reader.close()
+            self._lock_file.close()
+
+
+class EmbeddingCache:
+    """
+    Query embedding cache with LRU + TTL eviction and an optional disk tier
+
+    Memory tier lookups are dictionary hits; on a memory miss the disk tier
+    (if configured) is consulted and the vector promoted. Every hit adds the
+    running average encode time to time_saved_seconds.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: Optional[float] = 3600.0,
+                 disk_path: Optional[str] = None, disk_capacity: int = 50000):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_capacity = disk_capacity
+        self.disk: Optional[DiskEmbeddingStore] = None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.time_saved = 0.0
+        self._encode_seconds = 0.0
+        self._encodes = 0
+
+    def attach_disk(self, model_name: str, dimension: int):
+        """Open the disk tier for vectors of the given model (no-op without disk_path)"""
+        if self.disk is None and self.disk_path:
+            try:
+                self.disk = DiskEmbeddingStore(self.disk_path, model_name, dimension, self.disk_capacity)
+            except (OSError, ValueError) as e:
+                print(f"Embedding disk cache disabled: {e}")
+                self.disk_path = None
+
+    def get_or_encode(self, query: str, encode: Callable[[str], np.ndarray]) -> np.ndarray:
+        """
+        Return the (1, dim) embedding for query, calling encode(query) on a miss
+
+        The returned array is a copy and may be modified by the caller.
+        """
+        key = normalize_query(query)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, stored_at = entry
+                if self.ttl is None or now - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.time_saved += self._average_encode()
+                    return vector.copy()
+                del self._entries[key]
+                self.expired += 1
+
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                vector = vector.reshape(1, -1)
+                with self._lock:
+                    self.disk_hits += 1
+                    self.time_saved += self._average_encode()
+                self._store(key, vector, now)
+                return vector.copy()
+
+        start = time.perf_counter()
+        vector = np.asarray(encode(query), dtype=np.float32).reshape(1, -1)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.misses += 1
+            self._encode_seconds += elapsed
+            self._encodes += 1
+        self._store(key, vector, now)
+        if self.disk is not None:
+            self.disk.put(key, vector[0])
+        return vector.copy()
+
+    def peek(self, query: str) -> Optional[np.ndarray]:
+        """Embedding for query if the memory tier holds a live one; never encodes or counts a lookup"""
+        with self._lock:
+            entry = self._entries.get(normalize_query(query))
+            if entry is None or (self.ttl is not None and time.monotonic() - entry[1] >= self.ttl):
+                return None
+            return entry[0].copy()
+
+    def _store(self, key, vector, now):
+        with self._lock:
+            self._entries[key] = (vector.copy(), now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _average_encode(self):
+        return self._encode_seconds / self._encodes if self._encodes else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'avg_encode_ms': round(self._average_encode() * 1000, 3),
+                'time_saved_seconds': round(self.time_saved, 3),
+                'disk_entries': len(self.disk) if self.disk is not None else 0
+            }
@@ -0,0 +1,78 @@
+"""
+Chunked document embedding for building large FAISS indexes
+
+Documents are read from any sequence that supports len() and slicing
+(a list or a memory-mapped rag_storage.DocumentStore), encoded chunk by
+chunk and written straight into a memory-mapped .npy file. Peak memory is
+therefore one chunk of texts and vectors, not the whole corpus.
+"""
+import time
+
+import faiss
+import numpy as np
+
+# Below this many documents a process pool costs more to start than it saves
+MIN_POOL_DOCUMENTS = 1000
+
+
+class EmbeddingPipeline:
+    """
+    Encode documents in bounded chunks, optionally across a process pool
+
+    Parameters:
+    model: SentenceTransformer instance
+    batch_size: Texts per forward pass
+    chunk_size: Texts read and written per step (bounds peak memory)
+    workers: CPU worker processes; above 1 uses sentence-transformers'
+             multi-process pool, which pays a startup cost per worker
+    """
+
+    def __init__(self, model, batch_size=64, chunk_size=8192, workers=1):
+        self.model = model
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+    def encode_to_memmap(self, documents, path, show_progress=False):
+        """
+        Write L2-normalized float32 embeddings of documents to path (.npy)
+
+        Returns:
+        Read-only memory-mapped (n, dim) array of the written embeddings
+        """
+        total = len(documents)
+        dimension = self.model.get_sentence_embedding_dimension()
+        output = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(total, dimension))
+
+        pool = None
+        if self.workers > 1 and total >= MIN_POOL_DOCUMENTS:
+            pool = self.model.start_multi_process_pool(target_devices=['cpu'] * self.workers)
+        start = time.perf_counter()
+        try:
+            for begin in range(0, total, self.chunk_size):
+                end = min(begin + self.chunk_size, total)
+                chunk = list(documents[begin:end])
+                if pool is not None:
+                    embeddings = self.model.encode_multi_process(chunk, pool, batch_size=self.batch_size)
+                else:
+                    embeddings = self.model.encode(chunk, batch_size=self.batch_size,
+                                                   show_progress_bar=False, convert_to_numpy=True)
+                embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+                faiss.normalize_L2(embeddings)
+                output[begin:end] = embeddings
+                if show_progress:
+                    rate = end / (time.perf_counter() - start)
+                    print(f"Encoded {end}/{total} documents ({rate:.0f} docs/s)")
+        finally:
+            if pool is not None:
+                self.model.stop_multi_process_pool(pool)
+
+        output.flush()
+        del output
+        return np.load(path, mmap_mode='r')
+
+    def add_to_index(self, index, embeddings, ids):
+        """Add memory-mapped embeddings to a FAISS index one chunk at a time"""
+        for begin in range(0, len(embeddings), self.chunk_size):
+            end = begin + self.chunk_size
+            index.add_with_ids(np.ascontiguousarray(embeddings[begin:end]), ids[begin:end])
@@ -0,0 +1,161 @@
+import numpy as np
+
+FOREST_ARRAYS_PATH = 'forest_arrays.npz'
+
+
+class CompiledForest:
+    """
+    Flat-array representation of a trained RandomForestClassifier
+
+    All trees are concatenated into one node table:
+
+    feature / threshold: split feature and threshold per node
+    children:            (n_nodes, 2) global ids of the <= and > children;
+                         leaves point at themselves
+    leaf_index:          row in leaf_values for leaf nodes, -1 for splits
+    leaf_values:         normalized class distribution per leaf
+    roots:               node id of each tree's root
+
+    Evaluation walks every (row, tree) pair one level per step with plain
+    NumPy gathers, so a single-row prediction avoids sklearn's per-call input
+    validation and joblib dispatch entirely.
+    """
+
+    def __init__(self, feature, threshold, children, leaf_index, leaf_values,
+                 roots, classes, n_features, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self._flat_children = children.reshape(-1)
+        self.leaf_index = leaf_index
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.classes_ = classes
+        self.n_features = int(n_features)
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten a fitted sklearn RandomForestClassifier"""
+        features, thresholds, children, leaf_indices, leaf_values, roots = [], [], [], [], [], []
+        node_offset = 0
+        leaf_offset = 0
+        max_depth = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            # Leaves loop back to themselves and always take the "left" branch,
+            # so the traversal can run a fixed number of steps without masking
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.int32)
+            threshold = np.where(is_leaf, np.inf, tree.threshold)
+            left = np.where(is_leaf, node_ids, tree.children_left) + node_offset
+            right = np.where(is_leaf, node_ids, tree.children_right) + node_offset
+
+            values = tree.value[is_leaf, 0, :].astype(np.float64)
+            totals = values.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            leaf_index = np.full(n_nodes, -1, dtype=np.int32)
+            leaf_index[is_leaf] = np.arange(is_leaf.sum()) + leaf_offset
+
+            features.append(feature)
+            thresholds.append(threshold)
+            children.append(np.stack([left, right], axis=1))
+            leaf_indices.append(leaf_index)
+            leaf_values.append(values / totals)
+            roots.append(node_offset)
+
+            node_offset += n_nodes
+            leaf_offset += int(is_leaf.sum())
+            max_depth = max(max_depth, tree.max_depth)
+
+        classes = np.asarray(model.classes_)
+        if classes.dtype == object:
+            # Labels read through pandas; save() could only store them by pickling
+            classes = classes.astype(str)
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children).astype(np.int32),
+            leaf_index=np.concatenate(leaf_indices),
+            leaf_values=np.concatenate(leaf_values),
+            roots=np.asarray(roots, dtype=np.int32),
+            classes=classes,
+            n_features=model.n_features_in_,
+            max_depth=max_depth
+        )
+
+    def save(self, filepath=FOREST_ARRAYS_PATH):
+        """Write the node tables to an uncompressed .npz file"""
+        np.savez(
+            filepath,
+            feature=self.feature,
+            threshold=self.threshold,
+            children=self.children,
+            leaf_index=self.leaf_index,
+            leaf_values=self.leaf_values,
+            roots=self.roots,
+            classes=self.classes_,
+            n_features=np.int64(self.n_features),
+            max_depth=np.int64(self.max_depth)
+        )
+
+    @classmethod
+    def load(cls, filepath=FOREST_ARRAYS_PATH):
+        """Load node tables written by save()"""
+        with np.load(filepath, allow_pickle=False) as data:
+            return cls(
+                feature=data['feature'],
+                threshold=data['threshold'],
+                children=data['children'],
+                leaf_index=data['leaf_index'],
+                leaf_values=data['leaf_values'],
+                roots=data['roots'],
+                classes=data['classes'],
+                n_features=data['n_features'],
+                max_depth=data['max_depth']
+            )
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.children,
+                                       self.leaf_index, self.leaf_values, self.roots))
+
+    def apply(self, X):
+        """Return the leaf-value row reached by every (sample, tree) pair"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+
+        flat = X.reshape(-1)
+        row_offsets = (np.arange(X.shape[0]) * X.shape[1])[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for depth in range(self.max_depth):
+            go_right = flat[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self._flat_children[2 * nodes + go_right]
+            # Most trees bottom out well before max_depth; stop once every walk has
+            if depth % 4 == 3 and (self.leaf_index[nodes] >= 0).all():
+                break
+        return self.leaf_index[nodes]
+
+    def predict_proba(self, X, chunk_size=64):
+        """Class probabilities averaged over trees, matching sklearn's predict_proba"""
+        leaves = self.apply(X)
+        # Gather leaf distributions in row chunks to keep the temporary cache sized
+        probabilities = np.empty((leaves.shape[0], self.leaf_values.shape[1]))
+        for start in range(0, leaves.shape[0], chunk_size):
+            chunk = leaves[start:start + chunk_size]
+            probabilities[start:start + chunk_size] = self.leaf_values[chunk].mean(axis=1)
+        return probabilities
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
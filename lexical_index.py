@@ -0,0 +1,180 @@
+"""
+BM25 inverted index over the RAG knowledge-base documents
+
+Kept alongside the FAISS index so that queries made of symptom names
+("itching, skin_rash, nodal_skin_eruptions") can be answered by exact term
+matching without running the embedding model, and so that dense results
+can be re-ranked with lexical evidence (see reciprocal_rank_fusion).
+
+Terms are lower-cased words; an underscore compound such as skin_rash is
+indexed both as the compound and as its parts, so "skin rash" and
+"skin_rash" match the same documents. Postings are stored CSR-style
+(term -> slice of document rows and term frequencies) in NumPy arrays.
+"""
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r'[a-z]+(?:_+[a-z]+)*')
+
+# Function words that carry no retrieval signal in patient messages
+STOPWORDS = frozenset("""
+a about am an and any are as at be been but by can could do does for from have having
+how i if in is it its me my of on or so some the to was what which with you your
+""".split())
+
+def _words(text: str) -> List[str]:
+    return [w.replace('__', '_').strip('_') for w in _WORD.findall(text.lower())]
+
+
+def document_terms(text: str) -> List[str]:
+    """Indexed terms of a document: words and underscore compounds plus their parts"""
+    terms = []
+    for word in _words(text):
+        if word in STOPWORDS:
+            continue
+        terms.append(word)
+        if '_' in word:
+            terms.extend(part for part in word.split('_') if part not in STOPWORDS)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Merge ranked lists of document rows by reciprocal rank fusion
+
+    Each list contributes 1 / (k + rank) to the rows it contains (rank
+    starting at 1), so rows ranked well by several retrievers rise to the
+    top without having to compare their incompatible raw scores.
+
+    Returns:
+    List of (row, fused score), best first
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, 1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+class LexicalIndex:
+    """
+    BM25 scoring over an in-memory inverted index
+
+    Parameters:
+    documents: Document texts, indexed by position (the RAG row)
+    symptoms: Known symptom names; queries made only of these (plus
+              stopwords) are treated as purely lexical
+    k1, b: BM25 term-frequency saturation and length normalization
+    """
+
+    def __init__(self, documents: Iterable[str], symptoms: Iterable[str] = (), k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Symptom names as underscore-joined words: "toxic_look_(typhos)" -> toxic_look_typhos
+        self.symptoms = frozenset(s for s in ('_'.join(_words(str(name))) for name in symptoms) if s)
+        # Longest run of query words that can spell one name ("weakness of one body side")
+        self.max_phrase = max((s.count('_') + 1 for s in self.symptoms), default=1)
+
+        vocabulary: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        lengths = []
+        for row, text in enumerate(documents):
+            terms = document_terms(text)
+            lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                term_id = vocabulary.setdefault(term, len(vocabulary))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((row, count))
+
+        self.vocabulary = vocabulary
+        self.doc_lengths = np.asarray(lengths, dtype=np.float32)
+        self.num_documents = len(lengths)
+        sizes = np.fromiter((len(p) for p in postings), dtype=np.int64, count=len(postings))
+        self.indptr = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        flat = [entry for plist in postings for entry in plist]
+        self.rows = np.fromiter((row for row, _ in flat), dtype=np.int32, count=len(flat))
+        self.term_freqs = np.fromiter((count for _, count in flat), dtype=np.float32, count=len(flat))
+        self.idf = np.log1p((self.num_documents - sizes + 0.5) / (sizes + 0.5)).astype(np.float32)
+
+        average = float(self.doc_lengths.mean()) if self.num_documents else 0.0
+        self._length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(average, 1e-9))
+
+    def __len__(self):
+        return self.num_documents
+
+    def query_terms(self, query: str) -> List[str]:
+        """
+        Indexed terms of a query
+
+        Runs of plain words that spell a known compound ("skin rash") also
+        contribute the compound term, mirroring how documents are indexed.
+        """
+        words = _words(query)
+        terms = document_terms(' '.join(words))
+        for start in range(len(words)):
+            for size in range(2, self.max_phrase + 1):
+                phrase = '_'.join(words[start:start + size])
+                if start + size <= len(words) and phrase in self.vocabulary:
+                    terms.append(phrase)
+        return terms
+
+    def is_lexical_query(self, query: str) -> bool:
+        """
+        True if every content word of query belongs to a known symptom name
+
+        Such queries ("itching, skin rash", "I have chills and vomiting")
+        are answered from the inverted index alone.
+        """
+        if not self.symptoms:
+            return False
+        words = _words(query)
+        matched = False
+        i = 0
+        while i < len(words):
+            if words[i] in STOPWORDS and words[i] not in self.symptoms:
+                i += 1
+                continue
+            for size in range(min(self.max_phrase, len(words) - i), 0, -1):
+                if '_'.join(words[i:i + size]) in self.symptoms:
+                    i += size
+                    matched = True
+                    break
+            else:
+                return False
+        return matched
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        BM25 top_k documents for query
+
+        Returns:
+        List of (row, score) with positive scores, best first
+        """
+        scores = np.zeros(self.num_documents, dtype=np.float32)
+        for term in set(self.query_terms(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            rows = self.rows[start:end]
+            tf = self.term_freqs[start:end]
+            # Rows are unique within one posting list, so fancy-index addition is safe
+            scores[rows] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._length_norm[rows])
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        order = sorted(candidates.tolist(), key=lambda row: (-scores[row], row))
+        return [(row, float(scores[row])) for row in order]
+
+    def stats(self) -> Dict:
+        return {
+            'documents': self.num_documents,
+            'terms': len(self.vocabulary),
+            'postings': int(len(self.rows)),
+            'symptoms': len(self.symptoms)
+        }
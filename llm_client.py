@@ -0,0 +1,313 @@
+import abc
+import hashlib
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Upstream statuses worth retrying: rate limiting and transient gateway errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when the LLM backend cannot produce a completion"""
+
+
+class CircuitOpenError(LLMError):
+    """Raised without contacting the backend while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    After failure_threshold failed calls in a row the breaker opens and
+    calls fail immediately for reset_timeout seconds. It then lets a single
+    trial call through (half-open); success closes it, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Return True if a call may go to the backend now"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class LLMBackend(abc.ABC):
+    """
+    Interface the chat routes use to talk to a language model
+
+    complete() returns the whole reply, stream() yields it in text deltas
+    and stats() reports counters for /api/metrics. Failures are raised as
+    LLMError.
+    """
+
+    @abc.abstractmethod
+    def complete(self, messages, **options):
+        """Return the whole reply text"""
+
+    @abc.abstractmethod
+    def stream(self, messages, **options):
+        """Yield the reply as text deltas"""
+
+    @abc.abstractmethod
+    def stats(self):
+        """Return a dict of counters for /api/metrics"""
+
+
+class LLMClient(LLMBackend):
+    """
+    Chat-completions client for OpenAI-compatible endpoints
+
+    Works with hosted APIs (OpenRouter) and with local servers that expose
+    /v1/chat/completions, such as llama.cpp's server or Ollama.
+
+    Keeps one pooled requests.Session so consecutive chat turns reuse
+    keep-alive connections, applies separate connect/read timeouts, retries
+    connection failures and retryable statuses a bounded number of times
+    with jittered exponential backoff, and fails fast through a circuit
+    breaker while the backend is degraded.
+    """
+
+    def __init__(self, url, api_key, model, headers=None, connect_timeout=5.0, read_timeout=30.0,
+                 max_retries=2, backoff=0.5, max_backoff=4.0, pool_size=10, breaker=None):
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+        if api_key:
+            self.session.headers['Authorization'] = f"Bearer {api_key}"
+        if headers:
+            self.session.headers.update(headers)
+
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0,
+                       'total_latency': 0.0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _sleep_before_retry(self, attempt):
+        """Full-jitter exponential backoff"""
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        time.sleep(random.uniform(0, delay))
+
+    def _post(self, payload, stream=False):
+        """
+        POST payload with retries, returning the successful response
+
+        Read timeouts are not retried: the backend already spent the full
+        read timeout on the request and retrying would multiply the wait.
+        """
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpenError("AI service is temporarily unavailable (circuit open)")
+
+        self._count('requests')
+        start = time.perf_counter()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count('retries')
+                self._sleep_before_retry(attempt - 1)
+            try:
+                response = self.session.post(
+                    self.url,
+                    data=json.dumps(payload),
+                    timeout=(self.connect_timeout, self.read_timeout),
+                    stream=stream
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                last_error = e
+                continue
+            except requests.exceptions.RequestException as e:
+                last_error = e
+                break
+
+            if response.status_code in RETRYABLE_STATUSES and attempt < self.max_retries:
+                last_error = LLMError(f"HTTP {response.status_code} from AI service")
+                response.close()
+                continue
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                response.close()
+                last_error = e
+                break
+
+            self.breaker.record_success()
+            self._count('total_latency', time.perf_counter() - start)
+            return response
+
+        self.breaker.record_failure()
+        self._count('failures')
+        raise LLMError(str(last_error))
+
+    def complete(self, messages, **options):
+        """
+        Return the assistant message text for a chat-completions request
+
+        Parameters:
+        messages: List of message dictionaries with 'role' and 'content'
+        options: Extra request fields (temperature, max_tokens, ...)
+        """
+        payload = {'model': self.model, 'messages': messages}
+        payload.update(options)
+        response = self._post(payload)
+        try:
+            result = response.json()
+        except ValueError as e:
+            raise LLMError(f"Invalid response from AI service: {e}")
+
+        if 'choices' in result and len(result['choices']) > 0:
+            return result['choices'][0]['message']['content']
+        return None
+
+    def stream(self, messages, **options):
+        """
+        Yield assistant text deltas as the backend produces them
+
+        Uses the OpenAI-compatible server-sent events format ("data: {...}"
+        lines terminated by "data: [DONE]").
+        """
+        payload = {'model': self.model, 'messages': messages, 'stream': True}
+        payload.update(options)
+        response = self._post(payload, stream=True)
+        try:
+            # chunk_size=None hands over each chunk as soon as it arrives instead
+            # of waiting for a 512-byte buffer, which would delay the first tokens
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                # Blank keep-alive lines and ": comment" lines carry no data
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                if 'error' in chunk:
+                    raise LLMError(str(chunk['error']))
+                choices = chunk.get('choices') or []
+                if choices:
+                    content = (choices[0].get('delta') or {}).get('content')
+                    if content:
+                        yield content
+        except requests.exceptions.RequestException as e:
+            raise LLMError(str(e))
+        finally:
+            response.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        succeeded = stats['requests'] - stats['failures']
+        total_latency = stats.pop('total_latency')
+        stats['avg_latency_seconds'] = round(total_latency / succeeded, 4) if succeeded else 0.0
+        stats['circuit_state'] = self.breaker.state
+        return stats
+
+
+class StubLLMClient(LLMBackend):
+    """
+    Offline backend returning canned replies, for load tests and benchmarks
+
+    The reply is a pure function of the messages (same prompt, same text),
+    so runs are reproducible and measure only this application's own work.
+    latency simulates time to first token and token_delay the gap between
+    streamed words.
+    """
+
+    _WORDS = ('please', 'consult', 'a', 'healthcare', 'professional', 'about', 'these', 'symptoms',
+              'rest', 'stay', 'hydrated', 'and', 'monitor', 'any', 'changes', 'over', 'the', 'next', 'days')
+
+    def __init__(self, reply_words=60, latency=0.0, token_delay=0.0):
+        self.reply_words = reply_words
+        self.latency = latency
+        self.token_delay = token_delay
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'prompt_characters': 0}
+
+    def _reply_words(self, messages):
+        prompt = json.dumps(messages, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['prompt_characters'] += len(prompt)
+        seed = hashlib.sha256(prompt.encode('utf-8')).digest()
+        words = [self._WORDS[seed[i % len(seed)] % len(self._WORDS)] for i in range(self.reply_words)]
+        return [f"[stub reply to {len(messages)} messages]"] + words
+
+    def complete(self, messages, **options):
+        words = self._reply_words(messages)
+        if self.latency:
+            time.sleep(self.latency)
+        return ' '.join(words)
+
+    def stream(self, messages, **options):
+        words = self._reply_words(messages)
+        if self.latency:
+            time.sleep(self.latency)
+        for i, word in enumerate(words):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else ' ' + word
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['backend'] = 'stub'
+        return stats
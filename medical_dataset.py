@@ -0,0 +1,182 @@
+"""
+Shared, vectorized ingestion of the four dataset/ CSV files
+
+trainmodel.py (feature matrix, disease dictionaries) and rag_system.py
+(knowledge-base documents) both read the same files; MedicalDataset
+parses them once into column-oriented structures:
+
+cases          dataset.csv as read (one row per recorded case)
+case_symptoms  long table of (case, column, disease, raw, symptom), one row
+               per non-empty symptom cell, symptom stripped of whitespace
+all_symptoms   sorted unique symptom names (the model's feature order)
+
+Everything derived from them (one-hot matrix, frequencies, severities) is
+computed with pandas/NumPy group operations instead of per-row loops.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+DATASET_DIR = 'dataset'
+CASES_FILE = 'dataset.csv'
+DESCRIPTION_FILE = 'symptom_Description.csv'
+PRECAUTION_FILE = 'symptom_precaution.csv'
+SEVERITY_FILE = 'Symptom-severity.csv'
+
+PRECAUTION_COLUMNS = [f'Precaution_{i}' for i in range(1, 5)]
+
+
+def _non_empty_cells(frame):
+    """
+    Row indices, column indices and values of the non-NaN cells of frame
+
+    Cells come out row by row, left to right (the CSV's reading order).
+    """
+    values = frame.to_numpy(dtype=object)
+    rows, columns = np.nonzero(pd.notna(values))
+    return rows, columns, values[rows, columns]
+
+
+class MedicalDataset:
+    """Parsed contents of the dataset directory"""
+
+    def __init__(self, cases, descriptions, precautions, severity):
+        self.cases = cases
+        self.descriptions = descriptions
+        self.precautions = precautions
+        self.severity = severity
+        self.symptom_columns = list(cases.columns[1:])
+
+        case_rows, columns, values = _non_empty_cells(cases[self.symptom_columns])
+        raw = pd.Series(values, dtype=object).astype(str)
+        self.case_symptoms = pd.DataFrame({
+            'case': case_rows,
+            'column': np.asarray(self.symptom_columns, dtype=object)[columns],
+            'disease': cases['Disease'].to_numpy()[case_rows],
+            'raw': raw.to_numpy(),
+            'symptom': raw.str.strip().to_numpy()
+        })
+        valid = (self.case_symptoms['symptom'] != '') & (self.case_symptoms['symptom'] != 'nan')
+        self.case_symptoms = self.case_symptoms[valid].reset_index(drop=True)
+
+        self.all_symptoms = sorted(self.case_symptoms['symptom'].unique().tolist())
+        self.symptom_codes = pd.Categorical(self.case_symptoms['symptom'], categories=self.all_symptoms).codes
+
+    @property
+    def labels(self):
+        """
+        Disease of every case, aligned with the feature matrix rows
+
+        A unicode array rather than pandas' object dtype, so the classes_ of a
+        model trained on it can be saved with the compiled forest without pickling.
+        """
+        return self.cases['Disease'].to_numpy().astype(str)
+
+    def feature_matrix(self, dense=True):
+        """
+        One-hot symptom matrix with one row per case and one column per symptom
+
+        Parameters:
+        dense: Return a NumPy int8 array instead of a scipy CSR matrix
+        """
+        rows = self.case_symptoms['case'].to_numpy()
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int8), (rows, self.symptom_codes)),
+            shape=(len(self.cases), len(self.all_symptoms))
+        )
+        # A symptom listed twice in one case is still a single 1
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix.toarray() if dense else matrix
+
+    def symptom_severity_dict(self):
+        return dict(zip(self.severity['Symptom'].str.strip(), self.severity['weight']))
+
+    def description_dict(self):
+        return dict(zip(self.descriptions['Disease'], self.descriptions['Description']))
+
+    def precaution_dict(self):
+        """Disease -> list of its non-empty precautions, in column order"""
+        rows, _, values = _non_empty_cells(self.precautions[PRECAUTION_COLUMNS])
+        per_row = [[] for _ in range(len(self.precautions))]
+        for row, value in zip(rows.tolist(), values.tolist()):
+            per_row[row].append(value)
+        return dict(zip(self.precautions['Disease'], per_row))
+
+    def disease_severity_dict(self):
+        """
+        Average severity weight of the symptoms seen for each disease
+
+        A symptom counts once per dataset column it appears in for the
+        disease, matching how the model data has always been computed.
+        """
+        severity = self.symptom_severity_dict()
+        distinct = self.case_symptoms.drop_duplicates(['disease', 'column', 'raw'])
+        weights = distinct['symptom'].map(severity)
+        averages = weights.groupby(distinct['disease'], sort=False).mean().dropna().round(2)
+        return {disease: float(averages[disease]) if disease in averages.index else 0
+                for disease in self.cases['Disease'].unique()}
+
+    def symptom_frequencies(self):
+        """
+        How often each symptom occurs per disease
+
+        Returns:
+        DataFrame with columns disease, symptom, count, cases ordered by
+        disease (first appearance) and descending count; equal counts keep
+        the order in which the symptoms first appear scanning column by column
+        """
+        distinct = self.case_symptoms.drop_duplicates(['case', 'symptom'])
+        column_position = distinct['column'].map({c: i for i, c in enumerate(self.symptom_columns)})
+        distinct = distinct.iloc[np.lexsort((distinct['case'].to_numpy(), column_position.to_numpy()))]
+        counts = distinct.groupby(['disease', 'symptom'], sort=False).size().reset_index(name='count')
+        cases = self.cases.groupby('Disease', sort=False).size()
+        counts['cases'] = counts['disease'].map(cases).to_numpy()
+        order = {disease: i for i, disease in enumerate(cases.index)}
+        counts['_order'] = counts['disease'].map(order)
+        counts = counts.sort_values(['_order', 'count'], ascending=[True, False], kind='stable')
+        return counts.drop(columns='_order').reset_index(drop=True)
+
+    def case_symptom_lists(self):
+        """Raw symptom cells of every case as lists (cases without symptoms omitted)"""
+        keep = (self.case_symptoms['raw'] != 'nan').to_numpy()
+        cases = self.case_symptoms['case'].to_numpy()[keep]
+        raw = self.case_symptoms['raw'].to_numpy()[keep]
+        if not len(cases):
+            return pd.Series([], dtype=object)
+        # Cells are in reading order, so each case's cells are one contiguous run
+        starts = np.flatnonzero(np.r_[True, cases[1:] != cases[:-1]])
+        groups = np.split(raw, starts[1:])
+        return pd.Series([group.tolist() for group in groups], index=cases[starts], dtype=object)
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _file_state(paths):
+    return tuple((os.path.getmtime(p), os.path.getsize(p)) for p in paths)
+
+
+def load_dataset(data_dir=DATASET_DIR):
+    """
+    Parse the dataset directory, reusing the previous result while the files are unchanged
+
+    Raises:
+    FileNotFoundError if one of the CSV files is missing
+    """
+    paths = [os.path.join(data_dir, name) for name in (CASES_FILE, DESCRIPTION_FILE, PRECAUTION_FILE, SEVERITY_FILE)]
+    state = _file_state(paths)
+    key = os.path.abspath(data_dir)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+
+    dataset = MedicalDataset(*[pd.read_csv(p) for p in paths])
+    with _cache_lock:
+        _cache[key] = (state, dataset)
+    return dataset
@@ -0,0 +1,259 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+
+from forest_engine import FOREST_ARRAYS_PATH, CompiledForest
+from symptom_index import FuzzySymptomIndex, SymptomIndex, SymptomMatcher
+
+MODEL_PATH = 'random_forest_model.pkl'
+MODEL_DATA_PATH = 'model_data.pkl'
+
+
+def _resident_memory():
+    """Return this process's resident set size in bytes, or None if unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class ModelBundle:
+    """
+    Immutable snapshot of the trained model and its companion data.
+
+    A bundle is never mutated after it is built; the registry swaps in a
+    new bundle on reload, so callers holding a reference always see a
+    consistent model/data pair.
+    """
+
+    def __init__(self, model, model_data, engine, version, load_time, memory_bytes):
+        self.model = model
+        self.engine = engine
+        self.model_data = model_data
+        self.all_symptoms = model_data['all_symptoms']
+        self.symptom_severity_dict = model_data['symptom_severity_dict']
+        self.description_dict = model_data['description_dict']
+        self.precaution_dict = model_data['precaution_dict']
+        self.disease_severity_dict = model_data['disease_severity_dict']
+        self.feature_importance = model_data['feature_importance']
+        self.symptom_index = SymptomIndex(self.all_symptoms)
+        self.symptom_matcher = SymptomMatcher(self.all_symptoms)
+        self.fuzzy_index = FuzzySymptomIndex(self.all_symptoms)
+        self.version = version
+        self.loaded_at = time.time()
+        self.load_time = load_time
+        self.memory_bytes = memory_bytes
+
+
+class ModelRegistry:
+    """
+    Process-wide cache for the Random Forest model and model_data.pkl.
+
+    Files are unpickled once and shared by every caller. On access the
+    registry checks the files' mtime/size (at most every check_interval
+    seconds); when they change, the content hash decides whether to
+    reload. A reload builds a complete new bundle before swapping it in,
+    so concurrent requests never observe a half-loaded model. Reload
+    listeners are then called with the new bundle on a background thread.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, data_path=MODEL_DATA_PATH,
+                 forest_path=FOREST_ARRAYS_PATH, check_interval=1.0):
+        self.model_path = model_path
+        self.data_path = data_path
+        self.forest_path = forest_path
+        self.check_interval = check_interval
+        self._bundle = None
+        self._data = None
+        self._stat_signature = None
+        self._data_signature = None
+        self._content_hash = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._reload_count = 0
+        self._last_error = None
+        self._reload_listeners = []
+
+    def add_reload_listener(self, callback):
+        """Call callback(bundle) on a background thread after every hot reload (not the first load)"""
+        with self._lock:
+            self._reload_listeners.append(callback)
+
+    def _notify_reload(self):
+        """Start the reload listeners for the bundle just swapped in (caller holds the lock)"""
+        for callback in self._reload_listeners:
+            threading.Thread(target=callback, args=(self._bundle,), name='model-reload-listener',
+                             daemon=True).start()
+
+    def _stat(self, path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _hash_files(self, paths):
+        digest = hashlib.sha256()
+        for path in paths:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def _load_pickles(self, paths):
+        """Unpickle the given files while measuring wall time and resident memory growth"""
+        rss_before = _resident_memory()
+        start = time.perf_counter()
+        objects = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                objects.append(pickle.load(f))
+        load_time = time.perf_counter() - start
+        rss_after = _resident_memory()
+        if rss_before is None or rss_after is None:
+            memory_bytes = None
+        else:
+            memory_bytes = max(rss_after - rss_before, 0)
+        return objects, load_time, memory_bytes
+
+    def _load_engine(self, model):
+        """
+        Return the compiled forest for model
+
+        Uses the arrays exported by trainmodel.py when they are at least as
+        new as the pickle and describe the same classes/features; otherwise
+        flattens the loaded sklearn model directly.
+        """
+        if os.path.exists(self.forest_path) and \
+                os.path.getmtime(self.forest_path) >= os.path.getmtime(self.model_path):
+            try:
+                engine = CompiledForest.load(self.forest_path)
+                if engine.n_features == model.n_features_in_ and \
+                        np.array_equal(engine.classes_, model.classes_):
+                    return engine
+                print(f"{self.forest_path} does not match the model, recompiling")
+            except Exception as e:
+                print(f"Could not load {self.forest_path}, recompiling: {e}")
+        return CompiledForest.from_sklearn(model)
+
+    def _needs_check(self):
+        return time.monotonic() - self._last_check >= self.check_interval
+
+    def _refresh(self, force=False):
+        """Reload the bundle if the files on disk changed (caller holds the lock)"""
+        self._last_check = time.monotonic()
+        signature = (self._stat(self.model_path), self._stat(self.data_path))
+        if not force and self._bundle is not None and signature == self._stat_signature:
+            return
+
+        content_hash = self._hash_files([self.model_path, self.data_path])
+        if not force and self._bundle is not None and content_hash == self._content_hash:
+            # Touched but unchanged; remember the new stat so we skip hashing next time
+            self._stat_signature = signature
+            return
+
+        (model, model_data), load_time, memory_bytes = self._load_pickles(
+            [self.model_path, self.data_path]
+        )
+        engine = self._load_engine(model)
+        reloaded = self._bundle is not None
+        self._bundle = ModelBundle(model, model_data, engine, content_hash[:12], load_time, memory_bytes)
+        self._stat_signature = signature
+        self._content_hash = content_hash
+        self._reload_count += 1
+        memory_text = f"{memory_bytes / 1e6:.1f} MB" if memory_bytes is not None else "memory n/a"
+        print(f"Model registry loaded version {self._bundle.version} "
+              f"in {load_time:.2f}s ({memory_text})")
+        if reloaded:
+            self._notify_reload()
+
+    def _refresh_data(self):
+        """Reload model_data.pkl alone if it changed (caller holds the lock)"""
+        self._last_check = time.monotonic()
+        signature = self._stat(self.data_path)
+        if self._data is not None and signature == self._data_signature:
+            return
+        (model_data,), _, _ = self._load_pickles([self.data_path])
+        self._data = model_data
+        self._data_signature = signature
+
+    def get(self):
+        """
+        Return the current ModelBundle, loading or hot-reloading as needed
+
+        Raises FileNotFoundError if the model has not been trained yet.
+        """
+        bundle = self._bundle
+        if bundle is not None and not self._needs_check():
+            return bundle
+
+        with self._lock:
+            if self._bundle is None or self._needs_check():
+                try:
+                    self._refresh()
+                    self._last_error = None
+                except Exception as e:
+                    # Keep serving the previous model if a reload fails mid-write
+                    self._last_error = str(e)
+                    if self._bundle is None:
+                        raise
+                    print(f"Model reload failed, keeping version {self._bundle.version}: {e}")
+            return self._bundle
+
+    def get_model_data(self):
+        """
+        Return model_data.pkl contents without requiring the forest
+
+        Lets lightweight endpoints (e.g. the symptom list) work before the
+        model has been trained, and reuses the full bundle once it is loaded.
+        """
+        if self._bundle is not None:
+            return self.get().model_data
+
+        with self._lock:
+            if self._data is None or self._needs_check():
+                self._refresh_data()
+            return self._data
+
+    def reload(self):
+        """Force a reload from disk regardless of file signatures"""
+        with self._lock:
+            self._refresh(force=True)
+            return self._bundle
+
+    def stats(self):
+        """Return load statistics for the currently loaded model"""
+        bundle = self._bundle
+        if bundle is None:
+            return {'loaded': False, 'last_error': self._last_error}
+        return {
+            'loaded': True,
+            'version': bundle.version,
+            'loaded_at': bundle.loaded_at,
+            'load_time_seconds': round(bundle.load_time, 4),
+            'memory_bytes': bundle.memory_bytes,
+            'file_bytes': sum(os.path.getsize(p) for p in (self.model_path, self.data_path)
+                              if os.path.exists(p)),
+            'engine_nodes': bundle.engine.n_nodes,
+            'engine_bytes': bundle.engine.nbytes,
+            'reload_count': self._reload_count,
+            'model_path': self.model_path,
+            'data_path': self.data_path,
+            'last_error': self._last_error
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide ModelRegistry, creating it on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class StageMetrics:
+    """
+    Rolling per-stage latency statistics for the chat pipeline
+
+    Keeps the last `window` durations of every stage plus the wall time of
+    the whole request, so the critical path (the slowest of the parallel
+    stages) can be compared with the end-to-end latency.
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._critical_counts = {}
+        self._last = {}
+
+    def record(self, timings, parallel_stages=()):
+        """
+        Record one request's stage durations (seconds)
+
+        The slowest of parallel_stages is counted as that request's
+        critical-path stage.
+        """
+        with self._lock:
+            for stage, seconds in timings.items():
+                self._durations.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+            parallel = {s: timings[s] for s in parallel_stages if s in timings}
+            if parallel:
+                critical = max(parallel, key=parallel.get)
+                self._critical_counts[critical] = self._critical_counts.get(critical, 0) + 1
+            self._last = {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
+
+    def snapshot(self):
+        with self._lock:
+            stages = {}
+            for stage, values in self._durations.items():
+                ms = np.array(values) * 1000
+                stages[stage] = {
+                    'count': len(ms),
+                    'p50_ms': round(float(np.percentile(ms, 50)), 2),
+                    'p95_ms': round(float(np.percentile(ms, 95)), 2),
+                    'max_ms': round(float(ms.max()), 2)
+                }
+            return {
+                'stages': stages,
+                'critical_path_counts': dict(self._critical_counts),
+                'last_request_ms': dict(self._last)
+            }
+
+
+class ChatPipeline:
+    """Run independent chat-turn stages concurrently on a shared thread pool"""
+
+    def __init__(self, max_workers=8):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chat-stage')
+        self.metrics = StageMetrics()
+
+    @staticmethod
+    def _timed(func):
+        start = time.perf_counter()
+        result = func()
+        return result, time.perf_counter() - start
+
+    def run_parallel(self, stages):
+        """
+        Run the given stages concurrently
+
+        Parameters:
+        stages: Dictionary of stage name -> zero-argument callable
+
+        Returns:
+        Tuple of (results by stage name, durations in seconds by stage name).
+        The first exception raised by a stage is re-raised after all stages
+        have finished.
+        """
+        futures = {name: self.executor.submit(self._timed, func) for name, func in stages.items()}
+        results = {}
+        timings = {}
+        error = None
+        for name, future in futures.items():
+            try:
+                results[name], timings[name] = future.result()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results, timings
+
+    def time_stage(self, timings, name, func):
+        """Run func in the calling thread, adding its duration to timings"""
+        result, timings[name] = self._timed(func)
+        return result
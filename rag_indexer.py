@@ -0,0 +1,79 @@
+"""
+Offline maintenance of the RAG index directory
+
+Usage:
+    python rag_indexer.py update [--index-dir DIR] [encoding options]
+    python rag_indexer.py rebuild [--index-dir DIR] [encoding options]
+
+update re-reads dataset/*.csv and re-encodes only documents whose text
+changed since the index was saved; rebuild re-encodes everything.
+
+Encoding options: --batch-size (texts per forward pass), --chunk-size
+(texts held in memory at once) and --workers (CPU encoding processes).
+rebuild --index-type chooses the ANN index (flat, ivf, hnsw, ivfpq);
+without it, and always for update, the saved index keeps its type and
+parameters (a new index directory is flat).
+"""
+import argparse
+import time
+
+from ann_index import INDEX_TYPES
+from rag_storage import manifest_path
+from rag_system import MedicalRAG, RAG_INDEX_DIR
+
+
+def update(index_dir=RAG_INDEX_DIR, rebuild=False, batch_size=64, chunk_size=8192, workers=1, index_type=None):
+    """
+    Bring the index directory in line with the knowledge CSVs
+
+    index_type None keeps the type and parameters of the saved index.
+
+    Returns:
+    Dictionary with added/removed/unchanged counts, or None on failure
+    """
+    rag = MedicalRAG(encode_batch_size=batch_size, encode_chunk_size=chunk_size, encode_workers=workers,
+                     index_type=index_type)
+    saved = manifest_path(index_dir) is not None
+    # A full rebuild only loads the saved index to copy its type and parameters
+    if saved and (not rebuild or index_type is None) and not rag.load(index_dir):
+        return None
+    if not rebuild and saved:
+        summary = rag.update_index()
+    elif rag.load_medical_knowledge() and rag.build_index():
+        summary = {'added': len(rag.documents), 'removed': 0, 'unchanged': 0, 'full_rebuild': True}
+    else:
+        summary = None
+
+    if summary is not None:
+        rag.save(index_dir)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for command, help_text in (('update', 'apply dataset changes incrementally'),
+                               ('rebuild', 're-encode every document')):
+        sub = subparsers.add_parser(command, help=help_text)
+        sub.add_argument('--index-dir', default=RAG_INDEX_DIR)
+        sub.add_argument('--batch-size', type=int, default=64)
+        sub.add_argument('--chunk-size', type=int, default=8192)
+        sub.add_argument('--workers', type=int, default=1)
+        if command == 'rebuild':
+            sub.add_argument('--index-type', choices=INDEX_TYPES, default=None,
+                             help='default: keep the type of the saved index')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = update(args.index_dir, rebuild=args.command == 'rebuild', batch_size=args.batch_size,
+                     chunk_size=args.chunk_size, workers=args.workers,
+                     index_type=getattr(args, 'index_type', None))
+    if summary is None:
+        print("Index update failed")
+        raise SystemExit(1)
+    print(f"{args.index_dir}: {summary['added']} encoded, {summary['removed']} removed, "
+          f"{summary['unchanged']} reused in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
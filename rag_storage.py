@@ -0,0 +1,347 @@
+"""
+On-disk layout for the RAG knowledge base
+
+A saved index directory holds numbered versions and a pointer to the
+live one:
+
+    CURRENT                name of the live version directory
+    v000001/, v000002/     one saved index each, laid out as below
+
+Each save writes a new version and then repoints CURRENT, so the version
+that running processes have memory-mapped is never renamed or deleted
+while they use it (Windows refuses to, and POSIX readers would see the
+files change underneath them). Older versions are pruned best-effort.
+Saves take an exclusive lock on a `lock` file in the directory, so
+worker processes saving at the same time write one version after the
+other instead of sharing a version number and temporary directory.
+Directories written before versioning (the layout below directly in the
+directory, no CURRENT) are still read.
+
+A version directory contains:
+
+    index.faiss            native FAISS index, opened with IO_FLAG_MMAP
+    documents.bin          UTF-8 document texts, concatenated
+    documents.offsets.npy  int64 byte offsets (n + 1) into documents.bin
+    ids.npy                int64 FAISS id of each document (optional)
+    metadata/              one file per metadata column (see ColumnarMetadata)
+    manifest.json          format version, row count and source fingerprints
+
+Everything is memory-mapped on load, so N worker processes opening the
+same directory share the page cache instead of each unpickling a copy.
+"""
+import json
+import mmap
+import os
+import shutil
+from typing import Dict, Iterator, List, Optional
+
+import faiss
+import numpy as np
+
+from embedding_cache import file_lock
+
+FORMAT_VERSION = 1
+
+CURRENT_FILE = 'CURRENT'
+
+# Held exclusively by a save from version allocation to pruning
+LOCK_FILE = 'lock'
+
+# Versions kept on save: the new one and the one processes may still have open
+KEEP_VERSIONS = 2
+
+_LEGACY_ENTRIES = ('manifest.json', 'index.faiss', 'documents.bin', 'documents.offsets.npy', 'ids.npy', 'metadata')
+
+# Separator for list-valued metadata fields (ASCII unit separator)
+_LIST_SEPARATOR = '\x1f'
+
+
+class DocumentStore:
+    """Read-only sequence of strings backed by an offset-indexed blob"""
+
+    def __init__(self, blob, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    @classmethod
+    def open(cls, blob_path: str, offsets_path: str) -> 'DocumentStore':
+        offsets = np.load(offsets_path, mmap_mode='r')
+        if os.path.getsize(blob_path) == 0:
+            return cls(b'', offsets)
+        with open(blob_path, 'rb') as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(blob, offsets)
+
+    @staticmethod
+    def write(texts: List[str], blob_path: str, offsets_path: str):
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        with open(blob_path, 'wb') as f:
+            for i, text in enumerate(texts):
+                encoded = text.encode('utf-8')
+                f.write(encoded)
+                offsets[i + 1] = offsets[i] + len(encoded)
+        np.save(offsets_path, offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('document index out of range')
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        return self._blob[start:end].decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class ColumnarMetadata:
+    """
+    Read-only sequence of metadata dicts stored column by column
+
+    Each key found in the dicts becomes a column in its own .npy file(s):
+
+    numeric     float64 values, NaN where the row has no value
+    categorical int32 codes into <column>.categories.json, -1 for missing
+    text        offset-indexed UTF-8 blob (long/unique strings and lists)
+
+    Rows are rebuilt on access with only the keys they originally had.
+    """
+
+    def __init__(self, directory: str, columns: Dict[str, Dict], count: int):
+        self._columns = {}
+        self._count = count
+        for name, spec in columns.items():
+            kind = spec['kind']
+            base = os.path.join(directory, name)
+            if kind == 'numeric':
+                data = np.load(base + '.npy', mmap_mode='r')
+                self._columns[name] = (kind, data, spec.get('integer', False))
+            elif kind == 'categorical':
+                codes = np.load(base + '.npy', mmap_mode='r')
+                with open(base + '.categories.json', 'r', encoding='utf-8') as f:
+                    categories = json.load(f)
+                self._columns[name] = (kind, codes, categories)
+            else:
+                present = np.load(base + '.present.npy', mmap_mode='r')
+                store = DocumentStore.open(base + '.bin', base + '.offsets.npy')
+                self._columns[name] = (kind, store, (present, spec.get('is_list', False)))
+
+    @staticmethod
+    def write(rows: List[Dict], directory: str) -> Dict[str, Dict]:
+        """Write rows as columns into directory and return the column specs"""
+        os.makedirs(directory, exist_ok=True)
+        names = []
+        for row in rows:
+            for key in row:
+                if key not in names:
+                    names.append(key)
+
+        specs = {}
+        for name in names:
+            values = [row.get(name) for row in rows]
+            present = [name in row for row in rows]
+            base = os.path.join(directory, name)
+            sample = [v for v in values if v is not None]
+
+            if sample and all(isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool)
+                              for v in sample):
+                data = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+                np.save(base + '.npy', data)
+                specs[name] = {'kind': 'numeric', 'integer': all(float(v).is_integer() for v in sample)}
+            elif sample and all(isinstance(v, str) for v in sample) and len(set(sample)) <= max(256, len(sample) // 4):
+                categories = sorted(set(sample))
+                lookup = {c: i for i, c in enumerate(categories)}
+                codes = np.array([-1 if v is None else lookup[v] for v in values], dtype=np.int32)
+                np.save(base + '.npy', codes)
+                with open(base + '.categories.json', 'w', encoding='utf-8') as f:
+                    json.dump(categories, f, ensure_ascii=False)
+                specs[name] = {'kind': 'categorical'}
+            else:
+                is_list = any(isinstance(v, (list, tuple)) for v in sample)
+                texts = []
+                for v in values:
+                    if v is None:
+                        texts.append('')
+                    elif is_list:
+                        texts.append(_LIST_SEPARATOR.join(str(item) for item in v))
+                    else:
+                        texts.append(str(v))
+                DocumentStore.write(texts, base + '.bin', base + '.offsets.npy')
+                np.save(base + '.present.npy', np.array(present, dtype=bool))
+                specs[name] = {'kind': 'text', 'is_list': is_list}
+        return specs
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError('metadata index out of range')
+
+        row = {}
+        for name, (kind, data, extra) in self._columns.items():
+            if kind == 'numeric':
+                value = float(data[idx])
+                if not np.isnan(value):
+                    row[name] = int(value) if extra else value
+            elif kind == 'categorical':
+                code = int(data[idx])
+                if code >= 0:
+                    row[name] = extra[code]
+            else:
+                present, is_list = extra
+                if present[idx]:
+                    text = data[idx]
+                    row[name] = (text.split(_LIST_SEPARATOR) if text else []) if is_list else text
+        return row
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+
+def resolve_index_dir(directory: str) -> Optional[str]:
+    """Directory holding the live saved index (a version or a legacy layout), or None"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+        if name:
+            return os.path.join(directory, name)
+    except FileNotFoundError:
+        pass
+    if os.path.exists(os.path.join(directory, 'manifest.json')):
+        return directory
+    return None
+
+
+def manifest_path(directory: str) -> Optional[str]:
+    """manifest.json of the live saved index in directory, or None if nothing is saved there"""
+    resolved = resolve_index_dir(directory)
+    if resolved is None:
+        return None
+    path = os.path.join(resolved, 'manifest.json')
+    return path if os.path.exists(path) else None
+
+
+def _versions(directory: str) -> List[str]:
+    """Version directory names, oldest first"""
+    names = [name for name in os.listdir(directory)
+             if name.startswith('v') and name[1:].isdigit() and os.path.isdir(os.path.join(directory, name))]
+    return sorted(names, key=lambda name: int(name[1:]))
+
+
+def _remove_quietly(path: str):
+    """Delete a file or directory, leaving it for a later save if it is still in use"""
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def save_rag_index(directory: str, index, documents, metadata, ids: Optional[np.ndarray] = None,
+                   sources: Optional[Dict[str, str]] = None):
+    """
+    Write index, documents and metadata as a new version in directory
+
+    sources is stored in the manifest as-is (e.g. fingerprints of the files
+    the documents were built from).
+
+    The version is written under a temporary name, renamed, and only then
+    made current, so a concurrent reader never sees a half-written index and
+    the version in use is left in place. Concurrent saves, from this or
+    other processes, are serialized.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), 'a+b') as lock, file_lock(lock):
+        _save_version(directory, index, documents, metadata, ids, sources)
+
+
+def _save_version(directory: str, index, documents, metadata, ids, sources):
+    """Write and publish one version (caller holds the directory lock)"""
+    existing = _versions(directory)
+    name = f"v{int(existing[-1][1:]) + 1 if existing else 1:06d}"
+    version_dir = os.path.join(directory, name)
+    tmp_dir = version_dir + '.tmp'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    if index is not None:
+        faiss.write_index(index, os.path.join(tmp_dir, 'index.faiss'))
+    DocumentStore.write(list(documents), os.path.join(tmp_dir, 'documents.bin'),
+                        os.path.join(tmp_dir, 'documents.offsets.npy'))
+    columns = ColumnarMetadata.write(list(metadata), os.path.join(tmp_dir, 'metadata'))
+    if ids is not None:
+        np.save(os.path.join(tmp_dir, 'ids.npy'), np.asarray(ids, dtype=np.int64))
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'count': len(documents),
+        'has_index': index is not None,
+        'has_ids': ids is not None,
+        'columns': columns,
+        'sources': sources
+    }
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(tmp_dir, version_dir)
+
+    current_tmp = os.path.join(directory, CURRENT_FILE + '.tmp')
+    with open(current_tmp, 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(current_tmp, os.path.join(directory, CURRENT_FILE))
+
+    # Prune versions nobody should still be reading, and a pre-versioning layout
+    for old in _versions(directory)[:-KEEP_VERSIONS]:
+        _remove_quietly(os.path.join(directory, old))
+    for entry in _LEGACY_ENTRIES:
+        _remove_quietly(os.path.join(directory, entry))
+
+
+def load_rag_index(directory: str, mmap_index: bool = True):
+    """
+    Open the live index of a directory written by save_rag_index
+
+    Returns:
+    Tuple of (FAISS index or None, DocumentStore, ColumnarMetadata,
+    document ids or None, manifest)
+    """
+    resolved = resolve_index_dir(directory)
+    if resolved is None:
+        raise FileNotFoundError(f"No saved RAG index in {directory}")
+    directory = resolved
+    with open(os.path.join(directory, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported RAG index format {manifest.get('format_version')}")
+
+    index: Optional[object] = None
+    if manifest.get('has_index'):
+        index_path = os.path.join(directory, 'index.faiss')
+        if mmap_index:
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+            except RuntimeError:
+                # Some index types cannot be memory-mapped; fall back to a private copy
+                index = faiss.read_index(index_path)
+        else:
+            index = faiss.read_index(index_path)
+
+    documents = DocumentStore.open(os.path.join(directory, 'documents.bin'),
+                                   os.path.join(directory, 'documents.offsets.npy'))
+    metadata = ColumnarMetadata(os.path.join(directory, 'metadata'), manifest['columns'], manifest['count'])
+    ids = np.load(os.path.join(directory, 'ids.npy'), mmap_mode='r') if manifest.get('has_ids') else None
+    return index, documents, metadata, ids, manifest
@@ -1,36 +1,279 @@
-import pandas as pd
 import numpy as np
+import hashlib
+import json
 import pickle
 import os
-from sentence_transformers import SentenceTransformer
-import faiss
-from typing import List, Dict, Tuple
+import re
+import tempfile
+import threading
+import time
+from typing import Any, List, Dict, NamedTuple, Sequence, Tuple, Optional, TYPE_CHECKING
+from embedding_cache import EmbeddingCache, normalize_query
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from versioned_cache import VersionedLRUCache
+
+# sentence-transformers (torch), FAISS and pandas are imported where they are
+# first needed: importing this module stays cheap, the FAISS index is only
+# read by load()/build_index() and the model only on the first dense query
+# or warm_up()
+if TYPE_CHECKING:
+    from medical_dataset import MedicalDataset
+
+# Default on-disk location of the saved knowledge base and FAISS index
+RAG_INDEX_DIR = 'rag_index'
+
+# CSV files the knowledge base is built from
+KNOWLEDGE_FILES = [
+    'dataset/dataset.csv',
+    'dataset/symptom_Description.csv',
+    'dataset/symptom_precaution.csv',
+    'dataset/Symptom-severity.csv'
+]
+
+# Bump when load_medical_knowledge builds documents differently, so saved
+# indexes are brought up to date even though the CSVs did not change
+DOCUMENT_FORMAT = 2
+
+# dense: FAISS only; hybrid: BM25 fast path for symptom-only queries, RRF otherwise
+RETRIEVAL_MODES = ('dense', 'hybrid')
+
+# Minimum candidates taken from each retriever before fusing rankings
+FUSION_DEPTH = 20
+
+
+class SearchState(NamedTuple):
+    """Everything one search reads, installed together so an index swap is atomic"""
+    index: Any
+    documents: Sequence[str]
+    metadata: Sequence[Dict]
+    doc_ids: Optional[np.ndarray]
+    id_lookup: Optional[Tuple[np.ndarray, np.ndarray]]
+    lexical: Optional[LexicalIndex]
+    version: int
+
+
+def document_ids(documents: List[str]) -> np.ndarray:
+    """
+    Content-derived FAISS ids for documents
+    
+    The id is the first 63 bits of the SHA-256 of the text, so an unchanged
+    document keeps its id (and embedding) across rebuilds. Repeated texts
+    are told apart by their occurrence number.
+    """
+    seen = {}
+    ids = np.empty(len(documents), dtype=np.int64)
+    for i, text in enumerate(documents):
+        occurrence = seen.get(text, 0)
+        seen[text] = occurrence + 1
+        digest = hashlib.sha256(f"{occurrence}\x00{text}".encode('utf-8')).digest()
+        ids[i] = int.from_bytes(digest[:8], 'little') & 0x7FFFFFFFFFFFFFFF
+    return ids
+
+
+def aggregate_symptom_documents(dataset: 'MedicalDataset') -> Tuple[List[str], List[Dict]]:
+    """
+    Build one symptom document per disease from the per-case rows of dataset.csv
+    
+    Symptoms are listed most frequent first with the share of that disease's
+    cases they appear in, e.g. "itching (100%), skin_rash (92%)".
+    """
+    documents = []
+    metadata = []
+    for disease, group in dataset.symptom_frequencies().groupby('disease', sort=False):
+        total = int(group['cases'].iloc[0])
+        symptoms = group['symptom'].tolist()
+        weighted = ', '.join(f"{s} ({round(100 * c / total)}%)" for s, c in zip(symptoms, group['count']))
+        documents.append(f"Disease: {disease}\nSymptoms: {weighted}")
+        metadata.append({
+            'type': 'symptoms',
+            'disease': disease,
+            'symptoms': symptoms,
+            'cases': total
+        })
+    return documents, metadata
+
+
+def deduplicate_documents(documents: List[str], metadata: List[Dict],
+                          threshold: float = 0.9) -> Tuple[List[str], List[Dict], int]:
+    """
+    Drop exact and near-duplicate documents, keeping the first occurrence
+    
+    Exact duplicates are detected on case- and whitespace-normalized text.
+    Near duplicates are documents whose word sets have Jaccard similarity of
+    at least threshold with an earlier document about the same subject (the
+    first line, e.g. "Disease: Malaria"), which keeps comparisons local.
+    
+    Returns:
+    Tuple of (documents, metadata, number of documents dropped)
+    """
+    seen = set()
+    kept_tokens: Dict[str, List[set]] = {}
+    kept_documents = []
+    kept_metadata = []
+    for text, meta in zip(documents, metadata):
+        normalized = ' '.join(text.lower().split())
+        if normalized in seen:
+            continue
+        tokens = set(re.findall(r'\w+', normalized))
+        block = kept_tokens.setdefault(text.split('\n', 1)[0].strip().lower(), [])
+        if any(len(tokens & other) >= threshold * len(tokens | other) for other in block):
+            continue
+        seen.add(normalized)
+        block.append(tokens)
+        kept_documents.append(text)
+        kept_metadata.append(meta)
+    return kept_documents, kept_metadata, len(documents) - len(kept_documents)
+
+
+def knowledge_fingerprint() -> Dict[str, str]:
+    """SHA-256 of each knowledge CSV, recorded in the index manifest"""
+    fingerprint = {'document_format': str(DOCUMENT_FORMAT)}
+    for path in KNOWLEDGE_FILES:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                fingerprint[path] = hashlib.sha256(f.read()).hexdigest()
+    return fingerprint
+
+
+def knowledge_base_changed(index_dir: str = RAG_INDEX_DIR) -> bool:
+    """True if the knowledge CSVs differ from the ones the saved index was built from"""
+    from rag_storage import manifest_path
+    
+    path = manifest_path(index_dir)
+    if path is None:
+        return True
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            sources = json.load(f).get('sources')
+    except (OSError, ValueError):
+        return True
+    return sources != knowledge_fingerprint()
+
 
 class MedicalRAG:
-    def __init__(self, model_name='all-MiniLM-L6-v2'):
+    def __init__(self, model_name='all-MiniLM-L6-v2', embedding_cache: Optional[EmbeddingCache] = None,
+                 context_cache_size: int = 1024, encode_batch_size: int = 64, encode_chunk_size: int = 8192,
+                 encode_workers: int = 1, index_type: Optional[str] = None, index_params: Optional[Dict] = None,
+                 retrieval: str = 'hybrid'):
         """Initialize RAG system with embedding model"""
-        self.embedding_model = SentenceTransformer(model_name)
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{retrieval}', expected one of {', '.join(RETRIEVAL_MODES)}")
+        self.model_name = model_name
+        
+        # SentenceTransformer, created on first use by the embedding_model property
+        self._embedding_model = None
+        self._model_lock = threading.Lock()
+        self.model_load_seconds = None
+        
+        # BM25 index over the same documents, rebuilt whenever the index is swapped
+        self.retrieval = retrieval
+        self.lexical = None
+        self.retrieval_counts = {'lexical': 0, 'hybrid': 0, 'dense': 0}
+        
+        # ANN index built by build_index (see ann_index.INDEX_TYPES); None rebuilds
+        # a loaded index with its own type and parameters, and builds flat otherwise
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        
+        # Document encoding for index builds: bounded chunks, optional process pool
+        self._pipeline = None
+        self._encode_settings = {'batch_size': encode_batch_size, 'chunk_size': encode_chunk_size,
+                                 'workers': encode_workers}
         self.index = None
         self.documents = []
         self.metadata = []
         
-    def load_medical_knowledge(self):
-        """Load and process medical datasets into knowledge base"""
+        # Content-hash ids of the indexed documents (None for legacy positional indexes)
+        self.doc_ids = None
+        self._id_lookup = None
+        self.sources = None
+        
+        # index.faiss the current index was memory-mapped from, if any
+        self._index_file = None
+        
+        # Query embeddings are cached; the disk tier (if configured) is opened once the
+        # vector dimension is known, from the loaded index or the model
+        self.embedding_cache = embedding_cache or EmbeddingCache()
+        
+        # Formatted contexts are cached per index version; swapping the index bumps it
+        self.index_version = 0
+        self.context_cache = VersionedLRUCache(context_cache_size, version_label='index_version')
+        
+        # Searches read one SearchState snapshot; _install replaces it (and the
+        # attributes above) under _swap_lock
+        self._swap_lock = threading.Lock()
+        self._state = SearchState(None, [], [], None, None, None, 0)
+        
+    @property
+    def embedding_model(self):
+        """The SentenceTransformer, loaded on first access (thread-safe)"""
+        if self._embedding_model is None:
+            with self._model_lock:
+                if self._embedding_model is None:
+                    from sentence_transformers import SentenceTransformer
+                    start = time.perf_counter()
+                    model = SentenceTransformer(self.model_name)
+                    self.embedding_cache.attach_disk(self.model_name, model.get_sentence_embedding_dimension())
+                    self.model_load_seconds = time.perf_counter() - start
+                    self._embedding_model = model
+                    print(f"Loaded embedding model {self.model_name} in {self.model_load_seconds:.1f}s")
+        return self._embedding_model
+    
+    @property
+    def model_loaded(self) -> bool:
+        return self._embedding_model is not None
+    
+    @property
+    def pipeline(self):
+        """EmbeddingPipeline for index builds (loads the model)"""
+        if self._pipeline is None:
+            from embedding_pipeline import EmbeddingPipeline
+            self._pipeline = EmbeddingPipeline(self.embedding_model, **self._encode_settings)
+        return self._pipeline
+    
+    def warm_up(self) -> float:
+        """
+        Load the embedding model and run one encode so the first query does not pay for it
+        
+        Returns:
+        Seconds spent
+        """
+        start = time.perf_counter()
+        self.embedding_model.encode(['warm up'], convert_to_numpy=True)
+        return time.perf_counter() - start
+    
+    def load_medical_knowledge(self, aggregate: bool = True):
+        """
+        Load and process medical datasets into knowledge base
+        
+        With aggregate (the default) dataset.csv contributes one frequency-weighted
+        symptom document per disease instead of one per row, and exact or
+        near-duplicate documents are dropped.
+        """
+        knowledge = self.read_medical_knowledge(aggregate)
+        if knowledge is None:
+            return False
+        self.documents, self.metadata, self.sources = knowledge
+        return True
+    
+    def read_medical_knowledge(self, aggregate: bool = True) -> Optional[Tuple[List[str], List[Dict], Dict]]:
+        """
+        Build the knowledge-base documents without touching the live ones
+        
+        Returns:
+        Tuple of (documents, metadata, source fingerprints), or None on failure
+        """
         documents = []
         metadata = []
         
         # Load datasets
         try:
-            df_dataset = pd.read_csv('dataset/dataset.csv')
-            df_description = pd.read_csv('dataset/symptom_Description.csv')
-            df_precaution = pd.read_csv('dataset/symptom_precaution.csv')
-            df_severity = pd.read_csv('dataset/Symptom-severity.csv')
+            from medical_dataset import load_dataset
+            sources = knowledge_fingerprint()
+            dataset = load_dataset(os.path.dirname(KNOWLEDGE_FILES[0]))
             
             # Process disease descriptions
-            for _, row in df_description.iterrows():
-                disease = row['Disease']
-                description = row['Description']
-                
+            for disease, description in zip(dataset.descriptions['Disease'], dataset.descriptions['Description']):
                 doc_text = f"Disease: {disease}\nDescription: {description}"
                 documents.append(doc_text)
                 metadata.append({
@@ -40,27 +283,25 @@ class MedicalRAG:
                 })
             
             # Process disease symptoms
-            for _, row in df_dataset.iterrows():
-                disease = row['Disease']
-                symptoms = [str(row[col]) for col in df_dataset.columns[1:] 
-                           if pd.notna(row[col]) and str(row[col]) != 'nan']
-                
-                if symptoms:
+            if aggregate:
+                symptom_documents, symptom_metadata = aggregate_symptom_documents(dataset)
+                documents.extend(symptom_documents)
+                metadata.extend(symptom_metadata)
+            else:
+                diseases = dataset.cases['Disease']
+                for case, symptoms in dataset.case_symptom_lists().items():
                     symptoms_text = ', '.join(symptoms)
-                    doc_text = f"Disease: {disease}\nSymptoms: {symptoms_text}"
+                    doc_text = f"Disease: {diseases[case]}\nSymptoms: {symptoms_text}"
                     documents.append(doc_text)
                     metadata.append({
                         'type': 'symptoms',
-                        'disease': disease,
+                        'disease': diseases[case],
                         'symptoms': symptoms
                     })
             
             # Process precautions
-            for _, row in df_precaution.iterrows():
-                disease = row['Disease']
-                precautions = [str(row[f'Precaution_{i}']) for i in range(1, 5) 
-                              if pd.notna(row[f'Precaution_{i}'])]
-                
+            for disease, precautions in dataset.precaution_dict().items():
+                precautions = [str(p) for p in precautions]
                 if precautions:
                     precautions_text = ', '.join(precautions)
                     doc_text = f"Disease: {disease}\nPrecautions: {precautions_text}"
@@ -72,10 +313,7 @@ class MedicalRAG:
                     })
             
             # Process symptom severity
-            severity_info = []
-            for _, row in df_severity.iterrows():
-                symptom = row['Symptom']
-                weight = row['weight']
+            for symptom, weight in zip(dataset.severity['Symptom'], dataset.severity['weight']):
                 severity_level = 'mild' if weight < 3 else 'moderate' if weight < 5 else 'severe'
                 
                 doc_text = f"Symptom: {symptom}\nSeverity: {severity_level} (weight: {weight})"
@@ -87,15 +325,17 @@ class MedicalRAG:
                     'severity_level': severity_level
                 })
             
-            self.documents = documents
-            self.metadata = metadata
-            
-            print(f"Loaded {len(documents)} documents into knowledge base")
-            return True
+            dropped = 0
+            if aggregate:
+                documents, metadata, dropped = deduplicate_documents(documents, metadata)
             
+            print(f"Loaded {len(documents)} documents into knowledge base"
+                  + (f" ({dropped} duplicates dropped)" if dropped else ""))
+            return documents, metadata, sources
+        
         except Exception as e:
             print(f"Error loading medical knowledge: {e}")
-            return False
+            return None
     
     def build_index(self):
         """Build FAISS index from documents"""
@@ -103,51 +343,300 @@ class MedicalRAG:
             print("No documents loaded. Call load_medical_knowledge() first.")
             return False
         
+        documents, metadata = self.documents, self.metadata
+        index, doc_ids = self._build_new_index(documents)
+        self._install(index, documents, metadata, doc_ids)
+        return True
+    
+    def _build_new_index(self, documents) -> Tuple[Any, np.ndarray]:
+        """Encode documents into a new index (not yet installed); returns (index, ids)"""
+        from ann_index import create_index, index_settings
+        
+        index_type, index_params = self.index_type, self.index_params
+        if index_type is None:
+            index_type, index_params = index_settings(self.index) if self.index is not None else ('flat', {})
+        
         print("Generating embeddings...")
-        embeddings = self.embedding_model.encode(
-            self.documents, 
-            show_progress_bar=True,
-            convert_to_numpy=True
-        )
         
-        # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(embeddings)
+        # Create FAISS index; vectors are stored under their content-hash ids
+        doc_ids = document_ids(list(documents))
+        dimension = self.embedding_model.get_sentence_embedding_dimension()
+        index, settings = create_index(index_type, dimension, len(doc_ids), **index_params)
+        self._encode_into(index, documents, doc_ids, show_progress=True, train_size=settings.get('train_size'))
         
-        # Create FAISS index
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product = cosine similarity
-        self.index.add(embeddings)
+        print(f"Built {index_type} FAISS index with {index.ntotal} vectors")
+        return index, doc_ids
+    
+    def update_index(self) -> Optional[Dict]:
+        """
+        Re-read the knowledge CSVs and apply only the differences to the index
         
-        print(f"Built FAISS index with {self.index.ntotal} vectors")
-        return True
+        Documents whose text is unchanged keep their stored vectors; new or
+        edited documents are encoded and added with add_with_ids, and
+        documents that disappeared are dropped with remove_ids, or for HNSW
+        (which cannot remove vectors) by rebuilding the graph from the stored
+        vectors of the documents that remain. Falls back to a full
+        build_index when there is no index to update; unless index_type was
+        given, the rebuilt index has the type and parameters of the current one.
+        
+        Returns:
+        Dictionary with added/removed/unchanged counts, or None on failure
+        """
+        import faiss
+        from ann_index import supports_remove, without_ids
+        
+        # Everything is built on the side; searches keep using the live state
+        # until _install swaps the new index, documents and ids in together
+        state = self._state
+        old_ids = state.doc_ids
+        index = state.index
+        if index is not None and old_ids is None and index.ntotal == len(state.documents):
+            # Legacy positional index: file its stored vectors under content ids
+            old_ids = document_ids(list(state.documents))
+            vectors = index.reconstruct_n(0, index.ntotal)
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+            index.add_with_ids(vectors, old_ids)
+        elif index is not None:
+            # Work on a private copy: the live index may be memory-mapped and is
+            # still serving searches until the swap below
+            index = self._writable_copy(index)
+        
+        knowledge = self.read_medical_knowledge()
+        if knowledge is None:
+            return None
+        documents, metadata, sources = knowledge
+        new_ids = document_ids(documents)
+        old_id_set = set(old_ids.tolist()) if old_ids is not None else set()
+        new_id_set = set(new_ids.tolist())
+        removed = np.array(sorted(old_id_set - new_id_set), dtype=np.int64)
+        
+        if index is None or old_ids is None:
+            if not documents:
+                print("No documents loaded.")
+                return None
+            index, new_ids = self._build_new_index(documents)
+            self._install(index, documents, metadata, new_ids, sources)
+            return {'added': len(documents), 'removed': 0, 'unchanged': 0, 'full_rebuild': True}
+        
+        added_rows = [i for i, doc_id in enumerate(new_ids.tolist()) if doc_id not in old_id_set]
+        
+        if len(removed) and supports_remove(index):
+            index.remove_ids(removed)
+        elif len(removed):
+            # HNSW graphs cannot delete vectors; rebuild the graph without re-encoding
+            index = without_ids(index, removed)
+        if added_rows:
+            print(f"Encoding {len(added_rows)} new or changed documents...")
+            self._encode_into(index, [documents[i] for i in added_rows], new_ids[added_rows])
+        
+        self._install(index, documents, metadata, new_ids, sources)
+        
+        summary = {
+            'added': len(added_rows),
+            'removed': int(len(removed)),
+            'unchanged': len(documents) - len(added_rows),
+            'full_rebuild': False
+        }
+        print(f"Updated FAISS index: {summary['added']} added, {summary['removed']} removed, "
+              f"{summary['unchanged']} unchanged")
+        return summary
+    
+    def _encode_into(self, index, documents, doc_ids: np.ndarray, show_progress: bool = False,
+                     train_size: Optional[int] = None):
+        """
+        Encode documents (normalized for cosine similarity) and add them to index under doc_ids
+        
+        An untrained (IVF) index is first trained on a sample of train_size embeddings.
+        """
+        from ann_index import train_index
+        
+        with tempfile.TemporaryDirectory(prefix='rag-embeddings-') as scratch:
+            embeddings = self.pipeline.encode_to_memmap(documents, os.path.join(scratch, 'embeddings.npy'),
+                                                        show_progress=show_progress)
+            trained_on = train_index(index, embeddings, train_size)
+            if trained_on:
+                print(f"Trained index on {trained_on} sampled vectors")
+            self.pipeline.add_to_index(index, embeddings, doc_ids)
+            del embeddings
+    
+    def _writable_copy(self, index):
+        """In-memory copy of index that can be modified without affecting searches"""
+        import faiss
+        try:
+            return faiss.clone_index(index)
+        except RuntimeError:
+            # Memory-mapped IVF lists cannot be cloned; read the file privately instead
+            if self._index_file is None:
+                raise
+            return faiss.read_index(self._index_file)
+    
+    def _install(self, index, documents, metadata, doc_ids: Optional[np.ndarray], sources: Optional[Dict] = None,
+                 index_file: Optional[str] = None):
+        """
+        Make index, documents, metadata and ids live in one step
+        
+        index_file is the saved file index was memory-mapped from (None for an
+        index built or copied in memory).
+        
+        The id lookup and BM25 index are derived first; searches see either
+        the complete old state or the complete new one. Results computed from
+        the old index are invalidated.
+        """
+        id_lookup = None
+        if doc_ids is not None:
+            order = np.argsort(doc_ids, kind='stable')
+            id_lookup = (np.asarray(doc_ids)[order], order)
+        lexical = self._build_lexical_index(documents, metadata) if index is not None else None
+        if index is not None:
+            self.embedding_cache.attach_disk(self.model_name, index.d)
+        
+        with self._swap_lock:
+            self.index = index
+            self.documents = documents
+            self.metadata = metadata
+            self.doc_ids = doc_ids
+            self._id_lookup = id_lookup
+            self.lexical = lexical
+            if sources is not None:
+                self.sources = sources
+            self._index_file = index_file
+            if index is not None:
+                self.index_version += 1
+            self._state = SearchState(index, documents, metadata, doc_ids, id_lookup, lexical, self.index_version)
+            self.context_cache.invalidate()
+    
+    @staticmethod
+    def _rows_for_ids(state: SearchState, ids: np.ndarray) -> List[Optional[int]]:
+        """Map FAISS result ids to document rows (None for missing/padding ids)"""
+        lookup = state.id_lookup
+        if lookup is None:
+            # Legacy index: ids are positions
+            return [int(i) if 0 <= i < len(state.documents) else None for i in ids]
+        sorted_ids, order = lookup
+        positions = np.searchsorted(sorted_ids, ids)
+        rows = []
+        for doc_id, pos in zip(ids, positions):
+            if doc_id >= 0 and pos < len(sorted_ids) and sorted_ids[pos] == doc_id:
+                rows.append(int(order[pos]))
+            else:
+                rows.append(None)
+        return rows
     
     def search(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Search for relevant documents"""
-        if self.index is None:
+        """
+        Search for relevant documents
+        
+        In hybrid mode a query made only of known symptom names ("itching,
+        skin rash") is answered from the BM25 index without embedding it;
+        any other query fuses the dense and BM25 rankings with reciprocal
+        rank fusion, and 'score' is then the fused score. Dense mode
+        searches FAISS alone.
+        """
+        return self._search(self._state, query, top_k)
+    
+    def _search(self, state: SearchState, query: str, top_k: int) -> List[Dict]:
+        if state.index is None:
             return []
         
-        # Generate query embedding
-        query_embedding = self.embedding_model.encode([query], convert_to_numpy=True)
-        faiss.normalize_L2(query_embedding)
+        lexical = state.lexical if self.retrieval == 'hybrid' else None
+        if lexical is not None and lexical.is_lexical_query(query):
+            hits = lexical.search(query, top_k)
+            if hits:
+                self.retrieval_counts['lexical'] += 1
+                return [self._result(state, row, score) for row, score in hits]
         
-        # Search
-        scores, indices = self.index.search(query_embedding, top_k)
+        if lexical is None:
+            self.retrieval_counts['dense'] += 1
+            return [self._result(state, row, score) for row, score in self._dense_search(state, query, top_k)]
         
-        results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.documents):
-                results.append({
-                    'document': self.documents[idx],
-                    'metadata': self.metadata[idx],
-                    'score': float(score)
-                })
+        depth = max(top_k * 4, FUSION_DEPTH)
+        rankings = [[row for row, _ in self._dense_search(state, query, depth)],
+                    [row for row, _ in lexical.search(query, depth)]]
+        self.retrieval_counts['hybrid'] += 1
+        return [self._result(state, row, score) for row, score in reciprocal_rank_fusion(rankings)[:top_k]]
+    
+    def _dense_search(self, state: SearchState, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """FAISS top_k as (row, cosine similarity) pairs"""
+        # Generate query embedding (normalized vectors are cached per query text)
+        query_embedding = self.embed_query(query)
+        
+        scores, indices = state.index.search(query_embedding, top_k)
+        return [(row, float(score)) for score, row in zip(scores[0], self._rows_for_ids(state, indices[0]))
+                if row is not None]
+    
+    @staticmethod
+    def _result(state: SearchState, row: int, score: float) -> Dict:
+        return {
+            'id': int(state.doc_ids[row]) if state.doc_ids is not None else row,
+            'document': state.documents[row],
+            'metadata': state.metadata[row],
+            'score': score
+        }
+    
+    @staticmethod
+    def _build_lexical_index(documents, metadata) -> LexicalIndex:
+        """BM25 index over documents; symptom names are taken from the metadata"""
+        symptoms = set()
+        for meta in metadata:
+            symptoms.update(meta.get('symptoms', ()))
+            if 'symptom' in meta:
+                symptoms.add(meta['symptom'])
+        return LexicalIndex(documents, symptoms)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Return the L2-normalized (1, dim) embedding of a query, using the cache"""
+        import faiss
+        
+        def encode(text):
+            embedding = self.embedding_model.encode([text], convert_to_numpy=True).astype(np.float32)
+            faiss.normalize_L2(embedding)
+            return embedding
         
-        return results
+        return self.embedding_cache.get_or_encode(query, encode)
+    
+    def cached_query_embedding(self, query: str) -> Optional[np.ndarray]:
+        """The query's embedding if search already computed it, without running the model"""
+        return self.embedding_cache.peek(query)
+    
+    def cache_stats(self) -> Dict:
+        """Return index and cache statistics for the retrieval path"""
+        from ann_index import describe_index
+        
+        return {
+            'index': describe_index(self.index) if self.index is not None else None,
+            'embedding_model': {'loaded': self.model_loaded, 'load_seconds': self.model_load_seconds},
+            'retrieval': {
+                'mode': self.retrieval,
+                'queries': dict(self.retrieval_counts),
+                'lexical_index': self.lexical.stats() if self.lexical is not None else None
+            },
+            'embedding_cache': self.embedding_cache.stats(),
+            'context_cache': self.context_cache.stats()
+        }
     
     def get_context_for_query(self, query: str, top_k: int = 5) -> str:
         """Get formatted context for LLM based on query"""
-        results = self.search(query, top_k)
+        return self.get_context_with_ids(query, top_k)[0]
+    
+    def get_context_with_ids(self, query: str, top_k: int = 5) -> Tuple[str, Tuple[int, ...]]:
+        """
+        Formatted context for query and the ids of the documents it was built from
+        
+        The ids identify what the LLM was shown (the response cache is scoped by them).
+        """
+        state = self._state
+        key = (normalize_query(query), top_k)
+        cached = self.context_cache.get(state.version, key)
+        if cached is not None:
+            return cached
         
+        results = self._search(state, query, top_k)
+        entry = (self._format_context(results), tuple(result['id'] for result in results))
+        self.context_cache.put(state.version, key, entry)
+        return entry
+    
+    def _format_context(self, results: List[Dict]) -> str:
+        """Format search results as the context block sent to the LLM"""
         if not results:
             return ""
         
@@ -160,32 +649,58 @@ class MedicalRAG:
         
         return '\n'.join(context_parts)
     
-    def save(self, filepath: str = 'rag_system.pkl'):
-        """Save RAG system to file"""
-        data = {
-            'documents': self.documents,
-            'metadata': self.metadata,
-            'index': faiss.serialize_index(self.index) if self.index else None
-        }
+    def save(self, path: str = RAG_INDEX_DIR):
+        """
+        Save RAG system to an index directory (see rag_storage)
+        
+        A path ending in .pkl writes the legacy single-file pickle instead.
+        """
+        import faiss
+        from rag_storage import save_rag_index
         
-        with open(filepath, 'wb') as f:
-            pickle.dump(data, f)
+        if path.endswith('.pkl'):
+            data = {
+                'documents': list(self.documents),
+                'metadata': list(self.metadata),
+                'doc_ids': self.doc_ids,
+                'index': faiss.serialize_index(self.index) if self.index else None
+            }
+            with open(path, 'wb') as f:
+                pickle.dump(data, f)
+        else:
+            save_rag_index(path, self.index, self.documents, self.metadata, self.doc_ids, self.sources)
         
-        print(f"RAG system saved to {filepath}")
+        print(f"RAG system saved to {path}")
     
-    def load(self, filepath: str = 'rag_system.pkl'):
-        """Load RAG system from file"""
+    def load(self, path: str = RAG_INDEX_DIR):
+        """
+        Load RAG system from an index directory or a legacy .pkl file
+        
+        Index directories are memory-mapped: documents, metadata and the FAISS
+        vectors are paged in on demand and shared between processes.
+        """
         try:
-            with open(filepath, 'rb') as f:
-                data = pickle.load(f)
+            import faiss
+            from rag_storage import load_rag_index, resolve_index_dir
             
-            self.documents = data['documents']
-            self.metadata = data['metadata']
-            
-            if data['index'] is not None:
-                self.index = faiss.deserialize_index(data['index'])
+            if path.endswith('.pkl'):
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+                
+                documents = data['documents']
+                metadata = data['metadata']
+                doc_ids = data.get('doc_ids')
+                index = faiss.deserialize_index(data['index']) if data['index'] is not None else None
+                sources = None
+                index_file = None
+            else:
+                index, documents, metadata, doc_ids, manifest = load_rag_index(path)
+                sources = manifest.get('sources')
+                index_file = os.path.join(resolve_index_dir(path), 'index.faiss')
             
-            print(f"RAG system loaded from {filepath}")
+            self._install(index, documents, metadata, doc_ids, sources, index_file)
+
+            print(f"RAG system loaded from {path}")
             return True
         except Exception as e:
             print(f"Error loading RAG system: {e}")
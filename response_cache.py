@@ -0,0 +1,164 @@
+"""
+Semantic cache of LLM replies for repeated questions
+
+A reply is stored under the normalized question text, the embedding of
+the question when retrieval computed one, and a scope: the disease
+prediction text and the ids of the retrieved knowledge-base documents
+that went into the prompt. A later question is answered from the cache
+when its normalized text matches exactly, or its embedding is at least
+`threshold` cosine-similar to a stored one (searched with a FAISS
+inner-product index), and its scope is identical. A paraphrase ("how to
+prevent malaria" / "how can I prevent malaria?") reuses the reply, but a
+different prediction or different retrieved documents never do.
+Questions answered without an embedding (the BM25 fast path) only match
+exactly, so the cache never makes the embedding model run.
+
+Entries expire after ttl seconds and the least recently used entry is
+evicted beyond max_size.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+
+def response_scope(prediction_text: str, doc_ids: Iterable[int]) -> tuple:
+    """Cache scope of a chat turn: its prediction text and retrieved document ids"""
+    digest = hashlib.sha256(prediction_text.encode('utf-8')).hexdigest()
+    return digest, tuple(int(doc_id) for doc_id in doc_ids)
+
+
+class SemanticResponseCache:
+    """
+    Parameters:
+    threshold: Minimum cosine similarity between L2-normalized query embeddings
+    max_size: Maximum number of cached replies (LRU eviction)
+    ttl: Seconds a reply stays valid (None for no expiry)
+    candidates: Nearest stored questions inspected per lookup
+    """
+
+    def __init__(self, threshold: float = 0.92, max_size: int = 1024, ttl: Optional[float] = 3600.0,
+                 candidates: int = 8):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.candidates = candidates
+        self._index = None
+        # entry id -> (query, scope, reply, stored_at, llm_seconds, has_vector), oldest first
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._exact: Dict[tuple, int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.expired = 0
+        self.evictions = 0
+        self.time_saved = 0.0
+
+    def _remove(self, entry_id: int):
+        query, scope, _, _, _, has_vector = self._entries.pop(entry_id)
+        if self._exact.get((query, scope)) == entry_id:
+            del self._exact[(query, scope)]
+        if has_vector:
+            self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def _hit(self, entry_id: int, now: float) -> Optional[str]:
+        """Reply of a live entry (recording the hit), or None after dropping an expired one"""
+        _, _, reply, stored_at, llm_seconds, _ = self._entries[entry_id]
+        if self.ttl is not None and now - stored_at >= self.ttl:
+            self._remove(entry_id)
+            self.expired += 1
+            return None
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        self.time_saved += llm_seconds
+        return reply
+
+    def get(self, query: str, scope: tuple, embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        """
+        Cached reply for the same or a similar question with the same scope, or None
+
+        Parameters:
+        query: Normalized question text
+        embedding: L2-normalized (1, dim) query embedding, if one was computed
+        """
+        with self._lock:
+            now = time.monotonic()
+            entry_id = self._exact.get((query, scope))
+            if entry_id is not None:
+                reply = self._hit(entry_id, now)
+                if reply is not None:
+                    self.exact_hits += 1
+                    return reply
+            if embedding is not None and self._index is not None and self._index.ntotal:
+                k = min(self.candidates, int(self._index.ntotal))
+                scores, ids = self._index.search(np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1), k)
+                for score, entry_id in zip(scores[0].tolist(), ids[0].tolist()):
+                    if score < self.threshold:
+                        break
+                    entry = self._entries.get(entry_id)
+                    if entry is None or entry[1] != scope:
+                        continue
+                    reply = self._hit(entry_id, now)
+                    if reply is not None:
+                        return reply
+            self.misses += 1
+            return None
+
+    def put(self, query: str, scope: tuple, reply: str, llm_seconds: float = 0.0,
+            embedding: Optional[np.ndarray] = None):
+        """Store reply; llm_seconds is what a later hit saves"""
+        vector = None
+        if embedding is not None:
+            import faiss
+
+            vector = np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            previous = self._exact.get((query, scope))
+            if previous is not None:
+                self._remove(previous)
+            entry_id = self._next_id
+            self._next_id += 1
+            if vector is not None:
+                if self._index is None:
+                    self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+                self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (query, scope, reply, time.monotonic(), llm_seconds, vector is not None)
+            self._exact[(query, scope)] = entry_id
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def bypass(self):
+        """Count a turn that skipped the cache (conversation with history)"""
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._exact.clear()
+            if self._index is not None:
+                self._index.reset()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'exact_hits': self.exact_hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'time_saved_seconds': round(self.time_saved, 3)
+            }
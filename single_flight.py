@@ -0,0 +1,145 @@
+"""
+Coalescing of identical concurrent requests
+
+When many users send the same first message at once (a symptom checker
+campaign), every request would run the same RAG retrieval and LLM call.
+A SingleFlight lets the first caller for a key (the leader) do the work
+while concurrent callers with the same key wait for it and receive the
+same result; the key is forgotten as soon as the call finishes, so later
+requests start a fresh call. Nothing is cached beyond the in-flight call.
+
+Streaming calls are shared too: one background thread consumes the
+upstream stream into a buffer and every subscriber replays the buffer
+from the start, so a request that joins late still receives every delta
+and a subscriber that disconnects does not cut the others off. Blocking
+and streaming calls have separate key spaces: a do() caller never joins
+a stream() in flight under the same key, or vice versa.
+"""
+import threading
+
+
+class _Call:
+    """A call in flight and, once done, its result or exception"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    """Deltas produced so far by a shared stream"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.deltas = []
+        self.finished = False
+        self.error = None
+
+    def subscribe(self):
+        position = 0
+        while True:
+            with self.condition:
+                while position == len(self.deltas) and not self.finished:
+                    self.condition.wait()
+                new = self.deltas[position:]
+                finished = self.finished
+            position += len(new)
+            yield from new
+            if finished and position == len(self.deltas):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """
+    Share one in-flight computation among concurrent callers with the same key
+
+    Parameters:
+    name: Label for thread names and stats
+    """
+
+    def __init__(self, name='single-flight'):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    def _join(self, key, factory):
+        """Return (in-flight entry for key, True if the caller created it)"""
+        with self._lock:
+            entry = self._calls.get(key)
+            if entry is not None:
+                self.collapsed += 1
+                return entry, False
+            entry = self._calls[key] = factory()
+            self.calls += 1
+            return entry, True
+
+    def _forget(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def do(self, key, func):
+        """
+        Return func(), or the result of the identical call already in flight
+
+        An exception raised by the leader is raised in every waiting caller.
+        """
+        call, leader = self._join(('do', key), _Call)
+        if leader:
+            try:
+                call.result = func()
+            except Exception as e:
+                call.error = e
+            finally:
+                self._forget(('do', key))
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stream(self, key, func):
+        """
+        Subscribe to the stream func() returns, shared with concurrent callers
+
+        func is only called by the leader, and its iterator is consumed on a
+        background thread.
+
+        Returns:
+        Tuple of (iterator over all deltas, True if this caller started the stream)
+        """
+        shared, leader = self._join(('stream', key), _Stream)
+        if leader:
+            threading.Thread(target=self._pump, args=(('stream', key), shared, func),
+                             name=f'{self.name}-stream', daemon=True).start()
+        return shared.subscribe(), leader
+
+    def _pump(self, key, shared, func):
+        try:
+            for delta in func():
+                with shared.condition:
+                    shared.deltas.append(delta)
+                    shared.condition.notify_all()
+        except Exception as e:
+            shared.error = e
+        finally:
+            # New requests for the key start their own call from here on
+            self._forget(key)
+            with shared.condition:
+                shared.finished = True
+                shared.condition.notify_all()
+
+    def stats(self):
+        with self._lock:
+            total = self.calls + self.collapsed
+            return {
+                'calls': self.calls,
+                'collapsed': self.collapsed,
+                'collapse_rate': round(self.collapsed / total, 4) if total else 0.0,
+                'in_flight': len(self._calls)
+            }
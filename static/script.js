@@ -33,23 +33,7 @@ chatForm.addEventListener('submit', async (e) => {
     setSendButtonState(true);
     
     try {
-        // Send message to backend
-        const response = await fetch('/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ message })
-        });
-        
-        const data = await response.json();
-        
-        if (response.ok) {
-            // Add bot response to chat
-            addMessage(data.response, 'bot');
-        } else {
-            addMessage(`Error: ${data.error || 'Failed to get response'}`, 'bot', true);
-        }
+        await streamChat(message);
     } catch (error) {
         addMessage(`Error: ${error.message}`, 'bot', true);
     } finally {
@@ -57,6 +41,62 @@ chatForm.addEventListener('submit', async (e) => {
     }
 });
 
+// Send a message to the streaming endpoint and render the reply as it arrives
+async function streamChat(message) {
+    const response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ message })
+    });
+    
+    if (!response.ok) {
+        const data = await response.json();
+        addMessage(`Error: ${data.error || 'Failed to get response'}`, 'bot', true);
+        return;
+    }
+    
+    const messageText = addMessage('', 'bot');
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let content = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const event = parseSseEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+            
+            if (event.name === 'prediction' || event.name === 'token') {
+                content += event.data.content;
+                messageText.innerHTML = formatMessage(content);
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            }
+        }
+    }
+}
+
+// Parse one "event: ...\ndata: ..." Server-Sent Events frame
+function parseSseEvent(frame) {
+    let name = 'message';
+    let data = '';
+    for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) {
+            name = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+        }
+    }
+    return { name, data: data ? JSON.parse(data) : {} };
+}
+
 // Add message to chat
 function addMessage(content, sender, isError = false) {
     const messageDiv = document.createElement('div');
@@ -85,6 +125,8 @@ function addMessage(content, sender, isError = false) {
     
     // Scroll to bottom
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    
+    return messageText;
 }
 
 // Format message with line breaks and lists
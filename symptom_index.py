@@ -0,0 +1,398 @@
+import re
+
+_SEPARATORS = re.compile(r'[\s_]+')
+
+
+def normalize_symptom(name):
+    """
+    Canonical form used for symptom lookups
+
+    Lower-cases, strips surrounding whitespace and collapses any run of
+    spaces/underscores into a single underscore, so "Skin Rash",
+    " skin_rash" and the dataset's "dischromic _patches" all normalize
+    to the same key as their underscore-only spelling.
+    """
+    return _SEPARATORS.sub('_', str(name).strip().lower()).strip('_')
+
+
+class SymptomIndex:
+    """
+    Normalized symptom name -> feature column lookup table
+
+    Built once per model load so matching user input against the symptom
+    vocabulary is a dictionary lookup instead of a scan over all_symptoms.
+    """
+
+    def __init__(self, all_symptoms):
+        self.all_symptoms = list(all_symptoms)
+        self._index = {}
+        for idx, symptom in enumerate(self.all_symptoms):
+            # Exact lower-cased spelling (what the old linear scan matched) plus
+            # the normalized alias; the first column wins on collisions
+            self._index.setdefault(symptom.lower(), idx)
+            self._index.setdefault(normalize_symptom(symptom), idx)
+
+    def __len__(self):
+        return len(self.all_symptoms)
+
+    def __contains__(self, symptom):
+        return self.lookup(symptom) is not None
+
+    def lookup(self, symptom):
+        """Return the feature column for a symptom name, or None if unknown"""
+        idx = self._index.get(symptom.strip().lower())
+        if idx is None:
+            idx = self._index.get(normalize_symptom(symptom))
+        return idx
+
+    def match(self, symptoms_list):
+        """
+        Resolve a list of user-supplied symptom names
+
+        Parameters:
+        symptoms_list: List of symptom strings
+
+        Returns:
+        Tuple of (column indices, matched canonical names, unmatched inputs)
+        """
+        indices = []
+        matched_symptoms = []
+        unmatched_symptoms = []
+
+        for symptom in symptoms_list:
+            idx = self.lookup(symptom)
+            if idx is None:
+                unmatched_symptoms.append(symptom.strip().lower().replace(' ', '_'))
+            else:
+                indices.append(idx)
+                matched_symptoms.append(self.all_symptoms[idx])
+
+        return indices, matched_symptoms, unmatched_symptoms
+
+    def match_fuzzy(self, symptoms_list, fuzzy_index, min_confidence=None):
+        """
+        Resolve symptom names like match(), correcting typos with fuzzy_index
+
+        An unknown input whose best FuzzySymptomIndex candidate reaches
+        min_confidence (default FUZZY_MIN_CONFIDENCE) counts as that symptom;
+        otherwise it stays unmatched and its candidates become suggestions.
+        An ambiguous word ("fever") stays unmatched with every symptom it
+        may mean as a suggestion.
+
+        Returns:
+        Tuple of (column indices, matched canonical names, unmatched inputs,
+        corrections as {'input', 'symptom', 'confidence'} dictionaries,
+        suggestions as {input: candidate list})
+        """
+        if min_confidence is None:
+            min_confidence = FUZZY_MIN_CONFIDENCE
+        indices = []
+        matched_symptoms = []
+        unmatched_symptoms = []
+        corrected_symptoms = []
+        suggestions = {}
+
+        for symptom in symptoms_list:
+            idx = self.lookup(symptom)
+            if idx is None:
+                name = symptom.strip().lower().replace(' ', '_')
+                meanings = [s for s in AMBIGUOUS_SYMPTOMS.get(_phrase(symptom), ()) if self.lookup(s) is not None]
+                if meanings:
+                    unmatched_symptoms.append(name)
+                    suggestions[name] = [{'symptom': s, 'confidence': 1.0} for s in meanings]
+                    continue
+                candidates = fuzzy_index.candidates(symptom)
+                if not candidates or candidates[0]['confidence'] < min_confidence:
+                    unmatched_symptoms.append(name)
+                    if candidates:
+                        suggestions[name] = candidates
+                    continue
+                idx = self.lookup(candidates[0]['symptom'])
+                corrected_symptoms.append({'input': name, **candidates[0]})
+            indices.append(idx)
+            matched_symptoms.append(self.all_symptoms[idx])
+
+        return indices, matched_symptoms, unmatched_symptoms, corrected_symptoms, suggestions
+
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+# Lay phrasings of dataset symptoms, matched alongside the symptom names
+# themselves; entries whose target is not in the model's vocabulary are ignored
+SYMPTOM_SYNONYMS = {
+    'skin_rash': ['rash', 'rashes', 'skin rashes'],
+    # A bare "fever" or "temperature" could be either (see AMBIGUOUS_SYMPTOMS)
+    'high_fever': ['high temperature', 'very high fever'],
+    'mild_fever': ['slight fever', 'low grade fever', 'mild temperature', 'slight temperature'],
+    'vomiting': ['vomit', 'vomited', 'throwing up', 'throw up', 'puking'],
+    'fatigue': ['tired', 'tiredness', 'exhausted', 'exhaustion'],
+    'itching': ['itchy', 'itch', 'itches'],
+    'cough': ['coughing'],
+    'dizziness': ['dizzy', 'lightheaded', 'light headed'],
+    'sweating': ['sweaty', 'sweats', 'night sweats'],
+    'breathlessness': ['shortness of breath', 'short of breath', 'breathless', 'difficulty breathing'],
+    'stomach_pain': ['stomach ache', 'stomachache', 'tummy ache', 'tummy pain'],
+    'belly_pain': ['belly ache'],
+    'headache': ['headaches', 'head ache', 'head hurts'],
+    'nausea': ['nauseous', 'nauseated'],
+    'diarrhoea': ['diarrhea', 'loose motions', 'loose stools'],
+    'yellowish_skin': ['yellow skin'],
+    'yellowing_of_eyes': ['yellow eyes'],
+    'congestion': ['blocked nose', 'stuffy nose'],
+    'continuous_sneezing': ['sneezing'],
+    'chest_pain': ['chest pains'],
+    'joint_pain': ['joint pains', 'aching joints'],
+    'muscle_pain': ['muscle aches', 'muscle ache', 'body aches'],
+    'back_pain': ['backache', 'back ache'],
+    'shivering': ['shivers', 'shivery'],
+    'chills': ['chill'],
+    'loss_of_appetite': ['no appetite'],
+    'weight_loss': ['losing weight'],
+    'weight_gain': ['gaining weight'],
+    'polyuria': ['frequent urination'],
+    'burning_micturition': ['burning urination', 'burning while urinating'],
+    'blurred_and_distorted_vision': ['blurred vision', 'blurry vision'],
+    'fast_heart_rate': ['racing heart', 'heart racing', 'rapid heartbeat'],
+    'palpitations': ['palpitation'],
+    'anxiety': ['anxious'],
+    'depression': ['depressed'],
+    'constipation': ['constipated'],
+    'dehydration': ['dehydrated'],
+    'bruising': ['bruises'],
+    'blister': ['blisters'],
+    'cramps': ['cramping'],
+}
+# Lay words that name more than one dataset symptom: never resolved
+# automatically, only offered as suggestions by match_fuzzy
+AMBIGUOUS_SYMPTOMS = {
+    'fever': ['high_fever', 'mild_fever'],
+    'temperature': ['high_fever', 'mild_fever'],
+}
+
+# Words that negate the symptoms right after them ("no fever", "I don't have
+# a rash", "denies chest pain"); contractions tokenize as don + t etc.
+NEGATION_CUES = frozenset([
+    'no', 'not', 'without', 'never', 'deny', 'denies', 'denied', 'neither', 'nor',
+    'don', 'doesn', 'didn', 'haven', 'hasn', 'isn', 'aren', 'dont', 'doesnt', 'didnt'
+])
+
+# Tokens a negation may reach over ("no high fever", "not having any fever")
+NEGATION_WINDOW = 3
+
+# A negation carries on through a list joined by these ("no fever or chills")
+_NEGATION_JOINERS = frozenset(['or', 'nor', 'any'])
+
+# Punctuation and contrast words end a negation's scope ("no fever, but a rash")
+_NEGATION_BREAK = re.compile(r'[.,;:!?]|\b(?:but|however|although|though|except|yet)\b')
+
+
+class SymptomMatcher:
+    """
+    Token trie over symptom names and synonyms for scanning free text
+
+    Names are split into lower-case alphanumeric tokens ("skin_rash",
+    "skin rash" and "Skin-Rash" are all skin, rash), so underscores,
+    spacing and punctuation in the message do not matter. find() walks the
+    message once from left to right, taking the longest phrase starting at
+    each token; since no phrase is longer than max_tokens tokens, the scan
+    is linear in the message length.
+
+    A mention within NEGATION_WINDOW tokens after a negation cue, with no
+    punctuation or contrast word in between, is negated ("I have no fever").
+    """
+
+    _END = object()
+
+    def __init__(self, all_symptoms, synonyms=SYMPTOM_SYNONYMS):
+        self._root = {}
+        self.max_tokens = 0
+        for symptom in all_symptoms:
+            self._add(symptom, symptom)
+        known = set(all_symptoms)
+        for symptom, phrases in synonyms.items():
+            if symptom in known:
+                for phrase in phrases:
+                    self._add(phrase, symptom)
+
+    def _add(self, phrase, symptom):
+        tokens = _TOKEN.findall(phrase.lower())
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # The first name registered for a phrase wins (dataset names before synonyms)
+        node.setdefault(self._END, symptom)
+        self.max_tokens = max(self.max_tokens, len(tokens))
+
+    def mentions(self, message):
+        """
+        Locate symptom mentions in message, negated or not
+
+        Returns:
+        List of (start, end, symptom, negated) character spans, in message order
+        """
+        message = message.lower()
+        tokens = [(m.group(), m.start(), m.end()) for m in _TOKEN.finditer(message)]
+        spans = []
+        # Token index and character offset where the active negation's reach starts
+        negation = None
+        chained = False
+        i = 0
+        while i < len(tokens):
+            node = self._root
+            best = None
+            j = i
+            while j < len(tokens) and tokens[j][0] in node:
+                node = node[tokens[j][0]]
+                j += 1
+                if self._END in node:
+                    best = (j, node[self._END])
+            if best is None:
+                if tokens[i][0] in NEGATION_CUES:
+                    negation, chained = (i + 1, tokens[i][2]), False
+                i += 1
+                continue
+            start, end = tokens[i][1], tokens[best[0] - 1][2]
+            negated = False
+            if negation is not None:
+                gap = tokens[negation[0]:i]
+                negated = (len(gap) <= NEGATION_WINDOW
+                           and not _NEGATION_BREAK.search(message, negation[1], start)
+                           and (not chained or all(token in _NEGATION_JOINERS for token, _, _ in gap)))
+            spans.append((start, end, best[1], negated))
+            negation, chained = ((best[0], end), True) if negated else (None, False)
+            i = best[0]
+        return spans
+
+    def find(self, message):
+        """
+        Locate symptom mentions in message, leaving out negated ones
+
+        Returns:
+        List of (start, end, symptom) character spans, in message order
+        """
+        return [(start, end, symptom) for start, end, symptom, negated in self.mentions(message) if not negated]
+
+    def extract(self, message):
+        """Distinct symptoms mentioned (and not negated) in message, in order of first mention"""
+        return list(dict.fromkeys(symptom for _, _, symptom in self.find(message)))
+
+
+# Fuzzy matches at or above this confidence are applied automatically;
+# weaker ones are only offered as suggestions
+FUZZY_MIN_CONFIDENCE = 0.75
+
+
+def _phrase(text):
+    """Symptom text reduced to space-separated alphanumeric tokens"""
+    return ' '.join(_TOKEN.findall(str(text).lower()))
+
+
+def _trigrams(phrase):
+    padded = f"  {phrase} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance between a and b (insertions, deletions,
+    substitutions and adjacent transpositions), or None if it exceeds max_distance
+
+    Only the diagonal band of width max_distance is computed, and rows stop
+    as soon as every cell in the band exceeds the bound.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    over = max_distance + 1
+    previous2 = None
+    previous = [j if j <= max_distance else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        for j in range(low, high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = min(value, over)
+        if min(current[low - 1:high + 1]) > max_distance:
+            return None
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+class FuzzySymptomIndex:
+    """
+    Character-trigram index over symptom names and synonyms for typo correction
+
+    A misspelling ("itchng", "vomitting") is looked up by the trigrams it
+    shares with the known phrases. Only the best-overlapping phrases are
+    verified with a bounded edit distance, so resolving one input costs a
+    few dozen short comparisons instead of a scan over the vocabulary.
+    """
+
+    def __init__(self, all_symptoms, synonyms=SYMPTOM_SYNONYMS, shortlist=20):
+        self.shortlist = shortlist
+        self._phrases = []
+        self._symptoms = []
+        self._postings = {}
+        known = set(all_symptoms)
+        entries = [(s, s) for s in all_symptoms]
+        entries += [(phrase, s) for s, phrases in synonyms.items() if s in known for phrase in phrases]
+        seen = set()
+        for text, symptom in entries:
+            phrase = _phrase(text)
+            if not phrase or phrase in seen:
+                continue
+            seen.add(phrase)
+            entry = len(self._phrases)
+            self._phrases.append(phrase)
+            self._symptoms.append(symptom)
+            for gram in _trigrams(phrase):
+                self._postings.setdefault(gram, []).append(entry)
+
+    @staticmethod
+    def max_distance(phrase):
+        """Edit budget for an input: one typo per four characters, at most three"""
+        return min(3, max(1, len(phrase) // 4))
+
+    def candidates(self, text, limit=3):
+        """
+        Best-matching symptoms for a possibly misspelled input
+
+        Returns:
+        List of {'symptom', 'confidence'} dictionaries, best first, where
+        confidence is 1 - edit distance / length of the longer phrase
+        """
+        phrase = _phrase(text)
+        if not phrase:
+            return []
+        grams = _trigrams(phrase)
+        shared = {}
+        for gram in grams:
+            for entry in self._postings.get(gram, ()):
+                shared[entry] = shared.get(entry, 0) + 1
+
+        # One edit changes at most four padded trigrams (a transposition), so
+        # phrases sharing fewer cannot be within the edit budget
+        budget = self.max_distance(phrase)
+        required = len(grams) - 4 * budget
+        shortlist = sorted((entry for entry, count in shared.items() if count >= required),
+                           key=lambda entry: (-shared[entry], entry))[:self.shortlist]
+
+        best = {}
+        for entry in shortlist:
+            candidate = self._phrases[entry]
+            distance = bounded_edit_distance(phrase, candidate, budget)
+            if distance is None:
+                continue
+            confidence = round(1 - distance / max(len(phrase), len(candidate)), 3)
+            symptom = self._symptoms[entry]
+            if confidence > best.get(symptom, -1):
+                best[symptom] = confidence
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [{'symptom': symptom, 'confidence': confidence} for symptom, confidence in ranked]
@@ -0,0 +1,33 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from forest_engine import CompiledForest
+from medical_dataset import load_dataset
+
+
+def test_forest_trained_on_dataset_labels_round_trips(tmp_path):
+    dataset = load_dataset()
+    X = dataset.feature_matrix()
+    model = RandomForestClassifier(n_estimators=3, max_depth=8, random_state=0)
+    model.fit(X, dataset.labels)
+    engine = CompiledForest.from_sklearn(model)
+
+    path = str(tmp_path / 'forest_arrays.npz')
+    engine.save(path)
+    loaded = CompiledForest.load(path)
+
+    assert np.array_equal(loaded.classes_, model.classes_)
+    assert np.allclose(loaded.predict_proba(X[:50]), model.predict_proba(X[:50]))
+    assert list(loaded.predict(X[:50])) == list(model.predict(X[:50]))
+
+
+def test_object_dtype_classes_load_without_pickle(tmp_path):
+    dataset = load_dataset()
+    X = dataset.feature_matrix()
+    labels = dataset.cases['Disease'].to_numpy()
+    assert labels.dtype == object
+    model = RandomForestClassifier(n_estimators=3, max_depth=8, random_state=0).fit(X, labels)
+
+    path = str(tmp_path / 'forest_arrays.npz')
+    CompiledForest.from_sklearn(model).save(path)
+    assert np.array_equal(CompiledForest.load(path).classes_, model.classes_)
@@ -1,19 +1,20 @@
 import pandas as pd
-import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 import pickle
 import warnings
+from forest_engine import FOREST_ARRAYS_PATH, CompiledForest
+from symptom_index import SymptomIndex
+from medical_dataset import load_dataset
 warnings.filterwarnings('ignore')
 
 # Load all datasets
 print("Loading datasets...")
-df_dataset = pd.read_csv('dataset/dataset.csv')
-df_description = pd.read_csv('dataset/symptom_Description.csv')
-df_precaution = pd.read_csv('dataset/symptom_precaution.csv')
-df_severity = pd.read_csv('dataset/Symptom-severity.csv')
+dataset = load_dataset()
+df_dataset = dataset.cases
+df_severity = dataset.severity
 
 print(f"Dataset shape: {df_dataset.shape}")
 print(f"Number of unique diseases: {df_dataset['Disease'].nunique()}")
@@ -22,47 +23,17 @@ print(f"Number of unique symptoms: {df_severity.shape[0]}")
 # Data Preprocessing
 print("\nPreprocessing data...")
 
-# Get all unique symptoms from the dataset
-all_symptoms = set()
-for col in df_dataset.columns[1:]:  # Skip 'Disease' column
-    symptoms = df_dataset[col].dropna().unique()
-    for symptom in symptoms:
-        # Clean the symptom names (remove leading/trailing spaces)
-        symptom_clean = str(symptom).strip()
-        if symptom_clean and symptom_clean != 'nan':
-            all_symptoms.add(symptom_clean)
-
-all_symptoms = sorted(list(all_symptoms))
+# All unique symptoms (whitespace-stripped, sorted) from the dataset
+all_symptoms = dataset.all_symptoms
 print(f"Total unique symptoms found: {len(all_symptoms)}")
 
 # Create a symptom severity dictionary
-symptom_severity_dict = dict(zip(df_severity['Symptom'].str.strip(), df_severity['weight']))
+symptom_severity_dict = dataset.symptom_severity_dict()
 
 # Create feature matrix
-# Each row will have binary values for presence/absence of symptoms
-X = []
-y = []
-
-for index, row in df_dataset.iterrows():
-    # Create a feature vector with 0s
-    feature_vector = [0] * len(all_symptoms)
-    
-    # Get the disease
-    disease = row['Disease']
-    
-    # Mark symptoms as 1 if present
-    for col in df_dataset.columns[1:]:
-        symptom = str(row[col]).strip()
-        if symptom and symptom != 'nan' and symptom in all_symptoms:
-            symptom_index = all_symptoms.index(symptom)
-            feature_vector[symptom_index] = 1
-    
-    X.append(feature_vector)
-    y.append(disease)
-
-# Convert to numpy arrays
-X = np.array(X)
-y = np.array(y)
+# Each row has binary values for presence/absence of symptoms (one-hot over all_symptoms)
+X = dataset.feature_matrix()
+y = dataset.labels
 
 print(f"\nFeature matrix shape: {X.shape}")
 print(f"Target vector shape: {y.shape}")
@@ -117,42 +88,13 @@ print(feature_importance.head(20))
 print("\nCreating disease information dictionaries...")
 
 # Description dictionary
-description_dict = dict(zip(df_description['Disease'], df_description['Description']))
-
-# Precaution dictionary
-precaution_dict = {}
-for index, row in df_precaution.iterrows():
-    disease = row['Disease']
-    precautions = [
-        row['Precaution_1'],
-        row['Precaution_2'],
-        row['Precaution_3'],
-        row['Precaution_4']
-    ]
-    # Remove NaN values
-    precautions = [p for p in precautions if pd.notna(p)]
-    precaution_dict[disease] = precautions
+description_dict = dataset.description_dict()
+
+# Precaution dictionary (NaN values removed)
+precaution_dict = dataset.precaution_dict()
 
 # Calculate disease severity based on symptoms
-disease_severity_dict = {}
-for disease in df_dataset['Disease'].unique():
-    disease_data = df_dataset[df_dataset['Disease'] == disease]
-    total_severity = 0
-    symptom_count = 0
-    
-    for col in df_dataset.columns[1:]:
-        symptoms = disease_data[col].dropna().unique()
-        for symptom in symptoms:
-            symptom_clean = str(symptom).strip()
-            if symptom_clean in symptom_severity_dict:
-                total_severity += symptom_severity_dict[symptom_clean]
-                symptom_count += 1
-    
-    if symptom_count > 0:
-        avg_severity = total_severity / symptom_count
-        disease_severity_dict[disease] = round(avg_severity, 2)
-    else:
-        disease_severity_dict[disease] = 0
+disease_severity_dict = dataset.disease_severity_dict()
 
 # Save the model and data
 print("\nSaving model and data...")
@@ -174,16 +116,23 @@ model_data = {
 with open('model_data.pkl', 'wb') as f:
     pickle.dump(model_data, f)
 
+# Export the forest as flat NumPy node tables for the compiled inference engine
+compiled_forest = CompiledForest.from_sklearn(rf_classifier)
+compiled_forest.save(FOREST_ARRAYS_PATH)
+
 print("\nModel and data saved successfully!")
 print("Files created:")
 print("  - random_forest_model.pkl")
 print("  - model_data.pkl")
+print(f"  - {FOREST_ARRAYS_PATH} ({compiled_forest.n_nodes} nodes, {compiled_forest.nbytes / 1e6:.1f} MB)")
 
 # Test prediction function
 print("\n" + "="*80)
 print("TESTING PREDICTION SYSTEM")
 print("="*80)
 
+symptom_index = SymptomIndex(all_symptoms)
+
 def predict_disease(symptoms_list):
     """
     Predict disease based on input symptoms
@@ -197,13 +146,9 @@ def predict_disease(symptoms_list):
     # Create feature vector
     feature_vector = [0] * len(all_symptoms)
     
-    for symptom in symptoms_list:
-        symptom = symptom.strip().lower().replace(' ', '_')
-        # Find matching symptom
-        for idx, existing_symptom in enumerate(all_symptoms):
-            if existing_symptom.lower() == symptom:
-                feature_vector[idx] = 1
-                break
+    indices, _, _ = symptom_index.match(symptoms_list)
+    for idx in indices:
+        feature_vector[idx] = 1
     
     # Predict
     prediction = rf_classifier.predict([feature_vector])[0]
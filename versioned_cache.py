@@ -0,0 +1,84 @@
+"""
+LRU cache for values derived from one version of a model or index
+
+Every get and put carries the version of the data the value is (or will
+be) computed from, e.g. the model registry version for disease
+predictions or the RAG index version for retrieved context. When a call
+carries a different version than the one cached, every entry is dropped
+first, so results computed against replaced data are never served.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+
+class VersionedLRUCache:
+    """
+    Parameters:
+    max_size: Maximum number of entries (least recently used evicted first)
+    version_label: Name of the version field in stats()
+    """
+
+    def __init__(self, max_size: int = 1024, version_label: str = 'version'):
+        self.max_size = max_size
+        self.version_label = version_label
+        self._entries: "OrderedDict[object, object]" = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        """Drop every entry if the version changed (caller holds the lock)"""
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version, key):
+        """Cached value for key computed from version, or None"""
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, version, key, value):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every entry (counted as an invalidation)"""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                self.version_label: self._version
+            }